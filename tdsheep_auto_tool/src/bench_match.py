@@ -0,0 +1,515 @@
+from __future__ import annotations
+
+"""
+    bench_match.py
+    - 功能：视觉热路径的微基准
+    - 内容：在 1080p / 1440p / 4K 合成画面中贴入 assets/* 的模板（SCALES 中的每个比例），
+            对每个 模板 x 比例 x 颜色模式 分别计时：
+              capture      截屏（replay 后端提供合成画面，测量转换与拷贝开销）
+              load_cold    模板冷加载（cv2.imread 解码）
+              load_warm    模板缓存命中
+              match        cv2.matchTemplate
+              minmax       cv2.minMaxLoc
+    - 并行场景（--frontline）：page_frontline 六个模板的“全部存在”检测，
+            对比不同匹配线程数下的耗时与加速比
+    - 引擎场景（--fft）：同一画面上批量匹配一组模板，对比逐个 cv2.matchTemplate（spatial）、
+            共用画面频谱的频域匹配（fft）与自动选择（auto）的整批耗时；每次计时使用新的画面对象，
+            画面侧的 DFT 与积分图计入耗时
+    - 分配场景（--alloc）：逐个 locate_on_screen（每次都截屏 + 颜色转换 + 匹配）轮询一组模板，
+            对比缓冲池关闭/开启时每轮新分配的内存（tracemalloc，逐次定位的峰值增量之和）、
+            按每轮耗时折算的分配速率，以及每轮耗时（不开 tracemalloc 单独计时）
+    - 输出：JSON（含运行环境信息），便于跨版本追踪回归
+    - 用法：python -m tdsheep_auto_tool.src.bench_match --out bench.json
+          python -m tdsheep_auto_tool.src.bench_match --frontline --workers 1,2,4
+          python -m tdsheep_auto_tool.src.bench_match --fft --resolutions window,1080p --folders page_frontline
+          python -m tdsheep_auto_tool.src.bench_match --alloc --resolutions window,1080p
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Optional, Tuple, List, Dict, Any, Callable
+
+import cv2
+import numpy as np
+
+from .buffers import get_buffer_pool, memory_report, release_buffer, set_buffer_pool_enabled
+from .calc_locate import grab_screen, load_template, clear_template_cache, locate_on_screen
+from .capture import ReplayBackend, get_capture_backend, set_capture_backend
+from .executor import load_executor_config, set_match_workers
+from .fft_match import ENGINES, clear_fft_cache, fft_stats, forget_frame, get_matching_engine, match_template_map, set_matching_engine
+from .hints import get_hint_cache
+from .match import SCALES, get_assets_dir, find_template_path, locate_many
+from .pyramid import synthetic_screen
+
+RESOLUTIONS: Dict[str, Tuple[int, int]] = {
+    "window": (800, 684),  # 75% 的游戏窗口区域
+    "1080p": (1920, 1080),
+    "1440p": (2560, 1440),
+    "4k": (3840, 2160),
+}
+
+
+def _time_ms(fn: Callable[[], Any], repeat: int) -> Tuple[float, Any]:
+    """重复执行 fn，返回 (中位数耗时 ms, 最后一次的返回值)。"""
+    samples: List[float] = []
+    out = None
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        out = fn()
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    return statistics.median(samples), out
+
+
+def list_template_stems(folders: Optional[List[str]] = None) -> List[Tuple[str, str]]:
+    """列出 assets 下的 (子目录, 主干)，主干取不带比例后缀的文件名。"""
+    assets = get_assets_dir()
+    out: List[Tuple[str, str]] = []
+    for d in sorted(p for p in assets.iterdir() if p.is_dir()):
+        if folders and d.name not in folders:
+            continue
+        stems = set()
+        for png in d.glob("*.png"):
+            parts = png.stem.rsplit("_", 1)
+            if len(parts) == 2 and parts[1].isdigit() and int(parts[1]) in SCALES:
+                stems.add(parts[0])
+            else:
+                stems.add(png.stem)
+        out.extend((d.name, s) for s in sorted(stems))
+    return out
+
+
+def environment_info() -> Dict[str, Any]:
+    """记录运行环境，结果文件据此区分机器与版本。"""
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+        "cv2_threads": cv2.getNumThreads(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+# 功能：对每个 分辨率 x 模板 x 比例 x 颜色模式 计时各阶段。
+def run_vision_suite(
+    resolutions: List[str],
+    folders: Optional[List[str]] = None,
+    scales: Optional[List[int]] = None,
+    modes: Tuple[bool, ...] = (True, False),
+    repeat: int = 3,
+    seed: int = 0,
+) -> List[Dict[str, Any]]:
+    """返回逐条结果记录，每条对应一个 模板/比例/分辨率/颜色模式 组合。"""
+    rng = np.random.default_rng(seed)
+    records: List[Dict[str, Any]] = []
+    stems = list_template_stems(folders)
+    scales = scales or SCALES
+    old_backend = get_capture_backend()
+    try:
+        for res_name in resolutions:
+            size = RESOLUTIONS[res_name]
+            base = synthetic_screen(rng, size, grayscale=False)
+            for folder, stem in stems:
+                assets_dir = get_assets_dir() / folder
+                for s in scales:
+                    tpl_path = find_template_path(assets_dir, stem, s)
+                    if tpl_path is None:
+                        continue
+                    # 贴入模板（BGR），保证每个组合都有真实命中
+                    tpl_bgr = cv2.imread(str(tpl_path), cv2.IMREAD_COLOR)
+                    th, tw = tpl_bgr.shape[:2]
+                    if th >= size[1] or tw >= size[0]:
+                        continue
+                    frame = base.copy()
+                    x = int(rng.integers(0, size[0] - tw))
+                    y = int(rng.integers(0, size[1] - th))
+                    frame[y:y + th, x:x + tw] = tpl_bgr
+                    set_capture_backend(ReplayBackend([frame]))
+
+                    for grayscale in modes:
+                        capture_ms, screen = _time_ms(lambda: grab_screen(grayscale=grayscale), repeat)
+
+                        def _cold() -> np.ndarray:
+                            clear_template_cache()
+                            return load_template(str(tpl_path), grayscale)
+
+                        load_cold_ms, _ = _time_ms(_cold, repeat)
+                        load_warm_ms, tpl = _time_ms(lambda: load_template(str(tpl_path), grayscale), repeat)
+                        match_ms, res = _time_ms(lambda: cv2.matchTemplate(screen, tpl, cv2.TM_CCOEFF_NORMED), repeat)
+                        minmax_ms, mm = _time_ms(lambda: cv2.minMaxLoc(res), repeat)
+                        _, score, _, loc = mm
+                        records.append({
+                            "resolution": res_name,
+                            "folder": folder,
+                            "stem": stem,
+                            "scale": s,
+                            "grayscale": grayscale,
+                            "template_size": [tw, th],
+                            "capture_ms": capture_ms,
+                            "load_cold_ms": load_cold_ms,
+                            "load_warm_ms": load_warm_ms,
+                            "match_ms": match_ms,
+                            "minmax_ms": minmax_ms,
+                            "score": float(score),
+                            "found": abs(loc[0] - x) <= 1 and abs(loc[1] - y) <= 1,
+                        })
+    finally:
+        set_capture_backend(old_backend)
+    return records
+
+
+# 功能：page_frontline 六模板检测在不同线程数下的耗时与加速比。
+def run_frontline_speedup(
+    resolution: str = "1080p",
+    workers: Tuple[int, ...] = (1, 2, 4),
+    scale: int = 75,
+    repeat: int = 5,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """
+    在合成画面中按 scale 贴入 page_frontline/1~6，以推荐比例 100 执行批量检测，
+    使每个模板都要遍历多个比例，接近真实的“比例漂移”场景。
+    每次计时前清空空间提示，保证测的是完整匹配。
+    """
+    rng = np.random.default_rng(seed)
+    size = RESOLUTIONS[resolution]
+    folder = get_assets_dir() / "page_frontline"
+    stems = [str(i) for i in range(1, 7)]
+    frame = synthetic_screen(rng, size, grayscale=True)
+    frame = frame if frame.ndim == 2 else frame[:, :, 0].copy()
+    x = 20
+    for stem in stems:
+        tpl_path = find_template_path(folder, stem, scale)
+        if tpl_path is None:
+            continue
+        tpl = load_template(str(tpl_path), True)
+        th, tw = tpl.shape[:2]
+        if x + tw >= size[0] or th >= size[1]:
+            break
+        frame[40:40 + th, x:x + tw] = tpl
+        x += tw + 20
+
+    specs = [(folder, stem, None) for stem in stems]
+    timings: Dict[int, float] = {}
+    found = 0
+    try:
+        for w in workers:
+            set_match_workers(w)
+
+            def _check() -> Dict[Any, Any]:
+                get_hint_cache().forget()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    return locate_many(specs, frame=frame, recommended_scale=100, stop_on_miss=True)
+
+            _check()  # 预热线程池与模板缓存
+            timings[w], res = _time_ms(_check, repeat)
+            found = sum(1 for m, _ in res.values() if m is not None)
+    finally:
+        set_match_workers(load_executor_config()["workers"])
+
+    base = timings.get(1) or next(iter(timings.values()))
+    report = {
+        "resolution": resolution,
+        "scale": scale,
+        "found": found,
+        "cpu_count": os.cpu_count(),
+        "ms": {str(w): t for w, t in timings.items()},
+        "speedup": {str(w): base / t if t else 0.0 for w, t in timings.items()},
+    }
+    for w, t in timings.items():
+        print(f"[bench] frontline {resolution} workers={w:<2d} {t:8.2f}ms  加速比 {base / t:5.2f}x  (命中 {found}/6)")
+    return report
+
+
+# 功能：同一画面批量匹配时各匹配引擎的整批耗时与结果一致性。
+def run_engine_batch(
+    resolution: str = "1080p",
+    folders: Optional[List[str]] = None,
+    scales: Optional[List[int]] = None,
+    grayscale: bool = True,
+    repeat: int = 3,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """
+    把 folders（默认 page_frontline）下全部 模板 x 比例 贴入一张合成画面，按各引擎逐个匹配并取最高分位置。
+    模板频谱在计时前预热（对应长时间运行时的稳态）；以 spatial 的最高分位置为基准统计一致数。
+    """
+    rng = np.random.default_rng(seed)
+    size = RESOLUTIONS[resolution]
+    scales = scales or [75]
+    tpls: List[Tuple[str, np.ndarray]] = []
+    for folder, stem in list_template_stems(folders or ["page_frontline"]):
+        for s in scales:
+            tpl_path = find_template_path(get_assets_dir() / folder, stem, s)
+            if tpl_path is None:
+                continue
+            tpl = load_template(str(tpl_path), grayscale)
+            if tpl.shape[0] < size[1] and tpl.shape[1] < size[0]:
+                tpls.append((f"{folder}/{stem}@{s}", tpl))
+    base = synthetic_screen(rng, size, grayscale)
+    if base.ndim == 3 and grayscale:
+        base = base[:, :, 0].copy()
+    for _, tpl in tpls:
+        th, tw = tpl.shape[:2]
+        x = int(rng.integers(0, size[0] - tw))
+        y = int(rng.integers(0, size[1] - th))
+        base[y:y + th, x:x + tw] = tpl
+
+    def _batch() -> List[Tuple[float, Tuple[int, int]]]:
+        frame = base.copy()  # 新的画面对象，相当于新截取的一帧
+        out = []
+        for _, tpl in tpls:
+            res = match_template_map(frame, tpl)
+            _, val, _, loc = cv2.minMaxLoc(res)
+            release_buffer(res)
+            out.append((val, loc))
+        forget_frame(frame)
+        return out
+
+    old = get_matching_engine()
+    timings: Dict[str, float] = {}
+    results: Dict[str, List[Tuple[float, Tuple[int, int]]]] = {}
+    try:
+        for engine in ENGINES:
+            set_matching_engine(engine)
+            clear_fft_cache()
+            _batch()  # 预热模板频谱
+            timings[engine], results[engine] = _time_ms(_batch, repeat)
+        spectra = fft_stats()["templates"]
+    finally:
+        set_matching_engine(old)
+        clear_fft_cache()
+
+    ref = results["spatial"]
+    agree = {e: sum(1 for a, b in zip(ref, r) if a[1] == b[1] and abs(a[0] - b[0]) < 1e-3) for e, r in results.items()}
+    report = {
+        "resolution": resolution,
+        "grayscale": grayscale,
+        "templates": len(tpls),
+        "ms": timings,
+        "speedup": {e: timings["spatial"] / t if t else 0.0 for e, t in timings.items()},
+        "agree": agree,
+        "template_spectra_bytes": spectra["bytes"],
+    }
+    for e in ENGINES:
+        print(
+            f"[bench] engine {resolution:<6} {'gray ' if grayscale else 'color'} {e:<8} {timings[e]:8.1f}ms "
+            f"({len(tpls)} 模板, 每模板 {timings[e] / max(1, len(tpls)):6.2f}ms)  "
+            f"加速比 {report['speedup'][e]:5.2f}x  一致 {agree[e]}/{len(tpls)}"
+        )
+    return report
+
+
+# 功能：缓冲池关闭/开启时，轮询定位的内存分配量与分配速率。
+def run_allocation_bench(
+    resolution: str = "window",
+    folders: Optional[List[str]] = None,
+    scale: int = 75,
+    grayscale: bool = True,
+    rounds: int = 10,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """
+    把 folders（默认 page_frontline）下各模板按 scale 贴入合成画面，由 replay 后端提供截屏；
+    每轮对每个模板调用一次 locate_on_screen。预热轮（模板缓存、频谱缓存与缓冲池）不计入。
+    """
+    rng = np.random.default_rng(seed)
+    size = RESOLUTIONS[resolution]
+    frame = synthetic_screen(rng, size, grayscale=False)
+    paths: List[str] = []
+    for folder, stem in list_template_stems(folders or ["page_frontline"]):
+        tpl_path = find_template_path(get_assets_dir() / folder, stem, scale)
+        if tpl_path is None:
+            continue
+        tpl = cv2.imread(str(tpl_path), cv2.IMREAD_COLOR)
+        th, tw = tpl.shape[:2]
+        if th >= size[1] or tw >= size[0]:
+            continue
+        x = int(rng.integers(0, size[0] - tw))
+        y = int(rng.integers(0, size[1] - th))
+        frame[y:y + th, x:x + tw] = tpl
+        paths.append(str(tpl_path))
+
+    def _round() -> int:
+        return sum(1 for p in paths if locate_on_screen(p, confidence=0.8, grayscale=grayscale) is not None)
+
+    old_backend = get_capture_backend()
+    def _use(enabled: bool) -> None:
+        set_buffer_pool_enabled(enabled)
+        clear_fft_cache()
+        _round()  # 预热（缓冲池与频谱缓存）
+
+    old_pool = set_buffer_pool_enabled(False)
+    names = (("off", False), ("on", True))
+    modes: Dict[str, Dict[str, Any]] = {}
+    try:
+        set_capture_backend(ReplayBackend([frame]))
+        # 耗时：两种模式交替计时，避免先后顺序带来的系统噪声偏差
+        samples: Dict[str, List[float]] = {name: [] for name, _ in names}
+        for i in range(max(1, rounds)):
+            for name, enabled in (names if i % 2 == 0 else names[::-1]):
+                _use(enabled)
+                samples[name].append(_time_ms(_round, 1)[0])
+
+        for name, enabled in names:
+            _use(enabled)
+            get_buffer_pool().clear()
+            found = _round()  # 预热
+            ms = statistics.median(samples[name])
+            tracemalloc.start()
+            try:
+                per_round: List[int] = []
+                for _ in range(rounds):
+                    total = 0
+                    for p in paths:
+                        before, _ = tracemalloc.get_traced_memory()
+                        tracemalloc.reset_peak()
+                        locate_on_screen(p, confidence=0.8, grayscale=grayscale)
+                        total += tracemalloc.get_traced_memory()[1] - before
+                    per_round.append(total)
+            finally:
+                tracemalloc.stop()
+            alloc = statistics.median(per_round)
+            pool = get_buffer_pool().stats()
+            # 每次截取的画面与中间缓冲区都应归还：丢弃频域缓存（其中的画面频谱仍借出）后借出计数回到 0
+            clear_fft_cache()
+            outstanding = get_buffer_pool().stats()["outstanding"]
+            assert outstanding == 0, f"缓冲池有 {outstanding} 个缓冲区借出后未归还 (pool={name})"
+            modes[name] = {
+                "ms_per_round": ms,
+                "alloc_bytes_per_round": alloc,
+                "alloc_mb_per_s": alloc / 1024 / 1024 / (ms / 1000) if ms else 0.0,
+                "found": found,
+                "pool_hits": pool["hits"],
+                "pool_misses": pool["misses"],
+                "pool_bytes": pool["bytes"],
+            }
+            print(
+                f"[bench] alloc {resolution:<6} {'gray ' if grayscale else 'color'} pool={name:<3} "
+                f"{ms:8.1f}ms/轮  新分配 {alloc / 1024 / 1024:7.2f} MB/轮  "
+                f"分配速率 {modes[name]['alloc_mb_per_s']:8.1f} MB/s  "
+                f"(缓冲池 {pool['bytes'] / 1024 / 1024:.1f} MB，复用 {pool['hits']} 次，命中 {found}/{len(paths)})"
+            )
+        memory_report()
+    finally:
+        set_capture_backend(old_backend)
+        set_buffer_pool_enabled(old_pool)
+        clear_fft_cache()
+
+    off, on = modes["off"]["alloc_bytes_per_round"], modes["on"]["alloc_bytes_per_round"]
+    return {
+        "resolution": resolution,
+        "grayscale": grayscale,
+        "templates": len(paths),
+        "modes": modes,
+        "alloc_reduction": 1 - on / off if off else 0.0,
+    }
+
+
+def summarize(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """按 分辨率 x 颜色模式 汇总各阶段耗时的中位数与总和。"""
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    for r in records:
+        key = f"{r['resolution']}/{'gray' if r['grayscale'] else 'color'}"
+        groups.setdefault(key, []).append(r)
+    out: Dict[str, Any] = {}
+    for key, rows in groups.items():
+        out[key] = {
+            "pairs": len(rows),
+            "found": sum(1 for r in rows if r["found"]),
+            **{
+                f"{stage}_median": statistics.median(r[f"{stage}_ms"] for r in rows)
+                for stage in ("capture", "load_cold", "load_warm", "match", "minmax")
+            },
+            "match_total_ms": sum(r["match_ms"] for r in rows),
+        }
+    return out
+
+
+def print_summary(summary: Dict[str, Any]) -> None:
+    for key, st in summary.items():
+        print(
+            f"[bench] {key:<12} {st['pairs']:4d} 组 命中 {st['found']:4d} | "
+            f"capture {st['capture_median']:7.2f}ms  load {st['load_cold_median']:6.2f}/{st['load_warm_median']:6.3f}ms  "
+            f"match {st['match_median']:7.2f}ms  minmax {st['minmax_median']:6.3f}ms  "
+            f"(match 合计 {st['match_total_ms'] / 1000:.2f}s)"
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="模板匹配微基准")
+    parser.add_argument("--resolutions", type=str, default="1080p,1440p,4k", help="逗号分隔：1080p,1440p,4k")
+    parser.add_argument("--folders", type=str, default=None, help="只测试这些 assets 子目录（逗号分隔）")
+    parser.add_argument("--scales", type=str, default=None, help="只测试这些比例（逗号分隔）")
+    parser.add_argument("--gray-only", action="store_true", help="只测灰度")
+    parser.add_argument("--repeat", type=int, default=3, help="每项重复次数（取中位数）")
+    parser.add_argument("--out", type=str, default=None, help="结果 JSON 输出路径")
+    parser.add_argument("--frontline", action="store_true", help="只运行 page_frontline 并行加速场景")
+    parser.add_argument("--workers", type=str, default="1,2,4", help="并行场景的线程数列表（逗号分隔）")
+    parser.add_argument("--fft", action="store_true", help="只运行匹配引擎（spatial/fft/auto）对比场景")
+    parser.add_argument("--alloc", action="store_true", help="只运行缓冲池关闭/开启的内存分配对比场景")
+    args = parser.parse_args(argv)
+
+    resolutions = [r.strip() for r in args.resolutions.split(",") if r.strip()]
+    for r in resolutions:
+        if r not in RESOLUTIONS:
+            parser.error(f"未知分辨率: {r}")
+    folders = [f.strip() for f in args.folders.split(",")] if args.folders else None
+    scales = [int(s) for s in args.scales.split(",")] if args.scales else None
+    modes = (True,) if args.gray_only else (True, False)
+
+    if args.alloc:
+        result = {
+            "env": environment_info(),
+            "alloc": [
+                run_allocation_bench(r, folders, grayscale=g, rounds=args.repeat)
+                for r in resolutions for g in modes
+            ],
+        }
+    elif args.fft:
+        result = {
+            "env": environment_info(),
+            "engines": [
+                run_engine_batch(r, folders, scales, grayscale=g, repeat=args.repeat)
+                for r in resolutions for g in modes
+            ],
+        }
+    elif args.frontline:
+        workers = tuple(int(w) for w in args.workers.split(",") if w.strip())
+        result = {
+            "env": environment_info(),
+            "frontline": [run_frontline_speedup(r, workers, repeat=args.repeat) for r in resolutions],
+        }
+    else:
+        records = run_vision_suite(resolutions, folders, scales, modes, repeat=args.repeat)
+        summary = summarize(records)
+        print_summary(summary)
+        result = {"env": environment_info(), "summary": summary, "records": records}
+    if args.out:
+        Path(args.out).write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"[bench] 结果已写入 {args.out}")
+
+
+__all__ = [
+    "RESOLUTIONS",
+    "list_template_stems",
+    "environment_info",
+    "run_vision_suite",
+    "run_frontline_speedup",
+    "run_engine_batch",
+    "run_allocation_bench",
+    "summarize",
+]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+from __future__ import annotations
+
+"""
+    buffers.py
+    - 功能：截屏 -> 颜色转换 -> 匹配 路径上的可复用缓冲区池
+    - 思路：按 (形状, dtype) 分组保存空闲的 ndarray；take 取出一个空闲缓冲区（内容未定义）交给调用方，
+            调用方把它当作新分配的数组使用（作为 cv2 的 dst / result 参数），用完后 release 归还，
+            之后才会被下一次 take 复用
+    - 所有权是显式的：只有 take 借出、尚未归还的数组才能归还，重复归还或归还池外数组会被忽略；
+      借出的数组池内只弱引用，调用方不归还时按普通数组回收（只是失去复用），不会泄漏
+    - 尺寸随模板变化的数组（结果图、窗口标准差等，都不超过画面大小）用 take_buffer_view：
+      底层按容量（元素个数）借出一维缓冲区，返回其前部的连续视图，不同尺寸的模板共用同一组缓冲区；
+      归还时直接传入视图（按其底层缓冲区归还）
+    - 归还后调用方不得再使用该数组（包括其切片视图）；画面类缓冲区还要先丢弃其频域缓存
+      （capture.release_frame），避免同一对象装入新画面后命中旧的频谱
+    - 池只保留空闲缓冲区，总大小受字节预算限制；归还时超出预算先释放最久未用形状下的空闲缓冲区
+      （例如窗口尺寸变化后的旧截屏尺寸），仍不足则不入池
+    - 取舍：匹配耗时以 DFT 与 matchTemplate 的计算为主，缓冲池基本不改变耗时（bench_match --alloc 实测
+      1080p 灰度与彩色都在 ±2% 以内），收益在于消除每轮的大块分配（1080p 彩色约 900 MB/轮 -> 约 1 MB/轮）
+      及其带来的内存峰值与碎片；代价是常驻的空闲缓冲区：1080p 彩色约 200 MB，灰度与窗口区域小得多
+    - 预算要容纳一帧的工作集才有复用效果，不足时池会反复淘汰再分配；内存紧张时可调小预算或关闭
+    - 配置：config.json 中 matching.buffer_pool（默认 true）、matching.buffer_pool_mb（字节预算，默认 256）
+    - 内存占用：memory_report() 汇总模板缓存、比例模板、模板包、频域缓存与本缓冲池
+"""
+
+import threading
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Optional, Tuple, List, Dict, Any, Iterator
+
+import numpy as np
+
+from .config import load_config_section
+
+# 缓冲池的默认字节预算
+BUFFER_POOL_MAX_BYTES: int = 256 * 1024 * 1024
+
+BufferKey = Tuple[Tuple[int, ...], str]
+
+
+class BufferPool:
+    """
+    按 (形状, dtype) 复用 ndarray 的缓冲池（线程安全）。
+    take 返回的缓冲区内容未定义，调用方需整体写入（或自行清零需要的部分），用完后 release 归还。
+    """
+
+    def __init__(self, max_bytes: int = BUFFER_POOL_MAX_BYTES) -> None:
+        self.max_bytes = int(max_bytes)
+        self._buffers: "OrderedDict[BufferKey, List[np.ndarray]]" = OrderedDict()
+        self._lent: "weakref.WeakValueDictionary[int, np.ndarray]" = weakref.WeakValueDictionary()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.released = 0
+        self.unpooled = 0
+        self.reused_bytes = 0
+        self.allocated_bytes = 0
+
+    def take(self, shape: Tuple[int, ...], dtype: Any = np.uint8) -> np.ndarray:
+        dt = np.dtype(dtype)
+        shape = tuple(int(v) for v in shape)
+        key = (shape, dt.str)
+        with self._lock:
+            bufs = self._buffers.get(key)
+            if bufs:
+                buf = bufs.pop()
+                if not bufs:
+                    del self._buffers[key]
+                self._bytes -= buf.nbytes
+                self.hits += 1
+                self.reused_bytes += buf.nbytes
+            else:
+                buf = np.empty(shape, dt)
+                self.misses += 1
+                self.allocated_bytes += buf.nbytes
+            self._lent[id(buf)] = buf
+            return buf
+
+    def release(self, buf: Optional[np.ndarray]) -> bool:
+        """
+        归还 take 借出的缓冲区，返回是否入池；池外数组、重复归还与 None 被忽略。
+        传入视图（take_buffer_view）时归还其底层缓冲区。
+        """
+        if buf is None:
+            return False
+        if isinstance(buf.base, np.ndarray):
+            buf = buf.base
+        with self._lock:
+            if self._lent.get(id(buf)) is not buf:
+                return False
+            del self._lent[id(buf)]
+            self.released += 1
+            size = buf.nbytes
+            if self._bytes + size > self.max_bytes:
+                self._trim(self.max_bytes - size)
+            if self._bytes + size > self.max_bytes:
+                self.unpooled += 1
+                return False
+            key = (buf.shape, buf.dtype.str)
+            self._buffers.setdefault(key, []).append(buf)
+            self._buffers.move_to_end(key)
+            self._bytes += size
+            return True
+
+    def _trim(self, target: int) -> None:
+        """从最久未用的形状开始释放空闲缓冲区，直到总字节数不超过 target（需持有锁）。"""
+        for key in list(self._buffers):
+            bufs = self._buffers[key]
+            while bufs and self._bytes > target:
+                self._bytes -= bufs.pop().nbytes
+            if not bufs:
+                del self._buffers[key]
+            if self._bytes <= target:
+                return
+
+    def clear(self) -> None:
+        """丢弃全部空闲缓冲区并清零统计；已借出的数组仍归调用方，之后的归还被忽略。"""
+        with self._lock:
+            self._buffers.clear()
+            self._lent = weakref.WeakValueDictionary()
+            self._bytes = 0
+            self.hits = self.misses = self.released = self.unpooled = 0
+            self.reused_bytes = self.allocated_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            lent = list(self._lent.values())
+            in_use: Dict[BufferKey, int] = {}
+            for buf in lent:
+                key = (buf.shape, buf.dtype.str)
+                in_use[key] = in_use.get(key, 0) + 1
+            shapes = [
+                {
+                    "shape": list(shape),
+                    "dtype": dtype,
+                    "buffers": len(self._buffers.get((shape, dtype), ())),
+                    "in_use": in_use.get((shape, dtype), 0),
+                    "bytes": sum(buf.nbytes for buf in self._buffers.get((shape, dtype), ())),
+                }
+                for shape, dtype in list(self._buffers) + [k for k in in_use if k not in self._buffers]
+            ]
+            return {
+                "enabled": is_buffer_pool_enabled(),
+                "buffers": sum(len(bufs) for bufs in self._buffers.values()),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "lent": len(lent),
+                "lent_bytes": sum(buf.nbytes for buf in lent),
+                # 借出后未归还的次数（含调用方丢弃、已被回收的数组），正常使用下回到 0
+                "outstanding": self.hits + self.misses - self.released,
+                "hits": self.hits,
+                "misses": self.misses,
+                "released": self.released,
+                "unpooled": self.unpooled,
+                "hit_rate": (self.hits / total) if total else 0.0,
+                "reused_bytes": self.reused_bytes,
+                "allocated_bytes": self.allocated_bytes,
+                "shapes": shapes,
+            }
+
+
+def load_buffer_config() -> Dict[str, Any]:
+    """读取 config.json 中 matching.buffer_pool / buffer_pool_mb 配置（可选）。"""
+    default = {"buffer_pool": True, "max_bytes": BUFFER_POOL_MAX_BYTES}
+    m = load_config_section("matching")
+    try:
+        mb = m.get("buffer_pool_mb")
+        return {
+            "buffer_pool": bool(m.get("buffer_pool", default["buffer_pool"])),
+            "max_bytes": int(float(mb) * 1024 * 1024) if mb is not None else default["max_bytes"],
+        }
+    except (TypeError, ValueError) as e:
+        print(f"[config] matching.buffer_pool_mb 配置无效，使用默认: {e}")
+        return default
+
+
+_POOL = BufferPool()
+_ENABLED: Optional[bool] = None
+
+
+def get_buffer_pool() -> BufferPool:
+    return _POOL
+
+
+def is_buffer_pool_enabled() -> bool:
+    global _ENABLED
+    if _ENABLED is None:
+        cfg = load_buffer_config()
+        _POOL.max_bytes = cfg["max_bytes"]
+        _ENABLED = cfg["buffer_pool"]
+    return _ENABLED
+
+
+def set_buffer_pool_enabled(enabled: bool) -> bool:
+    """开关缓冲池，返回之前的状态；关闭时清空池。"""
+    global _ENABLED
+    old = is_buffer_pool_enabled()
+    _ENABLED = bool(enabled)
+    if not _ENABLED:
+        _POOL.clear()
+    return old
+
+
+# 功能：取一个可写的缓冲区，用完后以 release_buffer 归还；缓冲池关闭时等同于 np.empty。
+def take_buffer(shape: Tuple[int, ...], dtype: Any = np.uint8) -> np.ndarray:
+    if not is_buffer_pool_enabled():
+        return np.empty(shape, dtype)
+    return _POOL.take(shape, dtype)
+
+
+# 功能：取一个形状为 shape 的可写视图，底层缓冲区按 capacity（元素个数，需不小于 shape 的元素数）复用。
+def take_buffer_view(shape: Tuple[int, ...], capacity: int, dtype: Any = np.uint8) -> np.ndarray:
+    """用于尺寸随模板变化、但不超过 capacity 的数组；返回的视图是连续的，可直接作为 cv2 的 dst，用完后 release_buffer 归还。"""
+    n = int(np.prod(shape))
+    if not is_buffer_pool_enabled() or n > capacity:
+        return np.empty(shape, dtype)
+    return _POOL.take((int(capacity),), dtype)[:n].reshape(shape)
+
+
+# 功能：归还 take_buffer / take_buffer_view 取得的缓冲区（可一次传入多个，None 与池外数组被忽略）。
+def release_buffer(*bufs: Optional[np.ndarray]) -> None:
+    for buf in bufs:
+        _POOL.release(buf)
+
+
+# 功能：with 块内借用一个缓冲区，退出时归还。
+@contextmanager
+def borrow_buffer(shape: Tuple[int, ...], dtype: Any = np.uint8) -> Iterator[np.ndarray]:
+    buf = take_buffer(shape, dtype)
+    try:
+        yield buf
+    finally:
+        _POOL.release(buf)
+
+
+# 功能：汇总视觉热路径上各缓存与缓冲池的内存占用。
+def memory_report(verbose: bool = True) -> Dict[str, Any]:
+    """
+    返回各部分的字节数（bytes）与合计；verbose 时逐项打印。
+    模板包为只读文件映射，不计入合计；buffer_pool 为池中的空闲缓冲区，借出中的（含缓存的画面与模板频谱）单独列出。
+    """
+    # 延迟导入，避免 capture / fft_match 与本模块循环引用
+    from .calc_locate import template_cache_stats
+    from .fft_match import fft_stats
+    from .template_pack import get_template_pack
+    from .template_scaler import get_scaled_cache
+
+    fft = fft_stats()
+    pack = get_template_pack()
+    pool = _POOL.stats()
+    parts: Dict[str, int] = {
+        "templates": int(template_cache_stats()["bytes"]),
+        "scaled_templates": int(get_scaled_cache().stats()["bytes"]),
+        "fft_templates": int(fft["templates"]["bytes"]),
+        "fft_frames": int(fft["frame_bytes"]),
+        "buffer_pool": int(pool["bytes"]),
+    }
+    report: Dict[str, Any] = {
+        "bytes": parts,
+        "total_bytes": sum(parts.values()),
+        # 借出中的缓冲区（画面、频谱与结果图），缓存的画面与模板频谱也在其中
+        "lent_bytes": int(pool["lent_bytes"]),
+        "pack_mapped_bytes": int(pack.stats()["bytes"]) if pack is not None else 0,
+        "buffer_pool": pool,
+    }
+    if verbose:
+        for name, n in parts.items():
+            print(f"[mem] {name:<17} {n / 1024 / 1024:8.1f} MB")
+        print(
+            f"[mem] 合计 {report['total_bytes'] / 1024 / 1024:.1f} MB（另有模板包映射 "
+            f"{report['pack_mapped_bytes'] / 1024 / 1024:.1f} MB）"
+        )
+        print(
+            f"[mem] 缓冲池 空闲 {pool['buffers']} 个 / 借出 {pool['lent']} 个"
+            f"（{report['lent_bytes'] / 1024 / 1024:.1f} MB），{len(pool['shapes'])} 种形状，"
+            f"复用 {pool['hits']} 次，新分配 {pool['misses']} 次（命中率 {pool['hit_rate']:.0%}）"
+        )
+    return report
+
+
+__all__ = [
+    "BUFFER_POOL_MAX_BYTES",
+    "BufferPool",
+    "load_buffer_config",
+    "get_buffer_pool",
+    "is_buffer_pool_enabled",
+    "set_buffer_pool_enabled",
+    "take_buffer",
+    "take_buffer_view",
+    "release_buffer",
+    "borrow_buffer",
+    "memory_report",
+]
@@ -1,28 +1,37 @@
 from __future__ import annotations
 
 import os
-from typing import Optional, Tuple, Dict, Any
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple, Dict, Any, Callable, Iterable, List, Mapping, Union
 
 import cv2
 import numpy as np
 import pyautogui
 
+from .buffers import release_buffer
+from .capture import get_capture_backend, release_frame
+from .executor import get_match_executor
+from .fft_match import match_template_map, clear_fft_cache
+from .metrics import span, inc
+from .pyramid import pyramid_match
+from .template_pack import get_template_pack
+from .template_scaler import get_scaled_cache
+
 # PyAutoGUI 交互安全设置：移动到屏幕左上角可触发 FailSafe 异常
 pyautogui.FAILSAFE = True
 pyautogui.PAUSE = 0.02
 
+# 是否默认启用由粗到精的金字塔匹配（可通过 set_pyramid_matching 切换）
+_PYRAMID_MATCHING: bool = False
 
-# 功能：将输入图像转换为灰度，统一匹配的颜色空间。
-def _to_gray(img: np.ndarray) -> np.ndarray:
-    """将 BGR/RGB 图像转换为灰度。"""
-    if len(img.shape) == 2:
-        return img
-    # 允许既可能是 RGB（来自 PIL）也可能是 BGR（来自 cv2）
-    try:
-        # 优先按 RGB 处理
-        return cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
-    except Exception:
-        return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+def set_pyramid_matching(enabled: bool) -> None:
+    """切换默认匹配引擎：True 为金字塔匹配，False 为全分辨率全量匹配。"""
+    global _PYRAMID_MATCHING
+    _PYRAMID_MATCHING = bool(enabled)
 
 
 # 功能：截取屏幕（可选区域），返回灰度或BGR图像。
@@ -32,63 +41,217 @@ def grab_screen(region: Optional[Tuple[int, int, int, int]] = None, grayscale: b
     - region: (left, top, width, height)；None 表示全屏
     - grayscale: 是否返回灰度图
     返回：np.ndarray（灰度或 BGR）
+    实际截屏由 capture 模块的当前后端完成（mss / pyautogui / replay）。
     """
-    pil_img = pyautogui.screenshot(region=region)
-    img = np.array(pil_img)  # PIL -> RGB ndarray
-    if grayscale:
-        return _to_gray(img)
-    else:
-        # 保留为 BGR，便于与 cv2 算法统一
-        return cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
+    backend = get_capture_backend()
+    with span("grab_screen", backend=backend.name):
+        return backend.grab(region=region, grayscale=grayscale)
+
+
+# 模板缓存的默认字节预算（按解码后 ndarray 的大小计算）
+TEMPLATE_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+
+
+class TemplateCache:
+    """
+    已解码模板的进程内 LRU 缓存。
+    - 键：(绝对路径, 是否灰度, 文件 mtime)，文件被替换后旧条目自动失效
+    - 按字节预算淘汰最久未使用的模板，并记录命中/未命中次数
+    返回的 ndarray 为只读，调用方不得原地修改。
+    """
+
+    def __init__(self, max_bytes: int = TEMPLATE_CACHE_MAX_BYTES) -> None:
+        self.max_bytes = int(max_bytes)
+        self._items: "OrderedDict[Tuple[str, bool, int], np.ndarray]" = OrderedDict()
+        # (路径, 灰度) -> 当前缓存中的 mtime，用于清理同一文件的旧版本
+        self._current: Dict[Tuple[str, bool], int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, template_path: str, grayscale: bool = True) -> np.ndarray:
+        """读取模板，命中缓存直接返回，否则从磁盘解码并放入缓存。"""
+        path = os.path.abspath(template_path)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            raise FileNotFoundError(f"模板文件不存在: {template_path}")
+
+        key = (path, bool(grayscale), mtime)
+        with self._lock:
+            tpl = self._items.get(key)
+            if tpl is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return tpl
+            self.misses += 1
+
+        flag = cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR
+        tpl = cv2.imread(path, flag)
+        if tpl is None:
+            raise ValueError(f"无法读取模板: {template_path}")
+        tpl.flags.writeable = False
+
+        with self._lock:
+            self._put(key, tpl)
+        return tpl
+
+    def _put(self, key: Tuple[str, bool, int], tpl: np.ndarray) -> None:
+        path, gray, mtime = key
+        old_mtime = self._current.get((path, gray))
+        if old_mtime is not None and old_mtime != mtime:
+            old = self._items.pop((path, gray, old_mtime), None)
+            if old is not None:
+                self._bytes -= old.nbytes
+        if key in self._items:
+            self._bytes -= self._items[key].nbytes
+        self._items[key] = tpl
+        self._current[(path, gray)] = mtime
+        self._bytes += tpl.nbytes
+        # 超出预算时淘汰最久未使用的条目（至少保留刚放入的这一个）
+        while self._bytes > self.max_bytes and len(self._items) > 1:
+            (old_path, old_gray, _), old = self._items.popitem(last=False)
+            self._current.pop((old_path, old_gray), None)
+            self._bytes -= old.nbytes
+            self.evictions += 1
 
+    def clear(self) -> None:
+        """清空缓存与统计。"""
+        with self._lock:
+            self._items.clear()
+            self._current.clear()
+            self._bytes = 0
+            self.hits = self.misses = self.evictions = 0
 
-# 功能：从磁盘读取模板图像，支持灰度或彩色。
+    def stats(self) -> Dict[str, Any]:
+        """返回缓存统计：命中、未命中、淘汰、条目数与占用字节。"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / total) if total else 0.0,
+                "entries": len(self._items),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+_TEMPLATE_CACHE = TemplateCache()
+
+
+def _load_base_template(template_path: str, grayscale: bool = True) -> np.ndarray:
+    pack = get_template_pack()
+    if pack is not None:
+        tpl = pack.get(template_path, grayscale=grayscale)
+        if tpl is not None:
+            return tpl
+    return _TEMPLATE_CACHE.get(template_path, grayscale=grayscale)
+
+
+# 功能：读取模板图像（按需合成的比例模板、模板包的内存映射视图或进程内缓存），支持灰度或彩色。
 def _load_template(template_path: str, grayscale: bool = True) -> np.ndarray:
-    """读取模板图片为 ndarray。"""
-    if not os.path.exists(template_path):
-        raise FileNotFoundError(f"模板文件不存在: {template_path}")
-    flag = cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR
-    tpl = cv2.imread(template_path, flag)
-    if tpl is None:
-        raise ValueError(f"无法读取模板: {template_path}")
-    return tpl
+    """读取模板图片为 ndarray（只读）；find_template_path 登记过的比例模板由基础模板合成。"""
+    tpl = get_scaled_cache().get(template_path, grayscale, _load_base_template)
+    if tpl is not None:
+        return tpl
+    return _load_base_template(template_path, grayscale)
 
 
-# 功能：在屏幕上进行模板匹配，返回命中位置与置信度。
-def locate_on_screen(
-    template_path: str,
+def load_template(template_path: str, grayscale: bool = True) -> np.ndarray:
+    """读取模板（经缓存），返回只读 ndarray。"""
+    return _load_template(template_path, grayscale=grayscale)
+
+
+# 功能：预加载目录下所有模板到缓存，避免运行中首次匹配时的磁盘读取。
+def warm_up_templates(
+    root_dir: Path,
+    modes: Iterable[bool] = (True, False),
+    skip: Optional[Callable[[Path], bool]] = None,
+) -> int:
+    """
+    递归预加载 root_dir 下所有 PNG 模板。
+    - modes: 需要预加载的灰度标志（True 灰度，False 彩色）
+    - skip: 返回 True 的文件不预加载
+    返回成功加载的模板数量。模板包已提供的模板不再解码，也计入数量。
+    """
+    root = Path(root_dir)
+    if not root.exists():
+        print(f"[cache] 模板目录不存在: {root}")
+        return 0
+    loaded = 0
+    for png in sorted(root.rglob("*.png")):
+        if skip is not None and skip(png):
+            continue
+        for grayscale in modes:
+            try:
+                _load_template(str(png), grayscale=grayscale)
+                loaded += 1
+            except Exception as e:
+                print(f"[cache] 预加载失败 {png.name}: {e}")
+    return loaded
+
+
+def template_cache_stats() -> Dict[str, Any]:
+    """返回模板缓存的统计信息。"""
+    return _TEMPLATE_CACHE.stats()
+
+
+def clear_template_cache() -> None:
+    """清空模板缓存、合成的比例模板与频域缓存（例如替换素材后）。"""
+    _TEMPLATE_CACHE.clear()
+    get_scaled_cache().clear()
+    clear_fft_cache()
+
+
+# 功能：在已截取的画面上进行模板匹配（不截屏），返回命中位置与置信度。
+def match_template(
+    screen: np.ndarray,
+    tpl: np.ndarray,
     region: Optional[Tuple[int, int, int, int]] = None,
     confidence: float = 0.1,
-    grayscale: bool = True,
     method: int = cv2.TM_CCOEFF_NORMED,
+    pyramid: Optional[bool] = None,
 ) -> Optional[Dict[str, Any]]:
     """
-    使用 OpenCV 模板匹配在屏幕上定位目标。
-    - template_path: 模板图片路径
-    - region: (left, top, width, height)，限制搜索范围；None 为全屏
-    - confidence: 置信度阈值（TM_CCOEFF_NORMED 模式下范围 0~1）
-    - grayscale: 是否以灰度进行匹配（建议 True，提高速度与稳定性）
-    - method: 匹配方法，默认归一化相关系数
-
-    返回字典：{"left", "top", "width", "height", "center", "score"}；未命中返回 None。
+    在给定画面上匹配模板数组。
+    - screen: 截屏结果（与模板同为灰度或同为 BGR）
+    - region: screen 对应的屏幕区域，用于换算为屏幕绝对坐标；None 表示全屏截取
+    - pyramid: 是否使用金字塔匹配；None 时跟随 set_pyramid_matching 的全局设置
+    返回字典同 locate_on_screen；未命中返回 None。
     """
-    screen = grab_screen(region=region, grayscale=grayscale)
-    tpl = _load_template(template_path, grayscale=grayscale)
-
     if screen.shape[0] < tpl.shape[0] or screen.shape[1] < tpl.shape[1]:
         # 模板尺寸不能大于截屏区域
         return None
 
-    res = cv2.matchTemplate(screen, tpl, method)
-    min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(res)
+    use_pyramid = _PYRAMID_MATCHING if pyramid is None else pyramid
+    if use_pyramid:
+        max_val, max_loc = pyramid_match(screen, tpl, method)
+    else:
+        # 按匹配引擎选择 cv2.matchTemplate 或共用画面频谱的频域匹配
+        res = match_template_map(screen, tpl, method)
+        min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(res)
+        release_buffer(res)
 
     # TM_CCOEFF_NORMED：max_val 越接近 1 越匹配
     score = max_val
     if score < confidence:
         return None
 
-    top_left = max_loc
-    h, w = tpl.shape[:2]
+    return _to_match(max_loc, score, tpl.shape, region)
+
+
+def _to_match(
+    top_left: Tuple[int, int],
+    score: float,
+    tpl_shape: Tuple[int, ...],
+    region: Optional[Tuple[int, int, int, int]],
+) -> Dict[str, Any]:
+    """将画面内的左上角坐标换算为屏幕绝对坐标的匹配结果。"""
+    h, w = tpl_shape[:2]
     left = int(top_left[0]) + (region[0] if region else 0)
     top = int(top_left[1]) + (region[1] if region else 0)
     center = (left + w // 2, top + h // 2)
@@ -103,6 +266,171 @@ def locate_on_screen(
     }
 
 
+# 功能：在已截取的画面上匹配模板文件（模板经缓存读取）。
+def locate_in_frame(
+    screen: np.ndarray,
+    template_path: str,
+    region: Optional[Tuple[int, int, int, int]] = None,
+    confidence: float = 0.1,
+    grayscale: bool = True,
+    method: int = cv2.TM_CCOEFF_NORMED,
+    pyramid: Optional[bool] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    与 locate_on_screen 相同，但复用调用方提供的画面，不再截屏。
+    - screen: grab_screen(region, grayscale) 的结果，grayscale 需与之一致
+    """
+    tpl = _load_template(template_path, grayscale=grayscale)
+    return match_template(screen, tpl, region=region, confidence=confidence, method=method, pyramid=pyramid)
+
+
+# 功能：在画面中查找模板的全部出现位置（例如多个游戏窗口的同一锚点）。
+def locate_all_in_frame(
+    screen: np.ndarray,
+    template_path: str,
+    region: Optional[Tuple[int, int, int, int]] = None,
+    confidence: float = 0.1,
+    grayscale: bool = True,
+    max_results: int = 8,
+    method: int = cv2.TM_CCOEFF_NORMED,
+) -> List[Dict[str, Any]]:
+    """
+    返回得分不低于 confidence 的全部命中（按得分降序，最多 max_results 个）。
+    每取一个峰值就抑制其模板大小的邻域，同一位置不会重复返回。
+    """
+    tpl = _load_template(template_path, grayscale=grayscale)
+    th, tw = tpl.shape[:2]
+    if screen.shape[0] < th or screen.shape[1] < tw:
+        return []
+    res = match_template_map(screen, tpl, method)
+    out: List[Dict[str, Any]] = []
+    for _ in range(max(0, max_results)):
+        _, max_val, _, max_loc = cv2.minMaxLoc(res)
+        if max_val < confidence:
+            break
+        out.append(_to_match(max_loc, max_val, tpl.shape, region))
+        x, y = max_loc
+        res[max(0, y - th + 1):y + th, max(0, x - tw + 1):x + tw] = -1.0
+    release_buffer(res)
+    return out
+
+
+# 功能：在同一画面上批量匹配多个模板，整批只截屏一次。
+def locate_many(
+    templates: Union[Mapping[Any, str], Iterable[str]],
+    frame: Optional[np.ndarray] = None,
+    region: Optional[Tuple[int, int, int, int]] = None,
+    confidence: float = 0.1,
+    grayscale: bool = True,
+    method: int = cv2.TM_CCOEFF_NORMED,
+    pyramid: Optional[bool] = None,
+) -> Dict[Any, Optional[Dict[str, Any]]]:
+    """
+    批量模板匹配。
+    - templates: {key: 模板路径} 或模板路径列表（此时以路径作为 key）
+    - frame: 已截取的画面；None 时按 region/grayscale 截屏一次
+    返回 {key: 匹配结果或 None}。
+    """
+    items = templates.items() if isinstance(templates, Mapping) else ((p, p) for p in templates)
+    owned = frame is None
+    if owned:
+        frame = grab_screen(region=region, grayscale=grayscale)
+    items = list(items)
+    try:
+        # 各模板互不依赖，由匹配线程池并行执行（matchTemplate 期间释放 GIL）
+        found = get_match_executor().map(
+            lambda item: locate_in_frame(
+                frame,
+                str(item[1]),
+                region=region,
+                confidence=confidence,
+                grayscale=grayscale,
+                method=method,
+                pyramid=pyramid,
+            ),
+            items,
+        )
+    finally:
+        if owned:
+            release_frame(frame)
+    return {key: m for (key, _), m in zip(items, found)}
+
+
+# 功能：在屏幕上进行模板匹配，返回命中位置与置信度。
+def locate_on_screen(
+    template_path: str,
+    region: Optional[Tuple[int, int, int, int]] = None,
+    confidence: float = 0.1,
+    grayscale: bool = True,
+    method: int = cv2.TM_CCOEFF_NORMED,
+    pyramid: Optional[bool] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    使用 OpenCV 模板匹配在屏幕上定位目标。
+    - template_path: 模板图片路径
+    - region: (left, top, width, height)，限制搜索范围；None 为全屏
+    - confidence: 置信度阈值（TM_CCOEFF_NORMED 模式下范围 0~1）
+    - grayscale: 是否以灰度进行匹配（建议 True，提高速度与稳定性）
+    - method: 匹配方法，默认归一化相关系数
+    - pyramid: 是否使用由粗到精的金字塔匹配；None 跟随全局设置
+
+    返回字典：{"left", "top", "width", "height", "center", "score"}；未命中返回 None。
+    """
+    with span("locate_on_screen", template=os.path.basename(template_path)):
+        screen = grab_screen(region=region, grayscale=grayscale)
+        try:
+            return locate_in_frame(
+                screen,
+                template_path,
+                region=region,
+                confidence=confidence,
+                grayscale=grayscale,
+                method=method,
+                pyramid=pyramid,
+            )
+        finally:
+            release_frame(screen)
+
+
+class InputHandler:
+    """
+    鼠标输入、等待与时钟的实际执行者；录制/回放时可替换为拦截版本。
+    virtual_clock 为 True 时 sleep 只推进 now() 而不真正阻塞（离线回放），
+    异步运行时据此改为逐帧步进（见 runtime.py）。
+    """
+
+    virtual_clock = False
+
+    def click(self, x: int, y: int, clicks: int, interval: float, button: str, move_duration: float) -> None:
+        pyautogui.moveTo(x, y, duration=move_duration)
+        pyautogui.click(x=x, y=y, clicks=clicks, interval=interval, button=button)
+
+    def move(self, x: int, y: int, duration: float) -> None:
+        pyautogui.moveTo(x, y, duration=duration)
+
+    def sleep(self, seconds: float) -> None:
+        time.sleep(max(0.0, seconds))
+
+    def now(self) -> float:
+        return time.monotonic()
+
+
+_INPUT: InputHandler = InputHandler()
+
+
+def get_input_handler() -> InputHandler:
+    """返回当前输入处理器。"""
+    return _INPUT
+
+
+def set_input_handler(handler: Optional[InputHandler]) -> InputHandler:
+    """替换输入处理器（None 恢复默认），返回之前的处理器。"""
+    global _INPUT
+    old = _INPUT
+    _INPUT = handler if handler is not None else InputHandler()
+    return old
+
+
 # 功能：移动到指定坐标并执行点击操作。
 def click_point(
     x: int,
@@ -113,8 +441,32 @@ def click_point(
     move_duration: float = 0.1,
 ) -> None:
     """移动到指定坐标并点击。"""
-    pyautogui.moveTo(x, y, duration=move_duration)
-    pyautogui.click(x=x, y=y, clicks=clicks, interval=interval, button=button)
+    inc("clicks", button=button)
+    with span("click_point"):
+        _INPUT.click(int(x), int(y), clicks, interval, button, move_duration)
+
+
+# 功能：移动鼠标到指定坐标（不点击）。
+def move_pointer(x: int, y: int, duration: float = 0.0) -> None:
+    """移动鼠标，例如把指针移开避免遮挡识别区域。"""
+    _INPUT.move(int(x), int(y), duration)
+
+
+# 功能：等待指定秒数（回放时可被加速）。
+def sleep(seconds: float) -> None:
+    """等待；经由输入处理器执行，离线回放时不会真正阻塞。"""
+    with span("sleep"):
+        _INPUT.sleep(seconds)
+
+
+# 功能：当前时间（秒，单调时钟）；离线回放时为虚拟时钟。
+def clock_now() -> float:
+    return _INPUT.now()
+
+
+def is_virtual_clock() -> bool:
+    """当前输入处理器是否使用虚拟时钟（离线回放）。"""
+    return bool(_INPUT.virtual_clock)
 
 
 # 功能：在屏幕上查找模板并点击命中中心（可偏移）。
@@ -150,7 +502,24 @@ def click_template(
 
 __all__ = [
     "grab_screen",
+    "set_pyramid_matching",
+    "match_template",
+    "locate_in_frame",
+    "locate_all_in_frame",
+    "locate_many",
     "locate_on_screen",
     "click_point",
+    "move_pointer",
+    "sleep",
+    "clock_now",
+    "is_virtual_clock",
+    "InputHandler",
+    "get_input_handler",
+    "set_input_handler",
     "click_template",
+    "TemplateCache",
+    "load_template",
+    "warm_up_templates",
+    "template_cache_stats",
+    "clear_template_cache",
 ]
\ No newline at end of file
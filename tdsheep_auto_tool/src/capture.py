@@ -0,0 +1,303 @@
+from __future__ import annotations
+
+"""
+    capture.py
+    - 功能：可插拔的截屏后端
+    - 后端：
+        1. mss：直接读取系统截屏缓冲区（X11 共享内存 / GDI），零拷贝包装为 ndarray，
+               只做一次颜色转换；需安装 mss（可选依赖）
+        2. pyautogui：原有路径（PIL -> RGB ndarray -> 灰度/BGR），作为兜底
+        3. replay：从磁盘读取帧（PNG 目录或 ndarray 列表），用于离线测试与回放
+    - 颜色转换的输出写入缓冲池（buffers.take_buffer）中同尺寸的空闲缓冲区，连续截取同一区域时不再分配新画面；
+      pyautogui 路径中 PIL 图像本身的分配无法避免
+    - 画面归调用方所有，用完后以 release_frame 归还（同时丢弃其频域缓存）；不归还时按普通数组回收
+    - 基准：python -m tdsheep_auto_tool.src.capture --bench
+"""
+
+import argparse
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Tuple, List, Dict, Any, Union, Sequence
+
+import cv2
+import numpy as np
+import pyautogui
+
+from .buffers import take_buffer, release_buffer
+from .fft_match import forget_frame
+
+Region = Tuple[int, int, int, int]
+
+
+def _convert(img: np.ndarray, code: int, grayscale: bool) -> np.ndarray:
+    """颜色转换到缓冲池中的画面缓冲区。"""
+    h, w = img.shape[:2]
+    dst = take_buffer((h, w) if grayscale else (h, w, 3))
+    cv2.cvtColor(img, code, dst=dst)
+    return dst
+
+
+# 功能：画面用完后归还缓冲池；先丢弃其频域缓存，同一对象装入新画面后不会命中旧的频谱。
+def release_frame(frame: Optional[np.ndarray]) -> None:
+    if frame is None:
+        return
+    forget_frame(frame)
+    release_buffer(frame)
+
+
+class CaptureBackend:
+    """截屏后端接口：grab 返回调用方独占的灰度或 BGR 图像，用完后可以 release_frame 归还。"""
+
+    name = "base"
+
+    def grab(self, region: Optional[Region] = None, grayscale: bool = True) -> np.ndarray:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class PyAutoGuiBackend(CaptureBackend):
+    """原有截屏路径：pyautogui.screenshot -> PIL -> ndarray。"""
+
+    name = "pyautogui"
+
+    def grab(self, region: Optional[Region] = None, grayscale: bool = True) -> np.ndarray:
+        pil_img = pyautogui.screenshot(region=region)
+        img = np.asarray(pil_img)  # PIL -> RGB ndarray
+        # 彩色保留为 BGR，便于与 cv2 算法统一
+        return _convert(img, cv2.COLOR_RGB2GRAY if grayscale else cv2.COLOR_RGB2BGR, grayscale)
+
+
+class MssBackend(CaptureBackend):
+    """
+    基于 mss 的快速截屏。
+    mss 返回 BGRA 原始缓冲区，这里用 np.frombuffer 零拷贝包装后一次转换为灰度/BGR。
+    mss 实例不能跨线程共享，因此每个线程各持有一个。
+    """
+
+    name = "mss"
+
+    def __init__(self) -> None:
+        import mss  # 可选依赖，缺失时由调用方回退
+
+        self._mss = mss
+        self._local = threading.local()
+
+    def _sct(self):
+        sct = getattr(self._local, "sct", None)
+        if sct is None:
+            sct = self._mss.mss()
+            self._local.sct = sct
+        return sct
+
+    def grab(self, region: Optional[Region] = None, grayscale: bool = True) -> np.ndarray:
+        sct = self._sct()
+        if region is None:
+            # 与 pyautogui 一致：主显示器
+            mon = sct.monitors[1]
+            area = {"left": mon["left"], "top": mon["top"], "width": mon["width"], "height": mon["height"]}
+        else:
+            left, top, width, height = region
+            area = {"left": int(left), "top": int(top), "width": int(width), "height": int(height)}
+        shot = sct.grab(area)
+        bgra = np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+        return _convert(bgra, cv2.COLOR_BGRA2GRAY if grayscale else cv2.COLOR_BGRA2BGR, grayscale)
+
+    def close(self) -> None:
+        sct = getattr(self._local, "sct", None)
+        if sct is not None:
+            sct.close()
+            self._local.sct = None
+
+
+class ReplayBackend(CaptureBackend):
+    """
+    从磁盘或内存回放帧。
+    - source: PNG 目录（按文件名排序）、图片路径列表或 BGR ndarray 列表；帧视为全屏截图
+    - loop: 帧用完后是否从头循环；否则一直返回最后一帧
+    region 按屏幕坐标从帧中裁剪。
+    """
+
+    name = "replay"
+
+    def __init__(self, source: Union[str, Path, Sequence[Any]], loop: bool = True) -> None:
+        if isinstance(source, (str, Path)):
+            paths = sorted(Path(source).glob("*.png"))
+            if not paths:
+                raise FileNotFoundError(f"回放目录中没有 PNG 帧: {source}")
+            source = paths
+        self._frames: List[Any] = list(source)
+        if not self._frames:
+            raise ValueError("回放帧列表为空")
+        self._decoded: Dict[int, np.ndarray] = {}
+        self.loop = loop
+        self.index = 0
+        self._lock = threading.Lock()
+
+    def _frame(self, i: int) -> np.ndarray:
+        img = self._decoded.get(i)
+        if img is None:
+            item = self._frames[i]
+            if isinstance(item, np.ndarray):
+                img = item if item.ndim == 3 else cv2.cvtColor(item, cv2.COLOR_GRAY2BGR)
+            else:
+                img = cv2.imread(str(item), cv2.IMREAD_COLOR)
+                if img is None:
+                    raise ValueError(f"无法读取回放帧: {item}")
+            self._decoded[i] = img
+        return img
+
+    def next_frame(self) -> np.ndarray:
+        """取出下一帧（BGR 全屏）。"""
+        with self._lock:
+            i = self.index
+            if i >= len(self._frames):
+                i = 0 if self.loop else len(self._frames) - 1
+                self.index = i
+            self.index += 1
+        return self._frame(i)
+
+    def grab(self, region: Optional[Region] = None, grayscale: bool = True) -> np.ndarray:
+        img = self.next_frame()
+        if region is not None:
+            left, top, width, height = (int(v) for v in region)
+            img = img[top:top + height, left:left + width]
+        if grayscale:
+            return _convert(img, cv2.COLOR_BGR2GRAY, True)
+        out = take_buffer(img.shape)
+        np.copyto(out, img)
+        return out
+
+
+_BACKEND: Optional[CaptureBackend] = None
+_BACKEND_LOCK = threading.Lock()
+
+
+def create_backend(name: str = "auto", **kwargs: Any) -> CaptureBackend:
+    """
+    按名称创建后端：auto / mss / pyautogui / replay。
+    auto 优先使用 mss，未安装时回退到 pyautogui。
+    """
+    name = (name or "auto").lower()
+    if name in ("auto", "mss"):
+        try:
+            return MssBackend()
+        except Exception as e:
+            if name == "mss":
+                raise
+            print(f"[capture] mss 不可用，回退到 pyautogui: {e}")
+            return PyAutoGuiBackend()
+    if name == "pyautogui":
+        return PyAutoGuiBackend()
+    if name == "replay":
+        return ReplayBackend(**kwargs)
+    raise ValueError(f"未知截屏后端: {name}")
+
+
+def get_capture_backend() -> CaptureBackend:
+    """返回当前截屏后端（首次调用时自动选择）。"""
+    global _BACKEND
+    if _BACKEND is None:
+        with _BACKEND_LOCK:
+            if _BACKEND is None:
+                _BACKEND = create_backend("auto")
+                print(f"[capture] 使用截屏后端: {_BACKEND.name}")
+    return _BACKEND
+
+
+def set_capture_backend(backend: Union[str, CaptureBackend], **kwargs: Any) -> CaptureBackend:
+    """切换截屏后端，可传入名称或后端实例；返回新的后端。"""
+    global _BACKEND
+    new = backend if isinstance(backend, CaptureBackend) else create_backend(backend, **kwargs)
+    with _BACKEND_LOCK:
+        old, _BACKEND = _BACKEND, new
+    if old is not None and old is not new:
+        old.close()
+    return new
+
+
+# 功能：测量各后端每秒截屏次数。
+def benchmark_backends(
+    seconds: float = 2.0,
+    region: Optional[Region] = None,
+    grayscale: bool = True,
+    replay_source: Optional[Union[str, Path]] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    依次测量 mss / pyautogui / replay 后端的截屏速率。
+    replay 未指定目录时使用一张合成的 1920x1080 帧。
+    """
+    candidates: List[Tuple[str, Any]] = [
+        ("mss", lambda: create_backend("mss")),
+        ("pyautogui", lambda: create_backend("pyautogui")),
+        (
+            "replay",
+            lambda: ReplayBackend(
+                replay_source
+                if replay_source is not None
+                else [np.random.default_rng(0).integers(0, 256, (1080, 1920, 3), dtype=np.uint8)]
+            ),
+        ),
+    ]
+    results: Dict[str, Dict[str, Any]] = {}
+    for name, factory in candidates:
+        try:
+            backend = factory()
+            backend.grab(region, grayscale)  # 预热
+        except Exception as e:
+            print(f"[bench] {name}: 不可用 ({e})")
+            results[name] = {"available": False, "error": str(e)}
+            continue
+        count = 0
+        shape: Tuple[int, ...] = ()
+        t0 = time.perf_counter()
+        deadline = t0 + seconds
+        while time.perf_counter() < deadline:
+            frame = backend.grab(region, grayscale)
+            shape = frame.shape
+            release_frame(frame)
+            count += 1
+        elapsed = time.perf_counter() - t0
+        backend.close()
+        fps = count / elapsed if elapsed > 0 else 0.0
+        results[name] = {"available": True, "captures": count, "fps": fps, "shape": list(shape)}
+        print(f"[bench] {name:<10} {fps:8.1f} 次/秒  ({count} 次, 帧尺寸 {shape})")
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="截屏后端基准测试")
+    parser.add_argument("--bench", action="store_true", help="测量各后端的每秒截屏次数")
+    parser.add_argument("--seconds", type=float, default=2.0, help="每个后端的测量时长")
+    parser.add_argument("--region", type=int, nargs=4, metavar=("LEFT", "TOP", "WIDTH", "HEIGHT"))
+    parser.add_argument("--color", action="store_true", help="以 BGR 彩色截屏（默认灰度）")
+    parser.add_argument("--replay-dir", type=str, default=None, help="replay 后端使用的 PNG 帧目录")
+    args = parser.parse_args(argv)
+    if not args.bench:
+        parser.print_help()
+        return
+    benchmark_backends(
+        seconds=args.seconds,
+        region=tuple(args.region) if args.region else None,
+        grayscale=not args.color,
+        replay_source=args.replay_dir,
+    )
+
+
+__all__ = [
+    "CaptureBackend",
+    "PyAutoGuiBackend",
+    "MssBackend",
+    "ReplayBackend",
+    "release_frame",
+    "create_backend",
+    "get_capture_backend",
+    "set_capture_backend",
+    "benchmark_backends",
+]
+
+
+if __name__ == "__main__":
+    main()
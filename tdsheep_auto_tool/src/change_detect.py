@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+"""
+    change_detect.py
+    - 功能：轮询循环的画面变化检测
+    - 思路：记录每个检测项“上次未命中”时的画面，下一次检测时按瓦片比较差异：
+        1. 画面完全没变：上次全图都没匹配上，这次也不会，直接跳过 matchTemplate
+        2. 部分瓦片变化：新的命中必然与变化瓦片重叠，只在变化区域（外扩模板尺寸）内匹配
+        3. 无历史记录或变化面积过大：完整匹配
+"""
+
+import threading
+from typing import Optional, Tuple, List, Dict, Any, Hashable
+
+import cv2
+import numpy as np
+
+# 比较瓦片边长（像素）
+TILE_SIZE: int = 32
+# 瓦片内最大像素差超过该值视为变化（吸收少量渲染抖动）
+DIFF_THRESHOLD: int = 4
+# 变化区域超过画面该比例时，直接完整匹配
+FULL_MATCH_RATIO: float = 0.6
+
+# 一个匹配区域：(x0, y0, x1, y1)，画面坐标
+Roi = Tuple[int, int, int, int]
+
+
+class ChangeGate:
+    """
+    按检测键保存上次未命中时的画面，并给出本次需要匹配的区域。
+    检测键应包含影响结果的全部参数（模板、灰度、阈值、截屏区域等）。
+    """
+
+    def __init__(self, tile: int = TILE_SIZE, threshold: int = DIFF_THRESHOLD) -> None:
+        self.tile = int(tile)
+        self.threshold = int(threshold)
+        self._negatives: Dict[Hashable, np.ndarray] = {}
+        self._lock = threading.Lock()
+        self.checks = 0
+        self.skipped = 0
+        self.partial = 0
+        self.full = 0
+        self.pixels_total = 0
+        self.pixels_matched = 0
+
+    def dirty_tiles(self, key: Hashable, frame: np.ndarray) -> Optional[np.ndarray]:
+        """
+        返回相对上次未命中画面的变化瓦片掩码（bool 数组）。
+        无历史或尺寸变化时返回 None，表示需要完整匹配。
+        """
+        with self._lock:
+            prev = self._negatives.get(key)
+        if prev is None or prev.shape != frame.shape:
+            return None
+        diff = cv2.absdiff(prev, frame)
+        if diff.ndim == 3:
+            diff = diff.max(axis=2)
+        h, w = diff.shape
+        t = self.tile
+        th, tw = -(-h // t), -(-w // t)
+        padded = np.zeros((th * t, tw * t), dtype=diff.dtype)
+        padded[:h, :w] = diff
+        return padded.reshape(th, t, tw, t).max(axis=(1, 3)) > self.threshold
+
+    def rois(self, dirty: np.ndarray, frame_shape: Tuple[int, ...], tpl_shape: Tuple[int, ...]) -> Optional[List[Roi]]:
+        """
+        将变化瓦片转换为需要匹配的区域：每块变化区域向四周外扩模板尺寸，
+        相互重叠的区域合并。返回 None 表示变化过大，应完整匹配。
+        """
+        fh, fw = frame_shape[:2]
+        th, tw = tpl_shape[:2]
+        t = self.tile
+        # 按模板尺寸（瓦片单位）膨胀，使会重叠的区域连成一片
+        ky = 2 * (-(-(th - 1) // t)) + 1
+        kx = 2 * (-(-(tw - 1) // t)) + 1
+        mask = cv2.dilate(dirty.astype(np.uint8), np.ones((ky, kx), np.uint8))
+        count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        out: List[Roi] = []
+        area = 0
+        for i in range(1, count):
+            x, y, w, h = stats[i][:4]
+            x0, y0 = int(x) * t, int(y) * t
+            x1, y1 = min(fw, int(x + w) * t), min(fh, int(y + h) * t)
+            if x1 - x0 < tw or y1 - y0 < th:
+                # 太窄放不下模板：向外补足
+                x0 = max(0, min(x0, x1 - tw))
+                y0 = max(0, min(y0, y1 - th))
+            out.append((x0, y0, x1, y1))
+            area += (x1 - x0) * (y1 - y0)
+        if area > FULL_MATCH_RATIO * fh * fw:
+            return None
+        return out
+
+    def record_negative(self, key: Hashable, frame: np.ndarray) -> None:
+        """保存一次未命中时的画面（复用已有缓冲区）。"""
+        with self._lock:
+            prev = self._negatives.get(key)
+            if prev is not None and prev.shape == frame.shape and prev.dtype == frame.dtype:
+                np.copyto(prev, frame)
+            else:
+                self._negatives[key] = frame.copy()
+
+    def clear(self, key: Optional[Hashable] = None) -> None:
+        """命中后删除该键的历史；key 为 None 时清空全部。"""
+        with self._lock:
+            if key is None:
+                self._negatives.clear()
+            else:
+                self._negatives.pop(key, None)
+
+    def count(self, frame_pixels: int, matched_pixels: int, mode: str) -> None:
+        """记录一次检测：mode 为 skip / partial / full。"""
+        with self._lock:
+            self.checks += 1
+            self.pixels_total += frame_pixels
+            self.pixels_matched += matched_pixels
+            if mode == "skip":
+                self.skipped += 1
+            elif mode == "partial":
+                self.partial += 1
+            else:
+                self.full += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """返回跳过与节省的匹配工作量统计。"""
+        with self._lock:
+            saved = 1.0 - (self.pixels_matched / self.pixels_total) if self.pixels_total else 0.0
+            return {
+                "checks": self.checks,
+                "skipped": self.skipped,
+                "partial": self.partial,
+                "full": self.full,
+                "pixels_total": self.pixels_total,
+                "pixels_matched": self.pixels_matched,
+                "saved_ratio": saved,
+            }
+
+
+_GATE = ChangeGate()
+
+
+def get_change_gate() -> ChangeGate:
+    """返回进程内共享的变化检测器。"""
+    return _GATE
+
+
+def gate_stats() -> Dict[str, Any]:
+    """返回共享变化检测器的统计信息。"""
+    return _GATE.stats()
+
+
+def report_gate_stats() -> None:
+    """打印变化检测节省的匹配量。"""
+    st = _GATE.stats()
+    print(
+        f"[gate] 检测 {st['checks']} 次：跳过 {st['skipped']}，局部 {st['partial']}，完整 {st['full']}；"
+        f"节省匹配面积 {st['saved_ratio'] * 100:.1f}%"
+    )
+
+
+__all__ = [
+    "ChangeGate",
+    "get_change_gate",
+    "gate_stats",
+    "report_gate_stats",
+]
@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+"""
+    config.py
+    - 功能：读取项目根目录 config.json 的顶层配置段
+    - 各模块的 load_*_config 只负责解析自己的字段与默认值，文件读取统一走 load_config_section
+    - 本模块不依赖包内其他模块，底层模块（buffers、executor、fft_match 等）可直接导入
+"""
+
+import json
+from pathlib import Path
+from typing import Optional, Dict, Any
+
+
+def get_config_path() -> Path:
+    """项目根目录下的 config.json。"""
+    return Path(__file__).resolve().parent.parent.parent / "config.json"
+
+
+# 功能：读取 config.json 中名为 name 的配置段；文件不存在、读取失败或该段不是对象时返回 default
+def load_config_section(name: str, default: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    fallback: Dict[str, Any] = default if default is not None else {}
+    cfg_path = get_config_path()
+    if not cfg_path.exists():
+        return fallback
+    try:
+        with cfg_path.open("r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception as e:
+        print(f"[config] 读取 {name} 配置失败，使用默认: {e}")
+        return fallback
+    section = data.get(name) if isinstance(data, dict) else None
+    return section if isinstance(section, dict) else fallback
+
+
+__all__ = [
+    "get_config_path",
+    "load_config_section",
+]
@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+"""
+    executor.py
+    - 功能：模板匹配的线程池
+    - 思路：cv2.matchTemplate 执行期间释放 GIL，同一画面上互不依赖的
+            模板/比例匹配可以在多个核心上同时进行
+    - 短路：map_ordered 按提交顺序取结果；某个任务满足停止条件后，
+            排在它之后、尚未开始的任务直接取消，已在运行的任务结果被丢弃，
+            返回结果与串行执行完全一致
+    - 配置：config.json 中 matching.workers，0 表示按 CPU 核数自动选择，1 表示串行
+"""
+
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Optional, List, Dict, Any, Callable, Iterable, TypeVar
+
+from .config import load_config_section
+from .instance import bind_instance, current_instance
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# 自动选择时的线程数上限（再多会与截屏、输入线程争抢核心）
+MAX_AUTO_WORKERS: int = 8
+
+_LOCAL = threading.local()
+
+
+def _in_pool() -> bool:
+    return getattr(_LOCAL, "in_pool", False)
+
+
+def _auto_workers() -> int:
+    return max(1, min(MAX_AUTO_WORKERS, os.cpu_count() or 1))
+
+
+class MatchExecutor:
+    """
+    匹配任务线程池。
+    - workers: 线程数；<= 1 时所有任务在调用线程内串行执行
+    池内任务再次提交的任务（例如批量匹配内部的多比例匹配）也在当前线程串行执行，避免池内互相等待。
+    """
+
+    def __init__(self, workers: int) -> None:
+        self.workers = max(1, int(workers))
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.cancelled = 0
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="match")
+            return self._pool
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+    # 功能：按顺序对 items 执行 fn，stop(result) 为真时短路。
+    def map_ordered(
+        self,
+        fn: Callable[[T], R],
+        items: Iterable[T],
+        stop: Optional[Callable[[R], bool]] = None,
+    ) -> List[R]:
+        """
+        返回与串行执行相同的结果列表：逐项执行直到第一个满足 stop 的结果（含该项）。
+        任务抛出的异常在取消剩余任务后原样抛出。
+        返回前等待已开始执行的剩余任务结束，调用方随后即可归还传给任务的缓冲区（如画面）。
+        """
+        items = list(items)
+        if self.workers <= 1 or len(items) <= 1 or _in_pool():
+            out: List[R] = []
+            for it in items:
+                r = fn(it)
+                out.append(r)
+                if stop is not None and stop(r):
+                    break
+            return out
+
+        inst = current_instance()
+        lock = threading.Lock()
+        # 已知满足停止条件的最小下标；之后的任务无需再执行
+        cut = [len(items)]
+        skipped = [0]
+        futures: List[Future] = []
+
+        def run(index: int, item: T) -> Any:
+            with lock:
+                if index > cut[0]:
+                    skipped[0] += 1
+                    return None
+            _LOCAL.in_pool = True
+            try:
+                with bind_instance(inst):
+                    r = fn(item)
+            finally:
+                _LOCAL.in_pool = False
+            if stop is not None and stop(r):
+                with lock:
+                    if index < cut[0]:
+                        cut[0] = index
+                for f in futures[index + 1:]:
+                    if f.cancel():
+                        with lock:
+                            skipped[0] += 1
+            return r
+
+        pool = self._get_pool()
+        for i, it in enumerate(items):
+            futures.append(pool.submit(run, i, it))
+
+        out = []
+        try:
+            for i, f in enumerate(futures):
+                r = f.result()
+                out.append(r)
+                if stop is not None and stop(r):
+                    break
+        finally:
+            rest = [f for f in futures[len(out):] if not f.cancel()]
+            if rest:
+                wait(rest)
+            with lock:
+                n = skipped[0]
+            with self._lock:
+                self.submitted += len(items)
+                self.cancelled += n
+        return out
+
+    def map(self, fn: Callable[[T], R], items: Iterable[T]) -> List[R]:
+        """对全部 items 并行执行 fn，按输入顺序返回结果。"""
+        return self.map_ordered(fn, items)
+
+    def stats(self) -> Dict[str, Any]:
+        """已提交任务数与因短路被取消/跳过的任务数（只统计并行路径）。"""
+        with self._lock:
+            return {"workers": self.workers, "submitted": self.submitted, "cancelled": self.cancelled}
+
+
+def load_executor_config() -> Dict[str, Any]:
+    """读取 config.json 中 matching.workers 配置（可选）。"""
+    default = {"workers": 0}
+    m = load_config_section("matching")
+    try:
+        return {"workers": int(m.get("workers", default["workers"]))}
+    except (TypeError, ValueError) as e:
+        print(f"[config] matching.workers 配置无效，使用默认: {e}")
+        return default
+
+
+_EXECUTOR: Optional[MatchExecutor] = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def get_match_executor() -> MatchExecutor:
+    """返回进程内共享的匹配线程池（首次访问时按配置创建）。"""
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            workers = load_executor_config()["workers"]
+            _EXECUTOR = MatchExecutor(workers if workers > 0 else _auto_workers())
+        return _EXECUTOR
+
+
+def set_match_workers(workers: int) -> MatchExecutor:
+    """重建匹配线程池；workers 为 0 时按 CPU 核数自动选择，1 为串行。"""
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        old, _EXECUTOR = _EXECUTOR, MatchExecutor(workers if workers > 0 else _auto_workers())
+        new = _EXECUTOR
+    if old is not None:
+        old.shutdown()
+    return new
+
+
+__all__ = [
+    "MatchExecutor",
+    "get_match_executor",
+    "set_match_workers",
+    "load_executor_config",
+]
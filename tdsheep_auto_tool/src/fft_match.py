@@ -0,0 +1,602 @@
+from __future__ import annotations
+
+"""
+    fft_match.py
+    - 功能：频域模板匹配（TM_CCOEFF_NORMED），同一画面上的多个模板共用画面侧的计算
+    - 思路：
+        1. 每帧只做一次：画面（逐通道）零填充到最优 DFT 尺寸后的正向 DFT，以及和/平方和积分图
+        2. 每个模板：零均值模板的 DFT（按 DFT 尺寸缓存），与画面频谱相乘后逆变换得到相关分子
+        3. 分母所需的窗口方差由积分图得到，同一帧内按模板尺寸缓存
+        4. 归一化与 OpenCV 一致（分母过小时的处理、纯色模板返回全 1）
+       画面尺寸 N >= H 时，有效区域内的循环相关不会回绕，模板无需额外填充
+    - 引擎选择（config.json 中 matching.engine）：
+        auto     彩色画面、以及窗口大小以内的灰度画面走频域，其余 cv2.matchTemplate（默认）；
+                 阈值来自 bench_match --fft 的实测：彩色时频域在各尺寸都快 3~4 倍；
+                 灰度在窗口区域（约 800x684）上快约 1.5 倍，整屏 1080p 以上与 cv2 相当
+        spatial  始终 cv2.matchTemplate
+        fft      TM_CCOEFF_NORMED 始终走频域
+    - 画面按对象身份缓存（同一 ndarray 视为同一帧），调用方不得原地改写已匹配过的画面；
+      需要复用画面缓冲区时先调用 forget_frame；小画面（如近位搜索的 ROI）计算很快，不进入缓存，
+      以免挤掉整帧的频谱
+    - 画面频谱、积分图、窗口标准差、模板频谱，以及逐次匹配的中间量与结果图都取自缓冲池（buffers.take_buffer）：
+      中间量在函数返回前归还；画面频谱随画面缓存保留，画面被淘汰且没有匹配仍在使用时整体归还，
+      供下一帧复用；模板频谱同样在淘汰且无人使用后归还；结果图归调用方所有，取完极值后以 release_buffer 归还
+    - 尺寸随模板变化的数组（窗口标准差、结果图等）按画面面积借出视图（buffers.take_buffer_view），
+      不同尺寸的模板共用同一组缓冲区
+    - 自检：python -m tdsheep_auto_tool.src.fft_match
+      在合成画面上对比频域与 cv2.matchTemplate 的结果与耗时
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple, List, Dict, Any
+
+import cv2
+import numpy as np
+
+from .buffers import take_buffer, take_buffer_view, release_buffer
+from .config import load_config_section
+
+ENGINES = ("auto", "spatial", "fft")
+# auto 模式下灰度匹配走频域的画面面积上限（像素）；彩色匹配始终走频域
+FFT_MAX_FRAME_AREA_GRAY: int = 1000 * 1000
+# 面积小于该值的画面不缓存频谱（模板频谱同样不缓存）
+FFT_CACHE_MIN_FRAME_AREA: int = 160 * 1000
+# 保留频谱的画面数量（灰度与彩色画面常交替使用）
+FRAME_CACHE_SIZE: int = 2
+# 每帧缓存的窗口标准差（按模板尺寸）数量
+WINDOW_STD_CACHE_SIZE: int = 8
+# 模板频谱缓存的字节预算
+TEMPLATE_SPECTRUM_MAX_BYTES: int = 128 * 1024 * 1024
+
+
+class FrameSpectrum:
+    """
+    一帧画面的频域数据：逐通道的 DFT（CCS 打包格式，float32）、和积分图、平方和积分图（float64）。
+    数组借自缓冲池：frame_spectrum 每次返回时登记一个使用者，用完后调用 done()；
+    画面被淘汰（retire）且没有使用者时归还全部数组。
+    """
+
+    def __init__(self, frame: np.ndarray) -> None:
+        self.frame = frame
+        self.shape = frame.shape[:2]
+        h, w = self.shape
+        self.dft_shape = (cv2.getOptimalDFTSize(h), cv2.getOptimalDFTSize(w))
+        self.spectra: List[np.ndarray] = []
+        self.sums: List[np.ndarray] = []
+        self.sqsum: Optional[np.ndarray] = None
+        self._std: "OrderedDict[Tuple[int, int], Tuple[np.ndarray, Optional[np.ndarray]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._users = 0
+        self._retired = False
+        # 计算在 _build 中进行（不持有 _FRAMES_LOCK）；同一画面的其他使用者等待 _ready
+        self._ready = threading.Event()
+        self._error: Optional[BaseException] = None
+
+    def _build(self) -> None:
+        """计算逐通道 DFT 与积分图。"""
+        frame = self.frame
+        h, w = self.shape
+        channels = (
+            [frame] if frame.ndim == 2
+            else [cv2.extractChannel(frame, i, dst=take_buffer((h, w))) for i in range(frame.shape[2])]
+        )
+        sqsum: Optional[np.ndarray] = None
+        for ch in channels:
+            # 模板为零均值，画面整体减去常数不改变相关结果；去掉直流分量可减小大片纯色背景下的 float32 误差
+            padded = take_buffer(self.dft_shape, np.float32)
+            padded[h:, :] = 0
+            padded[:h, w:] = 0
+            cv2.subtract(ch, float(cv2.mean(ch)[0]), dst=padded[:h, :w], dtype=cv2.CV_32F)
+            spectrum = take_buffer(self.dft_shape, np.float32)
+            cv2.dft(padded, dst=spectrum)
+            self.spectra.append(spectrum)
+            release_buffer(padded)
+            s = take_buffer((h + 1, w + 1), np.float64)
+            sq = take_buffer((h + 1, w + 1), np.float64)
+            cv2.integral2(ch, sum=s, sqsum=sq, sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+            self.sums.append(s)
+            if sqsum is None:
+                sqsum = sq
+            else:
+                cv2.add(sqsum, sq, dst=sqsum)
+                release_buffer(sq)
+        if frame.ndim != 2:
+            release_buffer(*channels)
+        self.sqsum = sqsum
+
+    @property
+    def nbytes(self) -> int:
+        n = sum(a.nbytes for a in self.spectra) + sum(a.nbytes for a in self.sums)
+        n += self.sqsum.nbytes if self.sqsum is not None else 0
+        return n + sum(std.nbytes + (flat.nbytes if flat is not None else 0) for std, flat in self._std.values())
+
+    def window_std(self, th: int, tw: int) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """
+        有效区域内每个窗口的 sqrt(Σ(x - 窗口均值)²)（各通道求和，float32），以及纯色窗口（值为 0）的掩码，
+        没有纯色窗口时掩码为 None。按模板尺寸缓存。
+        """
+        key = (th, tw)
+        with self._lock:
+            item = self._std.get(key)
+            if item is not None:
+                self._std.move_to_end(key)
+                return item
+
+        # 以 n·Σx² - (Σx)² 计算：像素为整数，模板面积 n 在 20 万像素以内时该值在 float64 中精确，
+        # 纯色窗口恰为 0；非纯色窗口该值 >= n - 1，分母不会小到被 float32 频域误差放大
+        rshape = (self.shape[0] - th + 1, self.shape[1] - tw + 1)
+        # 尺寸随模板变化，按画面面积借出，不同尺寸的模板共用同一组缓冲区
+        cap = self.shape[0] * self.shape[1]
+
+        def _box(ii: np.ndarray, out: np.ndarray) -> np.ndarray:
+            cv2.subtract(ii[th:, tw:], ii[:-th, tw:], dst=out)
+            cv2.subtract(out, ii[th:, :-tw], dst=out)
+            cv2.add(out, ii[:-th, :-tw], dst=out)
+            return out
+
+        n = th * tw
+        var = _box(self.sqsum, take_buffer_view(rshape, cap, np.float64))
+        cv2.multiply(var, float(n), dst=var)
+        s1 = take_buffer_view(rshape, cap, np.float64)
+        for s in self.sums:
+            _box(s, s1)
+            cv2.multiply(s1, s1, dst=s1)
+            cv2.subtract(var, s1, dst=var)
+        cv2.max(var, 0.0, dst=var)
+        cv2.multiply(var, 1.0 / n, dst=var)
+        cv2.sqrt(var, dst=var)
+        std = take_buffer_view(rshape, cap, np.float32)
+        std[...] = var
+        release_buffer(var, s1)
+        flat = np.equal(std, 0, out=take_buffer_view(rshape, cap, np.bool_))
+        if not flat.any():
+            release_buffer(flat)
+            flat = None
+        item = (std, flat)
+
+        with self._lock:
+            cached = self._std.get(key)
+            if cached is not None:
+                # 其他线程已算好同一尺寸：沿用缓存中的条目，归还本次结果
+                release_buffer(std, flat)
+                return cached
+            self._std[key] = item
+            while len(self._std) > WINDOW_STD_CACHE_SIZE:
+                # 同一帧上的其他匹配可能仍在使用被挤出的条目，不归还，交给垃圾回收
+                self._std.popitem(last=False)
+        return item
+
+    def done(self) -> None:
+        """结束一次使用；画面已被淘汰且这是最后一个使用者时归还全部数组。"""
+        with _FRAMES_LOCK:
+            self._users -= 1
+            free = self._retired and self._users == 0
+        if free:
+            self._free()
+
+    def _retire(self) -> None:
+        """画面离开缓存（需持有 _FRAMES_LOCK）；仍有使用者时由最后一个 done() 归还。"""
+        self._retired = True
+        if self._users == 0:
+            self._free()
+
+    def _free(self) -> None:
+        release_buffer(*self.spectra, *self.sums, self.sqsum)
+        for std, flat in self._std.values():
+            release_buffer(std, flat)
+        self.spectra, self.sums, self.sqsum = [], [], None
+        self._std.clear()
+
+
+class TemplateSpectrum:
+    """
+    零均值模板在某一 DFT 尺寸下的逐通道频谱（借自缓冲池）与模板范数 sqrt(Σ(t - 均值)²)。
+    与 FrameSpectrum 相同：acquire 每次返回时登记一个使用者，用完后 release；
+    离开缓存（淘汰）且没有使用者时归还频谱。
+    """
+
+    def __init__(self, tpl: np.ndarray, dft_shape: Tuple[int, int]) -> None:
+        self.tpl = tpl
+        th, tw = tpl.shape[:2]
+        channels = [tpl] if tpl.ndim == 2 else cv2.split(tpl)
+        padded = take_buffer(dft_shape, np.float32)
+        padded[th:, :] = 0
+        padded[:th, tw:] = 0
+        self.spectra: List[np.ndarray] = []
+        norm2 = 0.0
+        for ch in channels:
+            centered = ch.astype(np.float64)
+            centered -= centered.mean()
+            norm2 += float((centered * centered).sum())
+            padded[:th, :tw] = centered
+            spectrum = take_buffer(dft_shape, np.float32)
+            cv2.dft(padded, dst=spectrum)
+            self.spectra.append(spectrum)
+        release_buffer(padded)
+        self.tnorm = float(np.sqrt(norm2))
+        self.nbytes = sum(a.nbytes for a in self.spectra)
+        self._users = 0
+        self._retired = False
+
+    def _free(self) -> None:
+        release_buffer(*self.spectra)
+        self.spectra = []
+
+
+class TemplateSpectrumCache:
+    """
+    模板频谱缓存（LRU，按字节预算淘汰）。
+    键为 (id(模板), DFT 尺寸)，条目持有模板引用，避免 id 被复用。
+    被淘汰的频谱在最后一个使用者 release 后归还缓冲池，供之后的模板复用，
+    模板多于预算（例如 1080p 彩色）时轮换计算而不再反复分配。
+    """
+
+    def __init__(self, max_bytes: int = TEMPLATE_SPECTRUM_MAX_BYTES) -> None:
+        self.max_bytes = int(max_bytes)
+        self._items: "OrderedDict[Tuple[int, Tuple[int, int]], TemplateSpectrum]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def acquire(self, tpl: np.ndarray, dft_shape: Tuple[int, int], cache: bool = True) -> TemplateSpectrum:
+        """返回模板频谱并登记一个使用者，用完后调用 release；cache=False 时只计算不缓存。"""
+        key = (id(tpl), dft_shape)
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and item.tpl is tpl:
+                self._items.move_to_end(key)
+                self.hits += 1
+                item._users += 1
+                return item
+            self.misses += 1
+
+        item = TemplateSpectrum(tpl, dft_shape)
+        item._users = 1
+        if not cache:
+            item._retired = True
+            return item
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+                self._retire(old)
+            self._items[key] = item
+            self._bytes += item.nbytes
+            while self._bytes > self.max_bytes and len(self._items) > 1:
+                _, old = self._items.popitem(last=False)
+                self._bytes -= old.nbytes
+                self._retire(old)
+                self.evictions += 1
+        return item
+
+    def release(self, item: TemplateSpectrum) -> None:
+        """结束一次使用；已被淘汰且这是最后一个使用者时归还频谱。"""
+        with self._lock:
+            item._users -= 1
+            free = item._retired and item._users == 0
+        if free:
+            item._free()
+
+    @staticmethod
+    def _retire(item: TemplateSpectrum) -> None:
+        """条目离开缓存（需持有 self._lock）；仍有使用者时由最后一个 release 归还。"""
+        item._retired = True
+        if item._users == 0:
+            item._free()
+
+    def clear(self) -> None:
+        with self._lock:
+            for item in self._items.values():
+                self._retire(item)
+            self._items.clear()
+            self._bytes = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._items),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / total) if total else 0.0,
+            }
+
+
+_FRAMES: "OrderedDict[int, FrameSpectrum]" = OrderedDict()
+_FRAMES_LOCK = threading.Lock()
+_TEMPLATE_SPECTRA = TemplateSpectrumCache()
+_FRAME_STATS = {"built": 0, "reused": 0}
+
+
+def _cacheable(frame: np.ndarray) -> bool:
+    return frame.shape[0] * frame.shape[1] >= FFT_CACHE_MIN_FRAME_AREA
+
+
+def frame_spectrum(frame: np.ndarray) -> FrameSpectrum:
+    """
+    返回画面的频域数据，用完后调用其 done()；同一画面对象只计算一次（并发调用时其余线程等待首个计算完成）。
+    计算不持有全局锁：锁内只登记条目，不同画面可在各匹配线程中同时计算。
+    不缓存的小画面在 done() 时直接归还。
+    """
+    if not _cacheable(frame):
+        fs = FrameSpectrum(frame)
+        fs._users, fs._retired = 1, True
+        fs._build()
+        return fs
+    key = id(frame)
+    with _FRAMES_LOCK:
+        fs = _FRAMES.get(key)
+        build = fs is None or fs.frame is not frame
+        if build:
+            fs = FrameSpectrum(frame)
+            _FRAMES[key] = fs
+            _FRAME_STATS["built"] += 1
+            while len(_FRAMES) > FRAME_CACHE_SIZE:
+                _FRAMES.popitem(last=False)[1]._retire()
+        else:
+            _FRAMES.move_to_end(key)
+            _FRAME_STATS["reused"] += 1
+        fs._users += 1
+    if build:
+        try:
+            fs._build()
+        except BaseException as e:
+            fs._error = e
+            forget_frame(frame)
+            fs._ready.set()
+            fs.done()
+            raise
+        fs._ready.set()
+    else:
+        fs._ready.wait()
+        if fs._error is not None:
+            fs.done()
+            raise fs._error
+    return fs
+
+
+def forget_frame(frame: Optional[np.ndarray] = None) -> None:
+    """丢弃画面（None 为全部）的频域数据；原地改写或归还画面缓冲区前调用。"""
+    with _FRAMES_LOCK:
+        if frame is None:
+            for fs in _FRAMES.values():
+                fs._retire()
+            _FRAMES.clear()
+        else:
+            fs = _FRAMES.get(id(frame))
+            if fs is not None and fs.frame is frame:
+                del _FRAMES[id(frame)]
+                fs._retire()
+
+
+# 功能：频域计算 TM_CCOEFF_NORMED 结果图，与 cv2.matchTemplate 的输出形状和取值一致。
+def ccoeff_normed_fft(screen: np.ndarray, tpl: np.ndarray) -> np.ndarray:
+    """screen 与 tpl 需同为灰度或同为 BGR，且模板不大于画面；结果图借自缓冲池，用完后可 release_buffer 归还。"""
+    fs = frame_spectrum(screen)
+    try:
+        return _ccoeff_normed(fs, tpl, _cacheable(screen))
+    finally:
+        fs.done()
+
+
+def _ccoeff_normed(fs: FrameSpectrum, tpl: np.ndarray, cache: bool) -> np.ndarray:
+    h, w = fs.shape
+    th, tw = tpl.shape[:2]
+    rh, rw = h - th + 1, w - tw + 1
+    ts = _TEMPLATE_SPECTRA.acquire(tpl, fs.dft_shape, cache=cache)
+    try:
+        tnorm = ts.tnorm
+        if tnorm < np.finfo(np.float64).eps:
+            # 与 OpenCV 相同：纯色模板的归一化相关系数定义为 1
+            return np.ones((rh, rw), np.float32)
+
+        prod = take_buffer(fs.dft_shape, np.float32)
+        tmp = take_buffer(fs.dft_shape, np.float32) if len(ts.spectra) > 1 else None
+        for i, (fspec, tspec) in enumerate(zip(fs.spectra, ts.spectra)):
+            if i == 0:
+                cv2.mulSpectrums(fspec, tspec, 0, c=prod, conjB=True)
+            else:
+                cv2.mulSpectrums(fspec, tspec, 0, c=tmp, conjB=True)
+                cv2.add(prod, tmp, dst=prod)
+    finally:
+        _TEMPLATE_SPECTRA.release(ts)
+    full = take_buffer(fs.dft_shape, np.float32)
+    cv2.idft(prod, dst=full, flags=cv2.DFT_SCALE | cv2.DFT_REAL_OUTPUT)
+    release_buffer(prod, tmp)
+
+    std, flat = fs.window_std(th, tw)
+    cap = h * w
+    den = take_buffer_view((rh, rw), cap, np.float32)
+    cv2.multiply(std, float(tnorm), dst=den)
+    res = take_buffer_view((rh, rw), cap, np.float32)
+    cv2.divide(full[:rh, :rw], den, dst=res)
+    release_buffer(full, den)
+    if flat is not None:
+        # 与 OpenCV 相同：纯色窗口（分母为 0）的结果为 0
+        np.putmask(res, flat, 0.0)
+    # 与 OpenCV 相同：|num| 略大于分母（浮点误差）时取 ±1，远大于分母（分母近 0）时取 0
+    lo, hi, _, _ = cv2.minMaxLoc(res)
+    if hi >= 1.0 or lo <= -1.0:
+        mag = take_buffer_view((rh, rw), cap, np.float32)
+        far = take_buffer_view((rh, rw), cap, np.bool_)
+        np.abs(res, out=mag)
+        np.putmask(res, np.greater_equal(mag, 1.125, out=far), 0.0)
+        np.clip(res, -1.0, 1.0, out=res)
+        release_buffer(mag, far)
+    return res
+
+
+def use_fft(screen_shape: Tuple[int, ...]) -> bool:
+    """auto 模式的引擎选择（见模块说明）。"""
+    if len(screen_shape) == 3 and screen_shape[2] > 1:
+        return True
+    return screen_shape[0] * screen_shape[1] <= FFT_MAX_FRAME_AREA_GRAY
+
+
+def load_engine_config() -> Dict[str, Any]:
+    """读取 config.json 中 matching.engine 配置（可选）。"""
+    default = {"engine": "auto"}
+    engine = str(load_config_section("matching").get("engine", default["engine"])).lower()
+    if engine not in ENGINES:
+        print(f"[config] 未知的匹配引擎 {engine}，使用 auto")
+        return default
+    return {"engine": engine}
+
+
+_ENGINE: Optional[str] = None
+
+
+def get_matching_engine() -> str:
+    global _ENGINE
+    if _ENGINE is None:
+        _ENGINE = load_engine_config()["engine"]
+    return _ENGINE
+
+
+def set_matching_engine(engine: str) -> str:
+    """切换匹配引擎（auto / spatial / fft），返回之前的引擎。"""
+    global _ENGINE
+    if engine not in ENGINES:
+        raise ValueError(f"未知的匹配引擎: {engine}")
+    old = get_matching_engine()
+    _ENGINE = engine
+    return old
+
+
+# 功能：按当前引擎计算模板匹配结果图（替代直接调用 cv2.matchTemplate）。
+def match_template_map(screen: np.ndarray, tpl: np.ndarray, method: int = cv2.TM_CCOEFF_NORMED) -> np.ndarray:
+    """结果图借自缓冲池、归调用方所有，取完极值后以 release_buffer 归还。"""
+    engine = get_matching_engine()
+    if method == cv2.TM_CCOEFF_NORMED and (
+        engine == "fft" or (engine == "auto" and use_fft(screen.shape))
+    ):
+        return ccoeff_normed_fft(screen, tpl)
+    rh, rw = screen.shape[0] - tpl.shape[0] + 1, screen.shape[1] - tpl.shape[1] + 1
+    if rh < 1 or rw < 1:
+        return cv2.matchTemplate(screen, tpl, method)  # 由 cv2 报告尺寸错误
+    res = take_buffer_view((rh, rw), screen.shape[0] * screen.shape[1], np.float32)
+    cv2.matchTemplate(screen, tpl, method, result=res)
+    return res
+
+
+def fft_stats() -> Dict[str, Any]:
+    with _FRAMES_LOCK:
+        frames = {
+            "frames": len(_FRAMES),
+            "frame_bytes": sum(fs.nbytes for fs in _FRAMES.values()),
+            "frames_built": _FRAME_STATS["built"],
+            "frames_reused": _FRAME_STATS["reused"],
+        }
+    return {"engine": get_matching_engine(), **frames, "templates": _TEMPLATE_SPECTRA.stats()}
+
+
+def clear_fft_cache() -> None:
+    """清空画面与模板的频域缓存。"""
+    forget_frame(None)
+    _TEMPLATE_SPECTRA.clear()
+    _FRAME_STATS["built"] = _FRAME_STATS["reused"] = 0
+
+
+# 功能：在合成画面上对比频域与 cv2.matchTemplate，打印一致率与耗时。
+def verify_against_spatial(
+    rounds: int = 6,
+    templates_per_frame: int = 8,
+    size: Tuple[int, int] = (1920, 1080),
+    grayscale: bool = True,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """
+    每轮在一张合成画面中贴入若干 assets 模板，对全部模板分别用两种方式计算结果图，
+    比较最高分位置与结果图的最大差值。频域耗时包含该帧的正向 DFT 与积分图。
+    奇数轮使用纯色背景（界面中常见，分母为 0 的窗口多）。
+    """
+    from .match import get_assets_dir  # 延迟导入，避免自检之外引入 pyautogui
+    from .pyramid import synthetic_screen
+
+    rng = np.random.default_rng(seed)
+    flag = cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR
+    paths = sorted(get_assets_dir().glob("*/*.png"))
+    tpls = [t for t in (cv2.imread(str(p), flag) for p in paths) if t is not None]
+    if not tpls:
+        print("[fft] 未找到可用模板")
+        return {"rounds": 0}
+
+    agree = total = 0
+    max_err = 0.0
+    t_spatial = t_fft = 0.0
+    for i in range(rounds):
+        screen = synthetic_screen(rng, size, grayscale)
+        if screen.ndim == 3 and grayscale:
+            screen = screen[:, :, 0].copy()
+        if i % 2:
+            screen[:] = 30
+        chosen = [tpls[int(i)] for i in rng.choice(len(tpls), templates_per_frame, replace=False)]
+        for tpl in chosen:
+            th, tw = tpl.shape[:2]
+            x = int(rng.integers(0, size[0] - tw))
+            y = int(rng.integers(0, size[1] - th))
+            screen[y:y + th, x:x + tw] = tpl
+        clear_fft_cache()
+        for tpl in chosen:
+            t0 = time.perf_counter()
+            ref = cv2.matchTemplate(screen, tpl, cv2.TM_CCOEFF_NORMED)
+            t1 = time.perf_counter()
+            res = ccoeff_normed_fft(screen, tpl)
+            t2 = time.perf_counter()
+            t_spatial += t1 - t0
+            t_fft += t2 - t1
+            total += 1
+            _, ref_val, _, ref_loc = cv2.minMaxLoc(ref)
+            _, val, _, loc = cv2.minMaxLoc(res)
+            max_err = max(max_err, float(np.nan_to_num(np.abs(ref - res), nan=1.0).max()))
+            release_buffer(res)
+            if ref_loc == loc and abs(ref_val - val) < 1e-3:
+                agree += 1
+            else:
+                print(f"[fft] 不一致: spatial={ref_loc}/{ref_val:.4f} fft={loc}/{val:.4f} tpl={tw}x{th}")
+
+    report = {
+        "rounds": rounds,
+        "templates": total,
+        "agree": agree,
+        "max_abs_diff": max_err,
+        "spatial_ms": t_spatial / total * 1000,
+        "fft_ms": t_fft / total * 1000,
+    }
+    print(
+        f"[fft] {size[0]}x{size[1]} {'灰度' if grayscale else '彩色'}：一致 {agree}/{total}，"
+        f"最大差值 {max_err:.1e}，每模板 spatial {report['spatial_ms']:.1f}ms / fft {report['fft_ms']:.1f}ms"
+    )
+    return report
+
+
+__all__ = [
+    "ENGINES",
+    "FrameSpectrum",
+    "TemplateSpectrum",
+    "TemplateSpectrumCache",
+    "frame_spectrum",
+    "forget_frame",
+    "ccoeff_normed_fft",
+    "use_fft",
+    "match_template_map",
+    "get_matching_engine",
+    "set_matching_engine",
+    "load_engine_config",
+    "fft_stats",
+    "clear_fft_cache",
+    "verify_against_spatial",
+]
+
+
+if __name__ == "__main__":
+    verify_against_spatial(grayscale=True)
+    verify_against_spatial(grayscale=False)
@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+"""
+    flow.py
+    - 功能：表驱动的任务流程（状态机），定义文件为 assets/flows/<name>.json
+    - 状态字段：
+        actions      进入状态时依次执行的动作
+        transitions  出边：[{"when": 模板, "grayscale": bool, "goto": 状态, "actions": [...]}]
+                     全部出边的模板在同一帧上批量匹配，按列表顺序取优先
+        timeout      等待出边的超时（秒），省略表示一直等待
+        on_timeout   超时后进入的状态
+        next         无出边时直接进入的状态
+        end          终止状态，可带 result（ok/fail）与 message
+    - 动作（do）：
+        click         {"stem": 模板} 当前画面中找到即点击；
+                      {"at": 模板, "offset": [x, y]} 点击该模板最近一次命中中心加偏移（按窗口比例缩放，
+                      与命中比例相近时取细化后的推荐比例，见 match.offset_scale）；
+                      都省略时点击触发本条出边的命中
+        move          {"x", "y"} 移动鼠标
+        sleep         {"seconds"}
+        settle        {"timeout", "stable", "until": [模板...]} 等到模板出现或画面稳定（最多 timeout 秒），
+                      用于代替等待动画、淡出文字的固定 sleep
+        log           {"message"}
+        count         {"name"} 计数（同时写入 metrics）
+        require_page  {"page": HOME/FRONTLINE/...} 确认当前页面（会尝试刷新与跳转）
+      click / require_page 失败时若配置了 on_fail，立即转入该状态
+    - 每条出边从开始等待到命中的耗时按 "<流程>:<状态>-><目标>" 记入 LatencyTracker，结束时输出分布
+    - 用法：run_flow("auto_arena")
+"""
+
+import json
+from pathlib import Path
+from typing import Optional, Tuple, List, Dict, Any, Union
+
+from .match import get_assets_dir, offset_scale
+from .metrics import span, inc
+from .page_manager import is_target_page, PAGE_HOME, PAGE_FRONTLINE, PAGE_DEFENSE_LINE, PAGE_WOLF_PACK
+from .runtime import AutomationRuntime, run_task
+from .settle import STABLE_SEC, OUTCOME_PRESENT, OUTCOME_TIMEOUT, get_latency_tracker
+
+PAGES: Dict[str, int] = {
+    "HOME": PAGE_HOME,
+    "FRONTLINE": PAGE_FRONTLINE,
+    "DEFENSE_LINE": PAGE_DEFENSE_LINE,
+    "WOLF_PACK": PAGE_WOLF_PACK,
+}
+ACTIONS = ("click", "move", "sleep", "settle", "log", "count", "require_page")
+
+
+class FlowError(ValueError):
+    """流程定义无效。"""
+
+
+def get_flows_dir() -> Path:
+    return get_assets_dir() / "flows"
+
+
+def validate_flow(flow: Dict[str, Any]) -> None:
+    """检查状态引用与动作名称，发现问题时抛出 FlowError（列出全部问题）。"""
+    problems: List[str] = []
+    states = flow.get("states")
+    if not isinstance(states, dict) or not states:
+        raise FlowError("流程缺少 states")
+    if flow.get("start") not in states:
+        problems.append(f"起始状态不存在: {flow.get('start')}")
+
+    def _check_ref(where: str, target: Any) -> None:
+        if target is not None and target not in states:
+            problems.append(f"{where} 引用了不存在的状态: {target}")
+
+    def _check_actions(where: str, actions: Any) -> None:
+        for a in actions or []:
+            if a.get("do") not in ACTIONS:
+                problems.append(f"{where} 未知动作: {a.get('do')}")
+            if a.get("do") == "require_page" and a.get("page") not in PAGES:
+                problems.append(f"{where} 未知页面: {a.get('page')}")
+            _check_ref(where, a.get("on_fail"))
+
+    for name, st in states.items():
+        if st.get("end"):
+            continue
+        _check_actions(name, st.get("actions"))
+        _check_ref(name, st.get("on_timeout"))
+        _check_ref(name, st.get("next"))
+        trans = st.get("transitions") or []
+        for t in trans:
+            if not t.get("when"):
+                problems.append(f"{name} 的出边缺少 when")
+            _check_ref(name, t.get("goto"))
+            _check_actions(f"{name}->{t.get('goto')}", t.get("actions"))
+        if not trans and not st.get("next"):
+            problems.append(f"{name} 既没有出边也没有 next")
+    if problems:
+        raise FlowError("；".join(problems))
+
+
+def load_flow(name_or_path: Union[str, Path]) -> Dict[str, Any]:
+    """按名称（assets/flows/<name>.json）或路径加载并校验流程定义。"""
+    p = Path(name_or_path)
+    if p.suffix != ".json":
+        p = get_flows_dir() / f"{name_or_path}.json"
+    with p.open("r", encoding="utf-8") as f:
+        flow = json.load(f)
+    flow.setdefault("name", p.stem)
+    validate_flow(flow)
+    return flow
+
+
+class FlowEngine:
+    """
+    在 AutomationRuntime 上执行流程定义。
+    每个状态只做一次批量等待：全部出边模板在同一帧上一起匹配，命中优先级按出边顺序。
+    """
+
+    def __init__(self, flow: Dict[str, Any], rt: AutomationRuntime) -> None:
+        self.flow = flow
+        self.rt = rt
+        self.name = flow.get("name", "flow")
+        self.folder = flow.get("folder", rt.folder)
+        # 最近一次命中：模板 -> (match, scale)
+        self.matches: Dict[str, Tuple[Dict[str, Any], Optional[int]]] = {}
+        self.counters: Dict[str, int] = {}
+        self.steps = 0
+        self.state: Optional[str] = None
+
+    async def _action(self, action: Dict[str, Any], trigger: Optional[Tuple[Dict[str, Any], Optional[int]]]) -> bool:
+        """执行单个动作，返回是否成功。"""
+        rt = self.rt
+        do = action["do"]
+        if do == "log":
+            print(f"[{self.name}] {action.get('message', '')}")
+        elif do == "sleep":
+            await rt.sleep(float(action.get("seconds", 0)))
+        elif do == "settle":
+            await rt.wait_settled(
+                action.get("until") or (),
+                timeout=float(action.get("timeout", 3.0)),
+                stable_sec=float(action.get("stable", STABLE_SEC)),
+                folder=self.folder,
+                key=f"{self.name}:{self.state}:settle",
+            )
+        elif do == "move":
+            await rt.move(int(action["x"]), int(action["y"]))
+        elif do == "count":
+            key = action["name"]
+            self.counters[key] = self.counters.get(key, 0) + 1
+            inc(key)
+            print(f"\n[{self.name}] --- {key} 第 {self.counters[key]} 次 ---")
+        elif do == "require_page":
+            return bool(await rt.run_blocking(is_target_page, PAGES[action["page"]]))
+        elif do == "click":
+            if "stem" in action:
+                return await rt.click(action["stem"], timeout=action.get("timeout", 0), folder=self.folder)
+            hit = self.matches.get(action["at"]) if "at" in action else trigger
+            if hit is None:
+                print(f"[{self.name}] 没有可点击的命中 ({action.get('at', '出边')})")
+                return False
+            m, scale = hit
+            ox, oy = action.get("offset", (0, 0))
+            k = offset_scale(scale) / 100.0
+            cx, cy = m["center"]
+            await rt.click_at(cx + int(round(ox * k)), cy + int(round(oy * k)))
+        return True
+
+    async def _run_actions(
+        self,
+        actions: List[Dict[str, Any]],
+        trigger: Optional[Tuple[Dict[str, Any], Optional[int]]] = None,
+    ) -> Optional[str]:
+        """依次执行动作；某个动作失败且配置了 on_fail 时返回要转入的状态。"""
+        for a in actions or []:
+            if not await self._action(a, trigger) and a.get("on_fail"):
+                return a["on_fail"]
+        return None
+
+    async def run(self) -> Dict[str, Any]:
+        """运行到终止状态，返回 {"state", "result", "steps", "counters"}。"""
+        states = self.flow["states"]
+        state = self.flow["start"]
+        while True:
+            st = states[state]
+            self.state = state
+            self.steps += 1
+            if st.get("end"):
+                if st.get("message"):
+                    print(f"[{self.name}] {st['message']}")
+                return {"state": state, "result": st.get("result", "ok"), "steps": self.steps, "counters": dict(self.counters)}
+
+            with span("flow_state", flow=self.name, state=state):
+                nxt = await self._run_actions(st.get("actions"))
+                if nxt is None:
+                    nxt = await self._wait_transitions(state, st)
+            if nxt != state:
+                print(f"[{self.name}] {state} -> {nxt}")
+            state = nxt
+
+    async def _wait_transitions(self, state: str, st: Dict[str, Any]) -> str:
+        trans = st.get("transitions") or []
+        if not trans:
+            return st["next"]
+        targets = [(t.get("folder", self.folder), t["when"], bool(t.get("grayscale", True))) for t in trans]
+        t0 = self.rt.now()
+        i, m, scale = await self.rt.wait_targets(targets, st.get("timeout"))
+        elapsed = self.rt.now() - t0
+        if i is None:
+            nxt = st.get("on_timeout") or state
+            if nxt != state:
+                get_latency_tracker().record(f"{self.name}:{state}->{nxt}", elapsed, OUTCOME_TIMEOUT)
+                print(f"[{self.name}] {state} 等待超时")
+            return nxt
+        t = trans[i]
+        get_latency_tracker().record(f"{self.name}:{state}->{t['goto']}", elapsed, OUTCOME_PRESENT)
+        self.matches[t["when"]] = (m, scale)
+        nxt = await self._run_actions(t.get("actions"), (m, scale))
+        return nxt if nxt is not None else t["goto"]
+
+
+# 功能：按名称加载并运行流程（同步入口）。
+def run_flow(name_or_path: Union[str, Path], **runtime_kwargs: Any) -> Dict[str, Any]:
+    flow = load_flow(name_or_path)
+    runtime_kwargs.setdefault("folder", flow.get("folder", "auto_arena"))
+
+    async def _main(rt: AutomationRuntime) -> Dict[str, Any]:
+        engine = FlowEngine(flow, rt)
+        result = await engine.run()
+        st = rt.stats()
+        print(
+            f"[{engine.name}] 流程结束：{result['state']} ({result['result']})，状态切换 {result['steps']} 次；"
+            f"截屏 {st['captures']} 次，其中画面变化 {st['changes']} 次"
+        )
+        get_latency_tracker().report()
+        return result
+
+    return run_task(_main, **runtime_kwargs)
+
+
+__all__ = [
+    "FlowError",
+    "FlowEngine",
+    "get_flows_dir",
+    "load_flow",
+    "validate_flow",
+    "run_flow",
+]
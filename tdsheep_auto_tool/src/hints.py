@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+"""
+    hints.py
+    - 功能：空间提示缓存，记录每个 (模板, 比例) 上一次命中的位置
+    - 用途：游戏 UI 元素每轮都出现在相同位置，匹配时先在上次命中框附近的
+            小块区域内搜索，未命中再回退到完整区域
+"""
+
+import threading
+from typing import Optional, Tuple, Dict, Any, Hashable
+
+# 命中框四周的固定外扩像素
+HINT_PADDING_PX: int = 32
+# 额外按模板尺寸比例外扩，容忍元素轻微位移
+HINT_PADDING_RATIO: float = 0.25
+
+
+class SpatialHintCache:
+    """
+    (模板键, 比例) -> 上次命中的屏幕坐标框 (left, top, width, height)。
+    同时统计 ROI 命中/未命中次数，用于评估提示的有效性。
+    """
+
+    def __init__(self, padding: int = HINT_PADDING_PX, ratio: float = HINT_PADDING_RATIO) -> None:
+        self.padding = int(padding)
+        self.ratio = float(ratio)
+        self._boxes: Dict[Hashable, Tuple[int, int, int, int]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, key: Hashable, match: Dict[str, Any]) -> None:
+        """记录一次命中的位置。"""
+        box = (int(match["left"]), int(match["top"]), int(match["width"]), int(match["height"]))
+        with self._lock:
+            self._boxes[key] = box
+
+    def forget(self, key: Optional[Hashable] = None) -> None:
+        """删除指定键的提示；key 为 None 时清空全部。"""
+        with self._lock:
+            if key is None:
+                self._boxes.clear()
+            else:
+                self._boxes.pop(key, None)
+
+    def roi(
+        self,
+        key: Hashable,
+        frame_shape: Tuple[int, ...],
+        region: Optional[Tuple[int, int, int, int]] = None,
+    ) -> Optional[Tuple[int, int, int, int]]:
+        """
+        返回提示对应的搜索框（画面坐标，x0, y0, x1, y1）。
+        - frame_shape: 画面的 shape
+        - region: 画面对应的屏幕区域，None 表示全屏
+        无提示或提示框完全不在画面内时返回 None。
+        """
+        with self._lock:
+            box = self._boxes.get(key)
+        if box is None:
+            return None
+        left, top, w, h = box
+        ox, oy = (region[0], region[1]) if region else (0, 0)
+        pad_x = self.padding + int(w * self.ratio)
+        pad_y = self.padding + int(h * self.ratio)
+        fh, fw = frame_shape[:2]
+        x0 = max(0, left - ox - pad_x)
+        y0 = max(0, top - oy - pad_y)
+        x1 = min(fw, left - ox + w + pad_x)
+        y1 = min(fh, top - oy + h + pad_y)
+        if x1 - x0 < w or y1 - y0 < h:
+            return None
+        return x0, y0, x1, y1
+
+    def mark(self, hit: bool) -> None:
+        """记录一次 ROI 搜索的结果。"""
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """返回提示缓存统计。"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._boxes),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+            }
+
+
+_HINTS = SpatialHintCache()
+
+
+def get_hint_cache() -> SpatialHintCache:
+    """返回进程内共享的提示缓存。"""
+    return _HINTS
+
+
+def hint_stats() -> Dict[str, Any]:
+    """返回共享提示缓存的统计信息。"""
+    return _HINTS.stats()
+
+
+def report_hint_stats() -> None:
+    """打印提示缓存的命中率。"""
+    st = _HINTS.stats()
+    print(
+        f"[hint] 近位搜索命中 {st['hits']} 次，未命中 {st['misses']} 次，"
+        f"命中率 {st['hit_rate'] * 100:.1f}%（记录 {st['entries']} 个位置）"
+    )
+
+
+__all__ = [
+    "SpatialHintCache",
+    "get_hint_cache",
+    "hint_stats",
+    "report_hint_stats",
+]
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+"""
+    instance.py
+    - 功能：多窗口运行时的“当前窗口实例”上下文
+    - 每个游戏窗口对应一个 WindowInstance，持有自己的搜索区域、比例状态文件、
+      空间提示缓存与变化检测器
+    - 工作线程通过 bind_instance() 绑定实例后，match 中的默认搜索区域、
+      比例状态与提示缓存都切换到该实例；未绑定时（单窗口模式）沿用进程级共享状态
+"""
+
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, Tuple, Iterator, Set
+
+from .hints import SpatialHintCache
+from .change_detect import ChangeGate
+
+
+class RegionState:
+    """
+    默认搜索区域及其失效计数（单窗口模式下为进程级，多窗口时每个实例一份）。
+    - seen: 在当前区域内命中过的模板（"目录/stem"），只有它们的未命中才计入 misses
+    - verified_at: 上次确认区域有效的时刻（calc_locate.clock_now）
+    """
+
+    def __init__(self) -> None:
+        self.region: Optional[Tuple[int, int, int, int]] = None
+        self.loaded: bool = False
+        self.misses: int = 0
+        self.seen: Set[str] = set()
+        self.verified_at: float = float("-inf")
+
+
+class WindowInstance:
+    """
+    一个游戏窗口的运行时状态。
+    - index: 窗口序号（按屏幕位置从上到下、从左到右排序）
+    - rect: 窗口矩形 (left, top, width, height)
+    - scale: 该窗口的比例（启用比例合成时为细化后的小数比例）
+    - state_path: 该窗口独立的比例状态文件
+    """
+
+    def __init__(self, index: int, rect: Tuple[int, int, int, int], scale: float, state_path: Path) -> None:
+        self.index = int(index)
+        self.name = f"w{self.index}"
+        self.rect = tuple(int(v) for v in rect)
+        self.scale = float(scale)
+        self.state_path = Path(state_path)
+        self.region_state = RegionState()
+        self.hints = SpatialHintCache()
+        self.gate = ChangeGate()
+
+    def __repr__(self) -> str:
+        return f"WindowInstance({self.name}, rect={self.rect}, scale={self.scale})"
+
+
+_LOCAL = threading.local()
+
+
+def current_instance() -> Optional[WindowInstance]:
+    """返回当前线程绑定的窗口实例；未绑定时返回 None。"""
+    return getattr(_LOCAL, "instance", None)
+
+
+@contextmanager
+def bind_instance(instance: Optional[WindowInstance]) -> Iterator[Optional[WindowInstance]]:
+    """在当前线程内绑定窗口实例，退出时恢复之前的绑定。"""
+    old = current_instance()
+    _LOCAL.instance = instance
+    try:
+        yield instance
+    finally:
+        _LOCAL.instance = old
+
+
+__all__ = [
+    "RegionState",
+    "WindowInstance",
+    "current_instance",
+    "bind_instance",
+]
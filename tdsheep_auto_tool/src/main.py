@@ -29,6 +29,10 @@ from .window import (
     compute_window_size_and_visualize,
 )
 from .auto_arena import run_auto_arena
+from .supervisor import run_multi_arena
+from .match import warm_up_assets, get_scale_state_path
+from .page_manager import precompute_page_signatures
+from .metrics import configure_from_config
 
 USER_INFO = """
 === === === === === === === === === === === === === === === === === === === === === === === === ===
@@ -59,19 +63,29 @@ def print_user_info() -> None:
 def main(argv: list[str] | None = None) -> None:
     print_user_info()
 
+    # 预加载全部模板，避免循环检测中反复读取磁盘
+    warm_up_assets()
+    # 预先计算并校验页面识别用的特征图片
+    precompute_page_signatures()
+
+    # 按 config.json 的 diagnostics.metrics 启用耗时指标导出（默认关闭）
+    configure_from_config(get_scale_state_path().parent)
+
     # 主函数判断逻辑（预留，当前为空）
     # TODO: 在此添加入口参数判断或前置校验
 
     # 等待用户输入后再开始检测窗口
     # 这里其实应该做进一步修改，如果想要实现完全的自动化，需要检测多个窗口
     print("脚本启动成功，欢迎使用 Petrichor 的工具，喜欢的话还请多多支持")
-    print("请输入指令：start 启动自动竞技场，detect 检测窗口，exit 退出程序\n")
+    print("请输入指令：start 启动自动竞技场，multi 多窗口并行竞技场，detect 检测窗口，exit 退出程序\n")
     try:
         while True:
             cmd = input("> ").strip().lower()
             # 这个我打算作为挂机模式，后面再精修
             if cmd == "start":
                 run_auto_arena()
+            elif cmd == "multi":
+                run_multi_arena()
             elif cmd == "detect":
                 result = detect_window_assets_a(
                     confidence=0.7,
@@ -96,7 +110,7 @@ def main(argv: list[str] | None = None) -> None:
             elif cmd == "":
                 continue
             else:
-                print("未知指令，请输入 start 或 exit")
+                print("未知指令，请输入 start、multi、detect 或 exit")
     except KeyboardInterrupt:
         print("\n[main] 用户终止，退出。")
 
@@ -7,13 +7,34 @@ from __future__ import annotations
 """
 
 from pathlib import Path
-from typing import Optional, Tuple, Dict, Any, List
+from typing import Optional, Tuple, Dict, Any, List, Sequence, Union
 import json
+import os
 import time
 import pyautogui
 import sys
-
-from .calc_locate import locate_on_screen, click_template
+import numpy as np
+
+from .calc_locate import (
+    clock_now,
+    grab_screen,
+    load_template,
+    locate_in_frame,
+    locate_on_screen,
+    click_template,
+    warm_up_templates,
+    template_cache_stats,
+)
+from .capture import release_frame
+from .hints import SpatialHintCache, get_hint_cache
+from .change_detect import ChangeGate, get_change_gate
+from .instance import RegionState, current_instance
+from .scale_state import ScaleStateStore, get_store
+from .metrics import span, inc
+from .executor import get_match_executor
+from .settle import wait_until_settled
+from .template_pack import get_template_pack, set_template_pack, open_pack
+from .template_scaler import get_scaled_cache, is_scale_synthesis_enabled, clamp_synth_scale
 
 # 功能：获取 assets 目录路径
 def get_base_dir() -> Path:
@@ -27,6 +48,38 @@ def get_base_dir() -> Path:
 def get_assets_dir() -> Path:
     return get_base_dir() / "assets"
 
+
+# 功能：打开 assets/templates.pack 并启用（存在时）
+def load_template_pack() -> bool:
+    """启用模板包，返回是否成功；没有打包文件时照常逐个读取 PNG。"""
+    pack = open_pack(get_assets_dir())
+    set_template_pack(pack)
+    if pack is not None:
+        print(f"[pack] 已映射模板包: {len(pack)} 个模板")
+    return pack is not None
+
+
+def _is_scaled_variant(path: Path) -> bool:
+    """{stem}_{scale}.png 且同目录下存在 {stem}.png 时视为预生成的缩放图。"""
+    prefix, _, suffix = path.stem.rpartition("_")
+    return bool(prefix) and suffix.isdigit() and int(suffix) in SCALES and path.with_name(f"{prefix}.png").exists()
+
+
+# 功能：启动时将 assets 下所有模板预加载进缓存
+def warm_up_assets() -> int:
+    """预加载 assets 各子目录的全部模板（灰度与彩色），返回加载数量；有模板包时只需映射。"""
+    t0 = time.perf_counter()
+    load_template_pack()
+    # 启用比例合成时只需要基础模板，磁盘上的缩放图不再读取
+    skip = _is_scaled_variant if is_scale_synthesis_enabled() else None
+    count = warm_up_templates(get_assets_dir(), skip=skip)
+    stats = template_cache_stats()
+    print(
+        f"[cache] 预加载模板 {count} 个，缓存占用 {stats['bytes'] / 1024 / 1024:.1f} MB，"
+        f"耗时 {time.perf_counter() - t0:.2f}s"
+    )
+    return count
+
 # 新增：比例列表与持久化状态路径
 SCALES: List[int] = [50, 65, 67, 75, 80, 90, 100, 110, 125]
 
@@ -48,51 +101,213 @@ SCALE_STATE_PATH: Path = get_scale_state_path()
 BASE_WINDOW_SIZE: Tuple[int, int] = (1066, 912)
 ANCHOR_TOP_MENU_OFFSET_X_BASE: int = 1  # 100% 缩放时需向右偏移 1px
 ANCHOR_TOP_MENU_OFFSET_Y_BASE: int = 42  # 100% 缩放时需向下偏移 42px
+# 命中比例与推荐比例之差小于该值（百分比）时，几何换算改用推荐比例
+OFFSET_SCALE_SNAP: float = 5.0
 
-def clamp_scale(scale: int) -> int:
-    """将比例限制在合法集合内。"""
+def clamp_scale(scale: float) -> float:
+    """将比例限制在合法集合内；启用比例合成时只限制在合成允许的范围内（可带 1 位小数）。"""
+    if is_scale_synthesis_enabled():
+        return clamp_synth_scale(scale)
     if scale in SCALES:
         return scale
     # 就近取值
     return min(SCALES, key=lambda s: abs(s - scale))
 
 
-def load_scale_state() -> Dict[str, Any]:
-    """读取比例状态，若不存在则返回默认。"""
-    # 动态获取路径，确保打包后也能正确定位
-    state_path = get_scale_state_path()
-    try:
-        if state_path.exists():
-            with state_path.open("r", encoding="utf-8") as f:
-                data = json.load(f)
-                # 基本纠偏
-                data["recommended_scale"] = clamp_scale(int(data.get("recommended_scale", 100)))
-                data["fail_count"] = int(data.get("fail_count", 0))
-                data.setdefault("per_template", {})
-                return data
-    except Exception:
-        pass
+def offset_scale(hit_scale: Optional[float]) -> float:
+    """
+    点击偏移等几何换算使用的比例（百分比）。
+    命中比例与推荐比例相差不到一个离散档位时视为同一窗口比例，取推荐比例（可能是细化后的小数比例）。
+    """
+    if hit_scale is None:
+        return float(load_scale_state().get("recommended_scale", 100))
+    rec = float(load_scale_state().get("recommended_scale", hit_scale))
+    return rec if abs(rec - hit_scale) < OFFSET_SCALE_SNAP else float(hit_scale)
+
+
+def _default_scale_state() -> Dict[str, Any]:
     return {"recommended_scale": 100, "fail_count": 0, "per_template": {}}
 
 
-def save_scale_state(state: Dict[str, Any]) -> None:
-    """写入比例状态。"""
-    state_path = get_scale_state_path()
-    state_path.parent.mkdir(parents=True, exist_ok=True)
-    try:
-        with state_path.open("w", encoding="utf-8") as f:
-            json.dump(state, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        print(f"[scale] 状态保存失败: {e}")
+def _normalize_scale_state(data: Dict[str, Any]) -> Dict[str, Any]:
+    """基本纠偏：比例限制在合法集合内，补齐缺失字段，丢弃无效的窗口矩形。"""
+    data["recommended_scale"] = clamp_scale(float(data.get("recommended_scale", 100)))
+    data["fail_count"] = int(data.get("fail_count", 0))
+    data.setdefault("per_template", {})
+    rect = data.get("window_rect")
+    if not (isinstance(rect, list) and len(rect) == 4 and int(rect[2]) > 0 and int(rect[3]) > 0):
+        data.pop("window_rect", None)
+    return data
+
+
+def get_scale_store() -> ScaleStateStore:
+    """返回比例状态的进程内存储（首次访问时从磁盘加载）；多窗口时返回当前实例的存储。"""
+    inst = current_instance()
+    # 动态获取路径，确保打包后也能正确定位
+    path = inst.state_path if inst is not None else get_scale_state_path()
+    return get_store(path, _default_scale_state, _normalize_scale_state)
 
 
-def ordered_scales(preferred: int) -> List[int]:
+def load_scale_state() -> Dict[str, Any]:
+    """读取比例状态（内存副本），若不存在则返回默认。"""
+    return get_scale_store().load()
+
+
+def save_scale_state(state: Dict[str, Any]) -> None:
+    """写入比例状态：立即更新内存，防抖后原子落盘。"""
+    get_scale_store().save(state)
+
+
+def flush_scale_state() -> None:
+    """立即将未落盘的比例状态写入文件。"""
+    get_scale_store().flush()
+
+
+# 会话级默认搜索区域：游戏窗口矩形 (left, top, width, height)，None 表示全屏
+# 多窗口运行时每个实例各有一份，见 instance.py
+_REGION = RegionState()
+# 在窗口区域内命中过的模板连续未命中多少次后，重新校验锚点
+WINDOW_REGION_MAX_MISSES: int = 3
+# 两次锚点校验的最短间隔（秒）；其间的未命中只累计，避免轮询等待时反复扫描锚点
+WINDOW_VERIFY_MIN_SEC: float = 10.0
+# 窗口区域四周的容差外扩（像素），吸收几何计算的取整误差
+WINDOW_REGION_MARGIN: int = 16
+# 用于校验窗口位置的锚点（assets/a 下），任一命中即视为窗口仍在原处
+WINDOW_ANCHOR_STEMS: List[str] = ["a_1", "a_2"]
+# 锚点位于窗口矩形上沿之外，校验时按此外扩（100% 比例下的像素）
+WINDOW_ANCHOR_SEARCH_PAD: int = 64
+
+
+def _clip_region(rect: Sequence[int]) -> Optional[Tuple[int, int, int, int]]:
+    """外扩容差并裁剪到屏幕范围内。"""
+    left, top, width, height = (int(v) for v in rect)
+    left -= WINDOW_REGION_MARGIN
+    top -= WINDOW_REGION_MARGIN
+    width += 2 * WINDOW_REGION_MARGIN
+    height += 2 * WINDOW_REGION_MARGIN
+    try:
+        sw, sh = pyautogui.size()
+    except Exception:
+        sw, sh = left + width, top + height
+    right = min(sw, left + width)
+    bottom = min(sh, top + height)
+    left = max(0, left)
+    top = max(0, top)
+    if right - left <= 0 or bottom - top <= 0:
+        return None
+    return left, top, right - left, bottom - top
+
+
+def _region_state() -> RegionState:
+    """当前线程使用的区域状态：绑定了窗口实例时取实例的，否则取进程级的。"""
+    inst = current_instance()
+    return inst.region_state if inst is not None else _REGION
+
+
+def _hint_cache() -> SpatialHintCache:
+    inst = current_instance()
+    return inst.hints if inst is not None else get_hint_cache()
+
+
+def _change_gate() -> ChangeGate:
+    inst = current_instance()
+    return inst.gate if inst is not None else get_change_gate()
+
+
+def get_window_region() -> Optional[Tuple[int, int, int, int]]:
+    """返回会话级默认搜索区域；首次调用时从比例状态中恢复。"""
+    rs = _region_state()
+    if not rs.loaded:
+        rs.loaded = True
+        rect = load_scale_state().get("window_rect")
+        if rect:
+            rs.region = _clip_region(rect)
+    return rs.region
+
+
+def set_window_region(rect: Optional[Any], persist: bool = True) -> None:
+    """
+    设置（或清除）会话级默认搜索区域。
+    - rect: {"left","top","width","height"} 或 (left, top, width, height)；None 表示清除
+    - persist: 是否同步写入比例状态文件
+    """
+    if isinstance(rect, dict):
+        rect = [rect["left"], rect["top"], rect["width"], rect["height"]]
+    raw = [int(v) for v in rect] if rect is not None else None
+    rs = _region_state()
+    rs.region = _clip_region(raw) if raw else None
+    rs.loaded = True
+    rs.misses = 0
+    rs.seen.clear()
+    # 新设置的区域来自刚完成的窗口检测，视为刚校验过
+    rs.verified_at = clock_now() if rs.region is not None else float("-inf")
+    if persist:
+        state = load_scale_state()
+        if raw:
+            state["window_rect"] = raw
+        else:
+            state.pop("window_rect", None)
+        save_scale_state(state)
+
+
+def invalidate_window_region(reason: str = "") -> None:
+    """清除默认搜索区域（窗口移动或关闭），之后的匹配恢复为全屏。"""
+    if get_window_region() is None:
+        return
+    print(f"[region] 窗口搜索区域失效，恢复全屏搜索 {reason}".rstrip())
+    set_window_region(None)
+
+
+def _verify_window_anchors(region: Tuple[int, int, int, int]) -> bool:
+    """在窗口区域（含上沿外扩）内查找锚点，确认窗口仍在原处。"""
+    assets_a = get_assets_dir() / "a"
+    state = load_scale_state()
+    recommended = state.get("recommended_scale", 100)
+    pad = int(round(WINDOW_ANCHOR_SEARCH_PAD * recommended / 100.0))
+    search = _clip_region((region[0] - pad, region[1] - pad, region[2] + 2 * pad, region[3] + 2 * pad))
+    if search is None:
+        return False
+    found = locate_many(
+        [(assets_a, stem, None) for stem in WINDOW_ANCHOR_STEMS],
+        recommended_scale=recommended,
+        region=search,
+        use_window_region=False,
+        stop_on_hit=True,
+    )
+    return any(m is not None for m, _ in found.values())
+
+
+def _note_window_result(key: str, hit: bool) -> None:
+    """
+    记录窗口区域内模板 key（"目录/stem"）的匹配结果。
+    只有在该区域内命中过的模板未命中才计数（轮询尚未出现的目标不算锚点失效）；
+    连续计数达到阈值且距上次校验超过 WINDOW_VERIFY_MIN_SEC 时校验锚点，失败则清除区域。
+    """
+    rs = _region_state()
+    if hit:
+        rs.seen.add(key)
+        rs.misses = 0
+        return
+    if key not in rs.seen:
+        return
+    rs.misses += 1
+    now = clock_now()
+    if rs.misses < WINDOW_REGION_MAX_MISSES or now - rs.verified_at < WINDOW_VERIFY_MIN_SEC:
+        return
+    rs.misses = 0
+    rs.verified_at = now
+    region = get_window_region()
+    if region is not None and not _verify_window_anchors(region):
+        invalidate_window_region("(锚点未命中)")
+
+
+def ordered_scales(preferred: float) -> List[float]:
     """根据用户要求的遍历顺序，优先尝试当前推荐比例。"""
     base_order = [50, 65, 67, 75, 80, 90, 100, 110, 125]
     preferred = clamp_scale(preferred)
     # 首次尝试推荐比例，其次按固定顺序遍历（避免重复）
     seen = set()
-    order: List[int] = []
+    order: List[float] = []
     for s in [preferred] + base_order:
         if s not in seen:
             seen.add(s)
@@ -100,20 +315,74 @@ def ordered_scales(preferred: int) -> List[int]:
     return order
 
 
-def find_template_path(assets_a: Path, stem: str, scale: int) -> Optional[Path]:
-    """返回给定比例的模板路径，100% 允许回退至 stem.png。"""
+# (目录, 主干) -> 基础模板路径；None 表示没有基础模板
+_BASE_TEMPLATES: Dict[Tuple[str, str], Optional[Path]] = {}
+
+
+def _base_template(assets_a: Path, stem: str, exists: Any) -> Optional[Path]:
+    key = (str(assets_a), stem)
+    if key not in _BASE_TEMPLATES:
+        base = assets_a / f"{stem}.png"
+        _BASE_TEMPLATES[key] = base if exists(str(base)) else None
+    return _BASE_TEMPLATES[key]
+
+
+def find_template_path(assets_a: Path, stem: str, scale: float) -> Optional[Path]:
+    """
+    返回给定比例的模板路径，100% 允许回退至 stem.png。
+    启用比例合成且存在基础模板 stem.png 时，任意比例都返回虚拟路径，读取时由基础模板合成；
+    基础模板是否存在只检查一次。
+    """
+    # 模板包完整覆盖该目录时直接查索引，不访问文件系统
+    pack = get_template_pack()
+    exists = pack.has if pack is not None and pack.covers(str(assets_a)) else os.path.exists
+    if is_scale_synthesis_enabled():
+        base = _base_template(assets_a, stem, exists)
+        if base is not None:
+            return get_scaled_cache().virtual_path(base, scale)
     # 优先带比例后缀
     p = assets_a / f"{stem}_{scale}.png"
-    if p.exists():
+    if exists(str(p)):
         return p
     # 回退：100%时尝试无后缀文件（兼容历史）
     if scale == 100:
         p2 = assets_a / f"{stem}.png"
-        if p2.exists():
+        if exists(str(p2)):
             return p2
     return None
 
 
+def _hint_key(assets_a: Path, stem: str, scale: int) -> Tuple[str, int]:
+    """空间提示的键：(子目录/主干, 比例)，避免不同目录的同名模板互相覆盖。"""
+    return f"{assets_a.name}/{stem}", scale
+
+
+def _locate_near_hint(
+    screen: np.ndarray,
+    tpl: Path,
+    key: Tuple[str, int],
+    region: Optional[Tuple[int, int, int, int]],
+    confidence: float,
+    grayscale: bool,
+) -> Optional[Dict[str, Any]]:
+    """仅在上次命中框附近的小块区域内匹配；无提示时返回 None。"""
+    hints = _hint_cache()
+    roi = hints.roi(key, screen.shape, region)
+    if roi is None:
+        return None
+    x0, y0, x1, y1 = roi
+    ox, oy = (region[0], region[1]) if region else (0, 0)
+    m = locate_in_frame(
+        screen[y0:y1, x0:x1],
+        str(tpl),
+        region=(ox + x0, oy + y0, x1 - x0, y1 - y0),
+        confidence=confidence,
+        grayscale=grayscale,
+    )
+    hints.mark(m is not None)
+    return m
+
+
 def match_with_scales(
     assets_a: Path,
     stem: str,
@@ -121,25 +390,264 @@ def match_with_scales(
     confidence: float,
     grayscale: bool,
     region: Optional[Tuple[int, int, int, int]],
+    sweep: bool = True,
+    frame: Optional[np.ndarray] = None,
+    scales: Optional[Sequence[int]] = None,
+    use_hints: bool = True,
+    use_window_region: bool = True,
+    use_gate: bool = False,
 ) -> Tuple[Optional[Dict[str, Any]], Optional[int]]:
-    """按动态比例尝试匹配，成功则短路返回 (match, used_scale)。"""
-    for s in ordered_scales(recommended_scale):
-        tpl = find_template_path(assets_a, stem, s)
-        if not tpl:
-            continue
-        m = locate_on_screen(
-            template_path=str(tpl),
-            region=region,
-            confidence=confidence,
-            grayscale=grayscale,
+    """
+    按动态比例尝试匹配，成功则短路返回 (match, used_scale)。
+    - sweep: True 时整轮只截屏一次，所有比例复用同一画面；
+             False 时每个比例单独截屏（旧行为）
+    - frame: 调用方已截取的画面（需与 region/grayscale 对应），传入时不再截屏
+    - scales: 限定尝试的比例集合；None 表示按推荐比例遍历全部
+    - use_hints: 先在各比例上次命中的位置附近搜索，全部未命中再做完整区域匹配
+    - use_window_region: 未指定 region 且需要截屏时，使用会话级窗口区域代替全屏
+    - use_gate: 启用画面变化检测；画面自上次未命中后没有变化则跳过匹配，
+                部分变化时只匹配变化区域（适用于轮询等待）
+    """
+    template = f"{assets_a.name}/{stem}"
+    with span("match_with_scales", template=template):
+        m, s = _match_with_scales(
+            assets_a, stem, recommended_scale, confidence, grayscale, region,
+            sweep, frame, scales, use_hints, use_window_region, use_gate,
         )
+    inc("match_results", template=template, result="hit" if m else "miss")
+    return m, s
+
+
+def _match_with_scales(
+    assets_a: Path,
+    stem: str,
+    recommended_scale: int,
+    confidence: float,
+    grayscale: bool,
+    region: Optional[Tuple[int, int, int, int]],
+    sweep: bool,
+    frame: Optional[np.ndarray],
+    scales: Optional[Sequence[int]],
+    use_hints: bool,
+    use_window_region: bool,
+    use_gate: bool,
+) -> Tuple[Optional[Dict[str, Any]], Optional[int]]:
+    windowed = False
+    if region is None and frame is None and use_window_region:
+        region = get_window_region()
+        windowed = region is not None
+
+    candidates: List[Tuple[int, Path]] = []
+    for s in (scales if scales is not None else ordered_scales(recommended_scale)):
+        tpl = find_template_path(assets_a, stem, s)
+        if tpl:
+            candidates.append((s, tpl))
+
+    if not sweep and frame is None:
+        for s, tpl in candidates:
+            m = locate_on_screen(
+                template_path=str(tpl),
+                region=region,
+                confidence=confidence,
+                grayscale=grayscale,
+            )
+            if m:
+                print(f"[match] {tpl.name} 命中 (scale={s}, score={m['score']:.3f})")
+                return m, s
+        print(f"[match] {stem} 所有比例未命中")
+        return None, None
+
+    if frame is None and candidates:
+        # 整轮扫描共用一张截屏，匹配结束后归还
+        screen = grab_screen(region=region, grayscale=grayscale)
+        try:
+            return _match_in_frame(
+                assets_a, stem, candidates, screen, confidence, grayscale, region, use_hints, use_gate, windowed,
+            )
+        finally:
+            release_frame(screen)
+    return _match_in_frame(
+        assets_a, stem, candidates, frame, confidence, grayscale, region, use_hints, use_gate, windowed,
+    )
+
+
+def _match_in_frame(
+    assets_a: Path,
+    stem: str,
+    candidates: List[Tuple[int, Path]],
+    screen: Optional[np.ndarray],
+    confidence: float,
+    grayscale: bool,
+    region: Optional[Tuple[int, int, int, int]],
+    use_hints: bool,
+    use_gate: bool,
+    windowed: bool,
+) -> Tuple[Optional[Dict[str, Any]], Optional[int]]:
+    """在同一画面上依次做变化检测、近位搜索与完整区域匹配。"""
+    # 0. 变化检测：画面自上次未命中后完全没变，结果必然相同
+    gate = _change_gate() if use_gate and screen is not None else None
+    gate_key = (assets_a.name, stem, grayscale, confidence, region, tuple(s for s, _ in candidates))
+    dirty = gate.dirty_tiles(gate_key, screen) if gate else None
+    frame_pixels = screen.shape[0] * screen.shape[1] if screen is not None else 0
+    if dirty is not None and not dirty.any():
+        # 没有重新匹配，不计入窗口区域的失效判断
+        gate.count(frame_pixels, 0, "skip")
+        print(f"[match] {stem} 画面无变化，沿用未命中结果")
+        return None, None
+
+    # 1. 近位搜索：上次命中位置附近的小块区域
+    if use_hints:
+        for s, tpl in candidates:
+            with span("match_scale", template=f"{assets_a.name}/{stem}", scale=s, stage="hint"):
+                m = _locate_near_hint(screen, tpl, _hint_key(assets_a, stem, s), region, confidence, grayscale)
+            if m:
+                print(f"[match] {tpl.name} 近位命中 (scale={s}, score={m['score']:.3f})")
+                if gate:
+                    gate.clear(gate_key)
+                if windowed:
+                    _note_window_result(f"{assets_a.name}/{stem}", True)
+                return m, s
+
+    # 2. 完整区域匹配（启用变化检测时只匹配自上次未命中以来变化的区域）
+    #    各比例互不依赖，交给匹配线程池并行执行；按比例顺序取第一个命中，其后的任务被取消
+    def _match_scale(cand: Tuple[int, Path]) -> Tuple[Optional[Dict[str, Any]], int, bool]:
+        s, tpl = cand
+        rois = gate.rois(dirty, screen.shape, load_template(str(tpl), grayscale).shape) if dirty is not None else None
+        if rois is None:
+            with span("match_scale", template=f"{assets_a.name}/{stem}", scale=s, stage="full"):
+                m = locate_in_frame(
+                    screen,
+                    str(tpl),
+                    region=region,
+                    confidence=confidence,
+                    grayscale=grayscale,
+                )
+            return m, frame_pixels, False
+        with span("match_scale", template=f"{assets_a.name}/{stem}", scale=s, stage="roi"):
+            m = _locate_in_rois(screen, tpl, rois, region, confidence, grayscale)
+        return m, sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in rois), True
+
+    outcomes = get_match_executor().map_ordered(_match_scale, candidates, stop=lambda r: r[0] is not None)
+    matched_pixels = sum(px for _, px, _ in outcomes)
+    partial = any(p for _, _, p in outcomes)
+    for (s, tpl), (m, _, _) in zip(candidates, outcomes):
         if m:
+            if use_hints:
+                _hint_cache().record(_hint_key(assets_a, stem, s), m)
+            if gate:
+                gate.clear(gate_key)
+                gate.count(frame_pixels * len(candidates), matched_pixels, "partial" if partial else "full")
             print(f"[match] {tpl.name} 命中 (scale={s}, score={m['score']:.3f})")
+            if windowed:
+                _note_window_result(f"{assets_a.name}/{stem}", True)
             return m, s
+    if gate:
+        gate.record_negative(gate_key, screen)
+        gate.count(frame_pixels * len(candidates), matched_pixels, "partial" if partial else "full")
     print(f"[match] {stem} 所有比例未命中")
+    if windowed:
+        _note_window_result(f"{assets_a.name}/{stem}", False)
     return None, None
 
 
+def _locate_in_rois(
+    screen: np.ndarray,
+    tpl: Path,
+    rois: Sequence[Tuple[int, int, int, int]],
+    region: Optional[Tuple[int, int, int, int]],
+    confidence: float,
+    grayscale: bool,
+) -> Optional[Dict[str, Any]]:
+    """在若干画面子区域内匹配，返回得分最高的命中。"""
+    ox, oy = (region[0], region[1]) if region else (0, 0)
+    best = None
+    for x0, y0, x1, y1 in rois:
+        m = locate_in_frame(
+            screen[y0:y1, x0:x1],
+            str(tpl),
+            region=(ox + x0, oy + y0, x1 - x0, y1 - y0),
+            confidence=confidence,
+            grayscale=grayscale,
+        )
+        if m and (best is None or m["score"] > best["score"]):
+            best = m
+    return best
+
+
+# 批量匹配规格：(资源子目录名或目录路径, 文件名主干, 比例集合或 None)
+TemplateSpec = Tuple[Union[str, Path], str, Optional[Sequence[int]]]
+
+
+def locate_many(
+    templates: Sequence[TemplateSpec],
+    frame: Optional[np.ndarray] = None,
+    recommended_scale: Optional[int] = None,
+    confidence: float = 0.7,
+    grayscale: bool = True,
+    region: Optional[Tuple[int, int, int, int]] = None,
+    stop_on_miss: bool = False,
+    stop_on_hit: bool = False,
+    use_window_region: bool = True,
+    windowed: Optional[bool] = None,
+) -> Dict[Tuple[str, str], Tuple[Optional[Dict[str, Any]], Optional[int]]]:
+    """
+    在同一画面上批量执行多比例匹配，整批最多截屏一次。
+    - templates: [(folder, stem, scales), ...]；folder 为 assets 下子目录名或目录路径，
+                 scales 为 None 时按推荐比例遍历全部
+    - frame: 已截取的画面；None 时在首次需要时按 region/grayscale 截屏
+    - stop_on_miss: 任一模板未命中即停止（用于“全部存在”判断）
+    - stop_on_hit: 任一模板命中即停止（用于“多选一”判断）
+    - use_window_region: 需要截屏且未指定 region 时，使用会话级窗口区域
+    - windowed: 结果是否计入窗口区域的失效判断；None 时只在本函数取用窗口区域时计入，
+                调用方传入按窗口区域截取的 frame/region 时（如异步运行时）传 True
+    返回 {(folder_name, stem): (match, used_scale)}，因提前停止而未检测的条目不出现在结果中。
+    """
+    if recommended_scale is None:
+        recommended_scale = load_scale_state().get("recommended_scale", 100)
+
+    auto_windowed = False
+    if region is None and frame is None and use_window_region:
+        region = get_window_region()
+        auto_windowed = region is not None
+    windowed = auto_windowed if windowed is None else (bool(windowed) and region is not None)
+
+    specs = [
+        (folder if isinstance(folder, Path) else get_assets_dir() / folder, stem, scales)
+        for folder, stem, scales in templates
+    ]
+    owned = frame is None and bool(specs)
+    if owned:
+        frame = grab_screen(region=region, grayscale=grayscale)
+
+    def _match_spec(spec: Tuple[Path, str, Optional[Sequence[int]]]) -> Tuple[Optional[Dict[str, Any]], Optional[int]]:
+        assets_dir, stem, scales = spec
+        return match_with_scales(
+            assets_dir,
+            stem,
+            recommended_scale,
+            confidence,
+            grayscale,
+            region,
+            frame=frame,
+            scales=scales,
+        )
+
+    def _stop(r: Tuple[Optional[Dict[str, Any]], Optional[int]]) -> bool:
+        return (r[0] is None and stop_on_miss) or (r[0] is not None and stop_on_hit)
+
+    # 各模板互不依赖，并行匹配；提前停止时排在后面的任务被取消，结果与逐个匹配一致
+    try:
+        outcomes = get_match_executor().map_ordered(_match_spec, specs, stop=_stop if (stop_on_miss or stop_on_hit) else None)
+    finally:
+        if owned:
+            release_frame(frame)
+    results: Dict[Tuple[str, str], Tuple[Optional[Dict[str, Any]], Optional[int]]] = {}
+    for (assets_dir, stem, _), (m, used_scale) in zip(specs, outcomes):
+        results[(assets_dir.name, stem)] = (m, used_scale)
+        if windowed:
+            _note_window_result(f"{assets_dir.name}/{stem}", m is not None)
+    return results
+
 
 # 功能：加载匹配配置（tdsheep_auto_tool/data/match.json）
 def load_match_config() -> Optional[Dict[str, Any]]:
@@ -202,8 +710,8 @@ def match_once(
         center = match["center"]
         score = match["score"]
         print(f"[detect] 找到 {name}: center={center}, score={score:.3f}")
-        # 部分服务器或画面卡顿时，点击前停顿
-        time.sleep(max(0.0, pause_after_detect_sec))
+        # 部分服务器或画面卡顿时，点击前等画面稳定（最多 pause_after_detect_sec 秒）
+        wait_until_settled(timeout=pause_after_detect_sec, region=region, grayscale=grayscale, key="match_once")
         clicked = click_template(
             template_path=str(img_path),
             region=region,
@@ -242,6 +750,8 @@ def match_once_from_config() -> bool:
 
 __all__ = [
     "get_assets_dir",
+    "warm_up_assets",
+    "load_template_pack",
     "load_match_config",
     "check_image_exists",
     "match_once",
@@ -249,9 +759,16 @@ __all__ = [
     "SCALES",
     "load_scale_state",
     "save_scale_state",
+    "flush_scale_state",
+    "get_scale_store",
     "ordered_scales",
     "find_template_path",
     "clamp_scale",
+    "offset_scale",
     "match_with_scales",
+    "locate_many",
+    "get_window_region",
+    "set_window_region",
+    "invalidate_window_region",
     "click_template",
 ]
\ No newline at end of file
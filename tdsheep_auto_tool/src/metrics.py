@@ -0,0 +1,327 @@
+from __future__ import annotations
+
+"""
+    metrics.py
+    - 功能：热路径计时与计数
+    - 用法：
+        with span("locate_on_screen", template="2_1"):
+            ...
+        inc("clicks")
+    - 关闭时 span() 直接返回共享的空上下文，开销只有一次函数调用
+    - 导出：Prometheus 文本格式（metrics.prom）与 JSON 汇总（metrics.json），
+            启用后由后台线程按固定间隔写出，退出时再写一次
+"""
+
+import atexit
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Tuple, List, Dict, Any
+
+from .config import load_config_section
+
+# 直方图桶上界（秒）
+BUCKETS: Tuple[float, ...] = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 导出指标名前缀
+PREFIX = "tdsheep"
+
+_ENABLED: bool = False
+
+LabelKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+class _NullSpan:
+    """关闭状态下的空计时器。"""
+
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        return None
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Timing:
+    __slots__ = ("count", "total", "max", "buckets")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * len(BUCKETS)
+
+    def observe(self, sec: float) -> None:
+        self.count += 1
+        self.total += sec
+        if sec > self.max:
+            self.max = sec
+        for i, le in enumerate(BUCKETS):
+            if sec <= le:
+                self.buckets[i] += 1
+                break
+
+
+class MetricsRegistry:
+    """进程内的计时与计数存储。"""
+
+    def __init__(self) -> None:
+        self._timings: Dict[LabelKey, _Timing] = {}
+        self._counters: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+        self.started = time.time()
+
+    def observe(self, key: LabelKey, sec: float) -> None:
+        with self._lock:
+            t = self._timings.get(key)
+            if t is None:
+                t = self._timings[key] = _Timing()
+            t.observe(sec)
+
+    def inc(self, key: LabelKey, value: float = 1.0) -> None:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def reset(self) -> None:
+        with self._lock:
+            self._timings.clear()
+            self._counters.clear()
+            self.started = time.time()
+
+    def snapshot(self) -> Tuple[Dict[LabelKey, _Timing], Dict[LabelKey, float]]:
+        with self._lock:
+            timings = {}
+            for k, t in self._timings.items():
+                c = _Timing()
+                c.count, c.total, c.max, c.buckets = t.count, t.total, t.max, list(t.buckets)
+                timings[k] = c
+            return timings, dict(self._counters)
+
+
+_REGISTRY = MetricsRegistry()
+
+
+class _Span:
+    __slots__ = ("key", "t0")
+
+    def __init__(self, key: LabelKey) -> None:
+        self.key = key
+        self.t0 = 0.0
+
+    def __enter__(self) -> "_Span":
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        _REGISTRY.observe(self.key, time.perf_counter() - self.t0)
+
+
+def _key(name: str, labels: Dict[str, Any]) -> LabelKey:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def span(name: str, **labels: Any):
+    """计时上下文；未启用时返回空上下文。"""
+    if not _ENABLED:
+        return _NULL_SPAN
+    return _Span(_key(name, labels))
+
+
+def inc(name: str, value: float = 1.0, **labels: Any) -> None:
+    """计数器加值；未启用时不做任何事。"""
+    if _ENABLED:
+        _REGISTRY.inc(_key(name, labels), value)
+
+
+def is_enabled() -> bool:
+    return _ENABLED
+
+
+def get_registry() -> MetricsRegistry:
+    return _REGISTRY
+
+
+def _escape(value: str) -> str:
+    """Prometheus 标签值转义：反斜杠、双引号与换行。"""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(labels: Tuple[Tuple[str, str], ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def render_prometheus() -> str:
+    """按 Prometheus 文本格式输出全部指标。"""
+    timings, counters = _REGISTRY.snapshot()
+    lines: List[str] = []
+    by_name: Dict[str, List[Tuple[Tuple[Tuple[str, str], ...], _Timing]]] = {}
+    for (name, labels), t in timings.items():
+        by_name.setdefault(name, []).append((labels, t))
+    for name in sorted(by_name):
+        metric = f"{PREFIX}_{name}_seconds"
+        lines.append(f"# TYPE {metric} histogram")
+        for labels, t in sorted(by_name[name], key=lambda x: x[0]):
+            cum = 0
+            for le, n in zip(BUCKETS, t.buckets):
+                cum += n
+                lines.append(f"{metric}_bucket{_fmt_labels(labels, ('le', repr(le)))} {cum}")
+            lines.append(f"{metric}_bucket{_fmt_labels(labels, ('le', '+Inf'))} {t.count}")
+            lines.append(f"{metric}_sum{_fmt_labels(labels)} {t.total:.6f}")
+            lines.append(f"{metric}_count{_fmt_labels(labels)} {t.count}")
+    cnames: Dict[str, List[Tuple[Tuple[Tuple[str, str], ...], float]]] = {}
+    for (name, labels), v in counters.items():
+        cnames.setdefault(name, []).append((labels, v))
+    for name in sorted(cnames):
+        metric = f"{PREFIX}_{name}_total"
+        lines.append(f"# TYPE {metric} counter")
+        for labels, v in sorted(cnames[name], key=lambda x: x[0]):
+            lines.append(f"{metric}{_fmt_labels(labels)} {v:g}")
+    return "\n".join(lines) + "\n"
+
+
+def summary() -> Dict[str, Any]:
+    """JSON 汇总：每个计时项的次数、总耗时、平均与最大值，以及计数器。"""
+    timings, counters = _REGISTRY.snapshot()
+    spans = []
+    for (name, labels), t in sorted(timings.items(), key=lambda kv: -kv[1].total):
+        spans.append({
+            "name": name,
+            "labels": dict(labels),
+            "count": t.count,
+            "total_sec": round(t.total, 6),
+            "mean_ms": round(t.total / t.count * 1000, 3) if t.count else 0.0,
+            "max_ms": round(t.max * 1000, 3),
+        })
+    return {
+        "started": _REGISTRY.started,
+        "generated": time.time(),
+        "spans": spans,
+        "counters": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(counters.items())],
+    }
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(text, encoding="utf-8")
+    tmp.replace(path)
+
+
+class _Exporter:
+    def __init__(self, prom_path: Optional[Path], json_path: Optional[Path], interval: float) -> None:
+        self.prom_path = prom_path
+        self.json_path = json_path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="metrics-export", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self.export()
+
+    def export(self) -> None:
+        try:
+            if self.prom_path:
+                _write_atomic(self.prom_path, render_prometheus())
+            if self.json_path:
+                _write_atomic(self.json_path, json.dumps(summary(), ensure_ascii=False, indent=2))
+        except Exception as e:
+            print(f"[metrics] 导出失败: {e}")
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.export()
+
+
+_EXPORTER: Optional[_Exporter] = None
+
+
+def enable_metrics(
+    prom_path: Optional[Path] = None,
+    json_path: Optional[Path] = None,
+    interval_sec: float = 30.0,
+) -> None:
+    """
+    启用指标采集。
+    - prom_path / json_path: 导出文件路径；均为 None 时只采集不导出
+    - interval_sec: 后台导出间隔
+    """
+    global _ENABLED, _EXPORTER
+    _ENABLED = True
+    if _EXPORTER is not None:
+        _EXPORTER.stop()
+        _EXPORTER = None
+    if prom_path or json_path:
+        _EXPORTER = _Exporter(
+            Path(prom_path) if prom_path else None,
+            Path(json_path) if json_path else None,
+            max(1.0, float(interval_sec)),
+        )
+        _EXPORTER.start()
+        print(f"[metrics] 指标已启用，每 {_EXPORTER.interval:.0f}s 导出到 {prom_path or ''} {json_path or ''}".rstrip())
+
+
+def disable_metrics() -> None:
+    """停止采集；若配置了导出则最后写出一次。"""
+    global _ENABLED, _EXPORTER
+    _ENABLED = False
+    if _EXPORTER is not None:
+        _EXPORTER.stop()
+        _EXPORTER = None
+
+
+def _flush_on_exit() -> None:
+    if _EXPORTER is not None:
+        _EXPORTER.export()
+
+
+atexit.register(_flush_on_exit)
+
+
+def load_metrics_config() -> Dict[str, Any]:
+    """读取 config.json 中 diagnostics.metrics 配置（可选）。"""
+    default = {"enabled": False, "dir": None, "interval_secs": 30.0}
+    m = load_config_section("diagnostics").get("metrics") or {}
+    try:
+        return {
+            "enabled": bool(m.get("enabled", default["enabled"])),
+            "dir": m.get("dir") or default["dir"],
+            "interval_secs": float(m.get("interval_secs", default["interval_secs"])),
+        }
+    except (AttributeError, TypeError, ValueError) as e:
+        print(f"[config] diagnostics.metrics 配置无效，使用默认: {e}")
+        return default
+
+
+def configure_from_config(default_dir: Path) -> bool:
+    """按配置启用指标导出；dir 未配置时写到 default_dir。返回是否启用。"""
+    cfg = load_metrics_config()
+    if not cfg["enabled"]:
+        return False
+    out_dir = Path(cfg["dir"]) if cfg["dir"] else Path(default_dir)
+    enable_metrics(out_dir / "metrics.prom", out_dir / "metrics.json", cfg["interval_secs"])
+    return True
+
+
+__all__ = [
+    "span",
+    "inc",
+    "is_enabled",
+    "enable_metrics",
+    "disable_metrics",
+    "render_prometheus",
+    "summary",
+    "get_registry",
+    "load_metrics_config",
+    "configure_from_config",
+]
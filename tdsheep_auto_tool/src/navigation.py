@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+"""
+    navigation.py
+    - 功能：页面导航图与最短路径
+    - 边定义：assets/navigation.json，每条边为“在 from 页面点击某模板后到达 to 页面”
+        {"from": "HOME", "to": "FRONTLINE", "folder": "a", "stem": "home_to_frontline",
+         "cost": 2.0, "timeout": 8.0}
+        cost 为初始估计耗时（秒），timeout 为等待到达目标页面的上限
+    - 边的代价：实际跳转耗时的指数滑动平均，保存在 data/nav_costs.json；
+                跳转失败按 timeout x FAIL_PENALTY 计入，使不稳定的边逐渐被绕开
+    - 路径：Dijkstra，代价为各边估计耗时之和
+"""
+
+import heapq
+import json
+from pathlib import Path
+from typing import Optional, Tuple, List, Dict, Any
+
+from .match import get_assets_dir, get_scale_state_path
+from .scale_state import ScaleStateStore, get_store
+
+# 滑动平均系数：新样本的权重
+COST_EMA_ALPHA: float = 0.3
+# 跳转失败时按 timeout 的倍数计入代价
+FAIL_PENALTY: float = 2.0
+DEFAULT_EDGE_COST: float = 3.0
+DEFAULT_EDGE_TIMEOUT: float = 8.0
+
+
+class NavEdge:
+    """一条页面跳转：在 src 页面点击 folder/stem，预期到达 dst 页面。"""
+
+    __slots__ = ("src", "dst", "folder", "stem", "base_cost", "timeout")
+
+    def __init__(self, src: str, dst: str, folder: str, stem: str, base_cost: float, timeout: float) -> None:
+        self.src = src
+        self.dst = dst
+        self.folder = folder
+        self.stem = stem
+        self.base_cost = float(base_cost)
+        self.timeout = float(timeout)
+
+    @property
+    def key(self) -> str:
+        return f"{self.src}->{self.dst}:{self.folder}/{self.stem}"
+
+    def __repr__(self) -> str:
+        return f"NavEdge({self.key})"
+
+
+def _default_costs() -> Dict[str, Any]:
+    return {"edges": {}}
+
+
+def _normalize_costs(data: Dict[str, Any]) -> Dict[str, Any]:
+    edges = data.get("edges")
+    data["edges"] = edges if isinstance(edges, dict) else {}
+    return data
+
+
+class NavGraph:
+    """
+    页面导航图。
+    - edges: 边列表
+    - store: 学习到的边代价存储；None 时只使用初始代价
+    """
+
+    def __init__(self, edges: List[NavEdge], store: Optional[ScaleStateStore] = None) -> None:
+        self.edges = list(edges)
+        self.store = store
+        self._out: Dict[str, List[NavEdge]] = {}
+        for e in self.edges:
+            self._out.setdefault(e.src, []).append(e)
+
+    def nodes(self) -> List[str]:
+        names = {e.src for e in self.edges} | {e.dst for e in self.edges}
+        return sorted(names)
+
+    def has_exits(self, node: str) -> bool:
+        return bool(self._out.get(node))
+
+    def _costs(self) -> Optional[ScaleStateStore]:
+        """学习到的边代价存储；经 get_store 取得，离线回放时为临时目录下的副本。"""
+        if self.store is None:
+            return None
+        return get_store(self.store.path, _default_costs, _normalize_costs)
+
+    def cost(self, edge: NavEdge) -> float:
+        """边的当前估计耗时：有实测数据时取滑动平均，否则取初始代价。"""
+        store = self._costs()
+        if store is None:
+            return edge.base_cost
+        rec = store.load()["edges"].get(edge.key)
+        return float(rec["ema"]) if rec else edge.base_cost
+
+    def record(self, edge: NavEdge, latency: Optional[float], ok: bool) -> float:
+        """
+        记录一次跳转结果并更新滑动平均，返回更新后的代价。
+        - latency: 点击到确认到达的耗时；失败时忽略，按 timeout x FAIL_PENALTY 计入
+        """
+        sample = float(latency) if ok and latency is not None else edge.timeout * FAIL_PENALTY
+        store = self._costs()
+        if store is None:
+            return sample
+        state = store.load()
+        rec = state["edges"].get(edge.key)
+        if rec is None:
+            rec = {"ema": sample, "count": 0, "fails": 0}
+        else:
+            rec["ema"] = (1 - COST_EMA_ALPHA) * float(rec["ema"]) + COST_EMA_ALPHA * sample
+        rec["count"] = int(rec.get("count", 0)) + 1
+        if not ok:
+            rec["fails"] = int(rec.get("fails", 0)) + 1
+        state["edges"][edge.key] = rec
+        store.save(state)
+        return float(rec["ema"])
+
+    # 功能：Dijkstra 最短路径。
+    def shortest_path(self, src: str, dst: str) -> Optional[List[NavEdge]]:
+        """返回从 src 到 dst 代价最小的边序列；src == dst 时返回空列表，不可达返回 None。"""
+        if src == dst:
+            return []
+        dist: Dict[str, float] = {src: 0.0}
+        prev: Dict[str, NavEdge] = {}
+        heap: List[Tuple[float, str]] = [(0.0, src)]
+        while heap:
+            d, node = heapq.heappop(heap)
+            if node == dst:
+                break
+            if d > dist.get(node, float("inf")):
+                continue
+            for e in self._out.get(node, []):
+                nd = d + self.cost(e)
+                if nd < dist.get(e.dst, float("inf")):
+                    dist[e.dst] = nd
+                    prev[e.dst] = e
+                    heapq.heappush(heap, (nd, e.dst))
+        if dst not in prev:
+            return None
+        path: List[NavEdge] = []
+        node = dst
+        while node != src:
+            e = prev[node]
+            path.append(e)
+            node = e.src
+        path.reverse()
+        return path
+
+    def path_cost(self, path: List[NavEdge]) -> float:
+        return sum(self.cost(e) for e in path)
+
+
+def get_navigation_path() -> Path:
+    return get_assets_dir() / "navigation.json"
+
+
+def get_nav_costs_path() -> Path:
+    return get_scale_state_path().with_name("nav_costs.json")
+
+
+def load_nav_graph(path: Optional[Path] = None) -> NavGraph:
+    """读取导航图定义；文件不存在或无效时返回空图。"""
+    path = path or get_navigation_path()
+    edges: List[NavEdge] = []
+    try:
+        with Path(path).open("r", encoding="utf-8") as f:
+            data = json.load(f)
+        for e in data.get("edges", []):
+            edges.append(NavEdge(
+                str(e["from"]),
+                str(e["to"]),
+                str(e["folder"]),
+                str(e["stem"]),
+                float(e.get("cost", DEFAULT_EDGE_COST)),
+                float(e.get("timeout", DEFAULT_EDGE_TIMEOUT)),
+            ))
+    except FileNotFoundError:
+        print(f"[nav] 未找到导航图: {path}")
+    except Exception as e:
+        print(f"[nav] 读取导航图失败: {e}")
+    return NavGraph(edges, get_store(get_nav_costs_path(), _default_costs, _normalize_costs))
+
+
+_GRAPH: Optional[NavGraph] = None
+
+
+def get_nav_graph() -> NavGraph:
+    """返回进程内共享的导航图（首次访问时加载）。"""
+    global _GRAPH
+    if _GRAPH is None:
+        _GRAPH = load_nav_graph()
+    return _GRAPH
+
+
+__all__ = [
+    "NavEdge",
+    "NavGraph",
+    "load_nav_graph",
+    "get_nav_graph",
+    "get_navigation_path",
+    "get_nav_costs_path",
+]
@@ -5,18 +5,26 @@ f"""
     - 功能：管理游戏页面状态，包含页面检测与跳转逻辑
 """
 
-from typing import Optional, Tuple, List
-import time
+from typing import Optional, Tuple, List, Dict, Sequence, Hashable
 from pathlib import Path
 
+import cv2
+import numpy as np
+
 # 导入 match 中的工具
+from .calc_locate import click_point, clock_now, sleep, grab_screen, load_template
+from .capture import release_frame
+from .metrics import span
+from .instance import current_instance
+from .navigation import NavEdge, get_nav_graph
+from .settle import OUTCOME_PRESENT, OUTCOME_TIMEOUT, get_latency_tracker, wait_until_settled
 from .match import (
-    check_image_exists,
     get_assets_dir,
+    locate_many,
     load_scale_state,
-    ordered_scales,
+    match_with_scales,
     find_template_path,
-    click_template
+    get_window_region,
 )
 
 # 页面常量定义
@@ -24,16 +32,46 @@ PAGE_HOME = 0
 PAGE_FRONTLINE = 1
 PAGE_DEFENSE_LINE = 2
 PAGE_WOLF_PACK = 3
+PAGE_UNKNOWN = -1
+
+PAGE_NAMES: Dict[int, str] = {
+    PAGE_HOME: "HOME",
+    PAGE_FRONTLINE: "FRONTLINE",
+    PAGE_DEFENSE_LINE: "DEFENSE_LINE",
+    PAGE_WOLF_PACK: "WOLF_PACK",
+}
+
+# 页面 -> (资源子目录, 判定该页面所需的全部图片)
+PAGE_TEMPLATES: Dict[int, Tuple[str, List[str]]] = {
+    PAGE_HOME: ("page_home", ["1", "2"]),
+    PAGE_FRONTLINE: ("page_frontline", [str(i) for i in range(1, 7)]),
+    PAGE_DEFENSE_LINE: ("page_defenseline", ["1"]),
+    PAGE_WOLF_PACK: ("page_wolfpack", ["1", "2", "3"]),
+}
+# 页面识别时每个页面至少使用的特征图片数量（页面图片不足时取全部）
+SIGNATURE_SIZE: int = 2
+# 特征图片校验阈值：与其他页面图片的互相关达到该值即视为可能在该页面上误命中（与识别时的置信度一致）
+SIGNATURE_MAX_CROSS: float = 0.7
+# 等待页面到达时的识别间隔（秒）
+PAGE_POLL_SEC: float = 0.2
+# 刷新后等待回到主页的上限（秒）
+REFRESH_TIMEOUT_SEC: float = 10.0
+
+PAGE_IDS: Dict[str, int] = {name: page for page, name in PAGE_NAMES.items()}
 
 
 def _find_and_click_with_scaling(
     folder_name: str,
     stem: str,
     confidence: float = 0.7,
-    grayscale: bool = True
+    grayscale: bool = True,
+    use_window_region: bool = True,
+    region: Optional[Tuple[int, int, int, int]] = None
 ) -> bool:
     """
     查找并点击图片（支持多比例缩放）。
+    - use_window_region: 是否只在游戏窗口区域内查找（浏览器按钮等窗口外元素需设为 False）
+    - region: 显式指定搜索区域，优先于窗口区域
     """
     assets_dir = get_assets_dir() / folder_name
     if not assets_dir.exists():
@@ -43,130 +81,259 @@ def _find_and_click_with_scaling(
     state = load_scale_state()
     recommended_scale = state.get("recommended_scale", 100)
 
-    for s in ordered_scales(recommended_scale):
-        tpl_path = find_template_path(assets_dir, stem, s)
-        if not tpl_path:
-            continue
-        
-        # 尝试点击
-        clicked = click_template(
-            template_path=str(tpl_path),
-            confidence=confidence,
-            grayscale=grayscale
-        )
-        if clicked:
-            print(f"[page] 点击成功: {stem} (scale={s}%)")
-            return True
-            
-    return False
+    m, s = match_with_scales(
+        assets_dir,
+        stem,
+        recommended_scale,
+        confidence,
+        grayscale,
+        region,
+        use_window_region=use_window_region,
+    )
+    if not m:
+        return False
+    cx, cy = m["center"]
+    click_point(cx, cy)
+    print(f"[page] 点击成功: {stem} (scale={s}%)")
+    return True
 
 
-def _check_image_with_scaling(
-    folder_name: str, 
-    stem: str, 
-    confidence: float = 0.7, 
+def _check_images_with_scaling(
+    folder_name: str,
+    stems: Sequence[str],
+    confidence: float = 0.7,
     grayscale: bool = True,
     region: Optional[Tuple[int, int, int, int]] = None
 ) -> bool:
     """
-    检查指定图片是否存在，自动处理多比例缩放。
-    优先使用当前记录的推荐比例，若不匹配则遍历所有支持的比例。
+    检查指定目录下的一组图片是否全部存在，自动处理多比例缩放。
+    整组只截屏一次；任一图片未命中即提前返回 False。
     """
     assets_dir = get_assets_dir() / folder_name
     if not assets_dir.exists():
         print(f"[page] 资源目录不存在: {assets_dir}")
         return False
-        
+
     state = load_scale_state()
     recommended_scale = state.get("recommended_scale", 100)
-    
-    # 按优先级顺序遍历比例
-    for s in ordered_scales(recommended_scale):
-        tpl_path = find_template_path(assets_dir, stem, s)
-        if not tpl_path:
-            continue
-            
-        if check_image_exists(
-            image=str(tpl_path),
-            confidence=confidence,
-            grayscale=grayscale,
-            region=region
-        ):
-            # 找到匹配
-            if s != recommended_scale:
-                print(f"[page] 提示: 图片 {stem} 在 {s}% 比例下匹配成功 (当前推荐: {recommended_scale}%)")
-            return True
-            
-    return False
+
+    results = locate_many(
+        [(assets_dir, stem, None) for stem in stems],
+        recommended_scale=recommended_scale,
+        confidence=confidence,
+        grayscale=grayscale,
+        region=region,
+        stop_on_miss=True,
+    )
+    for stem in stems:
+        m, s = results.get((folder_name, stem), (None, None))
+        if m is None:
+            return False
+        if s != recommended_scale:
+            print(f"[page] 提示: 图片 {stem} 在 {s}% 比例下匹配成功 (当前推荐: {recommended_scale}%)")
+    return True
+
+
+def _check_image_with_scaling(
+    folder_name: str, 
+    stem: str, 
+    confidence: float = 0.7, 
+    grayscale: bool = True,
+    region: Optional[Tuple[int, int, int, int]] = None
+) -> bool:
+    """
+    检查指定图片是否存在，自动处理多比例缩放。
+    优先使用当前记录的推荐比例，若不匹配则遍历所有支持的比例。
+    """
+    return _check_images_with_scaling(folder_name, [stem], confidence, grayscale, region)
 
 
 def _check_page_home() -> bool:
     """检测是否在 PAGE_HOME"""
-    # 假设需要匹配该文件夹下所有标号图片
     # page_home: 1.png, 2.png
-    stems = ["1", "2"]
-    for stem in stems:
-        if not _check_image_with_scaling("page_home", stem):
-            return False
-    return True
+    return _check_images_with_scaling(*PAGE_TEMPLATES[PAGE_HOME])
 
 
 def _check_page_frontline() -> bool:
     """检测是否在 PAGE_FRONTLINE"""
     # page_frontline: 1.png ~ 6.png
-    stems = [str(i) for i in range(1, 7)]
-    for stem in stems:
-        if not _check_image_with_scaling("page_frontline", stem):
-            return False
-    return True
+    return _check_images_with_scaling(*PAGE_TEMPLATES[PAGE_FRONTLINE])
 
 
 def _check_page_defenseline() -> bool:
     """检测是否在 PAGE_DEFENSE_LINE"""
     # page_defenseline: 1.png
-    stems = ["1"]
-    for stem in stems:
-        if not _check_image_with_scaling("page_defenseline", stem):
-            return False
-    return True
+    return _check_images_with_scaling(*PAGE_TEMPLATES[PAGE_DEFENSE_LINE])
 
 
 def _check_page_wolfpack() -> bool:
     """检测是否在 PAGE_WOLF_PACK"""
     # page_wolfpack: 1.png ~ 3.png
-    stems = ["1", "2", "3"]
-    for stem in stems:
-        if not _check_image_with_scaling("page_wolfpack", stem):
-            return False
-    return True
+    return _check_images_with_scaling(*PAGE_TEMPLATES[PAGE_WOLF_PACK])
+
+
+def _cross_score(a: np.ndarray, b: np.ndarray) -> float:
+    """两张模板互相匹配的最高分（小图在大图中滑动）；尺寸无法嵌套时返回 0。"""
+    if a.shape[0] <= b.shape[0] and a.shape[1] <= b.shape[1]:
+        small, large = a, b
+    elif b.shape[0] <= a.shape[0] and b.shape[1] <= a.shape[1]:
+        small, large = b, a
+    else:
+        return 0.0
+    res = cv2.matchTemplate(large, small, cv2.TM_CCOEFF_NORMED)
+    return float(np.nan_to_num(res).max())
+
+
+_SIGNATURES: Dict[Tuple[float, int], Dict[int, List[str]]] = {}
+
+
+# 功能：为每个页面挑选最能与其他页面区分的少量图片，并校验它们能把该页面与其他页面区分开。
+def page_signatures(scale: float = 100, size: int = SIGNATURE_SIZE) -> Dict[int, List[str]]:
+    """
+    对每个页面的每张图片，计算它与其他每个页面全部图片的最高互相关分数，
+    分数越低越不容易在其他页面上误命中；同分时优先面积大的图片。每个页面先取前 size 张。
+    校验：对每个其他页面，至少要有一张特征图片与该页面全部图片的互相关低于 SIGNATURE_MAX_CROSS
+    （否则该页面的画面可能命中全部特征图片），不满足时按排序继续补充图片，补到全部仍不满足时打印警告。
+    结果按 (比例, 数量) 缓存；precompute_page_signatures 在启动时预先计算。
+    """
+    key = (scale, size)
+    if key in _SIGNATURES:
+        return _SIGNATURES[key]
+
+    tpls: Dict[int, Dict[str, np.ndarray]] = {}
+    for page, (folder, stems) in PAGE_TEMPLATES.items():
+        assets_dir = get_assets_dir() / folder
+        tpls[page] = {}
+        for stem in stems:
+            path = find_template_path(assets_dir, stem, scale) or find_template_path(assets_dir, stem, 100)
+            if path is not None:
+                tpls[page][stem] = load_template(str(path), True)
+
+    sigs: Dict[int, List[str]] = {}
+    for page, own in tpls.items():
+        # cross[stem][q]：该图片与页面 q 全部图片的最高互相关
+        cross = {
+            stem: {q: max((_cross_score(t, o) for o in d.values()), default=0.0) for q, d in tpls.items() if q != page}
+            for stem, t in own.items()
+        }
+        ranked = sorted(own, key=lambda st: (max(cross[st].values(), default=0.0), -own[st].size, st))
+
+        def _ambiguous(chosen: List[str]) -> List[int]:
+            return [q for q in tpls if q != page and all(cross[st][q] >= SIGNATURE_MAX_CROSS for st in chosen)]
+
+        chosen = ranked[:size]
+        for stem in ranked[size:]:
+            if not _ambiguous(chosen):
+                break
+            chosen.append(stem)
+        bad = _ambiguous(chosen)
+        if bad:
+            print(
+                f"[page] 警告: {PAGE_NAMES[page]} 的特征图片无法与 "
+                f"{', '.join(PAGE_NAMES[q] for q in bad)} 区分，识别结果可能不可靠"
+            )
+        sigs[page] = chosen
+    _SIGNATURES[key] = sigs
+    return sigs
+
+
+# 功能：按当前推荐比例预先计算并校验页面特征图片（启动时调用，避免首次识别时才计算）。
+def precompute_page_signatures() -> Dict[int, List[str]]:
+    recommended = load_scale_state().get("recommended_scale", 100)
+    sigs = page_signatures(recommended)
+    print(
+        "[page] 页面特征图片: "
+        + "，".join(f"{PAGE_NAMES[p]}={'/'.join(stems)}" for p, stems in sigs.items())
+    )
+    return sigs
+
+
+# 上次识别到的页面（多窗口时按实例区分），下次优先检查
+_LAST_PAGE: Dict[Hashable, int] = {}
+
+
+def _last_page_key() -> Hashable:
+    inst = current_instance()
+    return inst.name if inst is not None else None
+
+
+# 功能：单次截屏识别当前页面。
+def identify_current_page(
+    frame: Optional[np.ndarray] = None,
+    confidence: float = 0.7,
+    grayscale: bool = True,
+) -> int:
+    """
+    返回当前显示的页面 ID（PAGE_HOME 等），无法识别时返回 PAGE_UNKNOWN。
+    - 只截屏一次，每个页面只匹配 page_signatures 选出的特征图片，且只用推荐比例；
+      上次识别到的页面最先检查，通常在近位提示区域内就能命中
+    - frame: 已截取的画面（需与会话级窗口区域、grayscale 对应）
+    推荐比例失效时会返回 PAGE_UNKNOWN，此时应回退到完整的页面检测。
+    """
+    recommended = load_scale_state().get("recommended_scale", 100)
+    sigs = page_signatures(recommended)
+    region = get_window_region()
+    # 自行截取的画面用完后归还缓冲池；调用方传入的画面归调用方
+    owned = frame is None
+    with span("identify_page"):
+        if owned:
+            frame = grab_screen(region=region, grayscale=grayscale)
+        try:
+            last = _LAST_PAGE.get(_last_page_key())
+            order = sorted(PAGE_TEMPLATES, key=lambda p: p != last)
+            for page in order:
+                folder, _ = PAGE_TEMPLATES[page]
+                stems = sigs.get(page) or []
+                if not stems:
+                    continue
+                found = locate_many(
+                    [(folder, stem, [recommended]) for stem in stems],
+                    frame=frame,
+                    recommended_scale=recommended,
+                    confidence=confidence,
+                    grayscale=grayscale,
+                    region=region,
+                    stop_on_miss=True,
+                )
+                if all(found.get((folder, stem), (None, None))[0] is not None for stem in stems):
+                    _LAST_PAGE[_last_page_key()] = page
+                    return page
+        finally:
+            if owned:
+                release_frame(frame)
+    return PAGE_UNKNOWN
 
 
 def is_target_page(page_id: int) -> bool:
     """
     判断当前是否为目标页面。
-    如果不是目标页面，会自动尝试刷新并跳转，然后返回 False。
-    """
-    is_match = False
-    if page_id == PAGE_HOME:
-        is_match = _check_page_home()
-    elif page_id == PAGE_FRONTLINE:
-        is_match = _check_page_frontline()
-    elif page_id == PAGE_DEFENSE_LINE:
-        is_match = _check_page_defenseline()
-    elif page_id == PAGE_WOLF_PACK:
-        is_match = _check_page_wolfpack()
-    else:
+    先用特征图片单次截屏识别当前页面；识别不出时（推荐比例可能已失效）才对目标页面做完整的多比例检测。
+    如果不是目标页面，沿导航图从当前页面跳转；无法识别或跳转失败时才刷新，
+    返回是否已到达目标页面。
+    """
+    if page_id not in PAGE_TEMPLATES:
         print(f"[page] 未知页面ID: {page_id}")
         return False
-        
-    if is_match:
+
+    cur = identify_current_page()
+    if cur == page_id:
         return True
-        
-    # 如果不匹配，执行刷新和跳转逻辑
-    print(f"[page] 页面检测不匹配 (ID={page_id})，开始刷新并跳转...")
-    _refresh_page()
-    # 刷新后默认回到 PAGE_HOME，所以尝试从 HOME 跳转到目标页面
-    return _jump_to_page(PAGE_HOME, page_id)
+    if cur == PAGE_UNKNOWN:
+        if _check_images_with_scaling(*PAGE_TEMPLATES[page_id]):
+            return True
+        cur = _detect_page_full(exclude=page_id)
+    if cur not in (PAGE_UNKNOWN, page_id):
+        print(f"[page] 当前识别为 {PAGE_NAMES[cur]}，尝试直接跳转到 {PAGE_NAMES[page_id]}")
+        if _jump_to_page(cur, page_id):
+            return True
+
+    # 无法识别或导航失败，最后才刷新
+    print(f"[page] 页面检测不匹配 ({PAGE_NAMES[page_id]})，开始刷新并跳转...")
+    cur = _refresh_page()
+    if cur == page_id:
+        return True
+    # 刷新后默认回到 PAGE_HOME；识别失败时也按 HOME 处理
+    return _jump_to_page(PAGE_HOME if cur == PAGE_UNKNOWN else cur, page_id)
 
 
 def ensure_page(
@@ -178,74 +345,139 @@ def ensure_page(
     确保当前在指定页面，如果不在则尝试跳转。
     """
     # 映射 ID 到名称以便日志显示
-    page_names = {
-        PAGE_HOME: "HOME",
-        PAGE_FRONTLINE: "FRONTLINE",
-        PAGE_DEFENSE_LINE: "DEFENSE_LINE",
-        PAGE_WOLF_PACK: "WOLF_PACK"
-    }
-    page_name = page_names.get(target_page_id, f"UNKNOWN({target_page_id})")
-
-    # 1. 检查当前是否已经在目标页面
-    # 注意：is_target_page 现在包含了自动刷新和跳转尝试
-    if is_target_page(target_page_id):
-        print(f"[page] 当前已在 {page_name}")
-        return True
+    page_name = PAGE_NAMES.get(target_page_id, f"UNKNOWN({target_page_id})")
+
+    with span("ensure_page", page=page_name):
+        # 1. 检查当前是否已经在目标页面
+        # 注意：is_target_page 现在包含了自动刷新和跳转尝试
+        if is_target_page(target_page_id):
+            print(f"[page] 当前已在 {page_name}")
+            return True
         
-    # 如果 is_target_page 返回 False，说明第一次检测失败，并且已经尝试了一次刷新和跳转
-    # 我们进入重试循环
+        # 如果 is_target_page 返回 False，说明第一次检测失败，并且已经尝试了一次刷新和跳转
+        # 我们进入重试循环
     
-    for i in range(max_retries):
-        print(f"[page] 页面校验重试 {i+1}/{max_retries}...")
-        time.sleep(retry_interval)
+        for i in range(max_retries):
+            print(f"[page] 页面校验重试 {i+1}/{max_retries}...")
+            # 等画面稳定后再检测，最多 retry_interval 秒
+            wait_until_settled(timeout=retry_interval, region=get_window_region(), key="ensure_page_retry")
         
-        # 再次调用 is_target_page
-        # 如果还是不匹配，它会再次尝试刷新和跳转
-        if is_target_page(target_page_id):
-            print(f"[page] 跳转成功，已到达 {page_name}")
-            return True
+            # 再次调用 is_target_page
+            # 如果还是不匹配，它会再次尝试刷新和跳转
+            if is_target_page(target_page_id):
+                print(f"[page] 跳转成功，已到达 {page_name}")
+                return True
         
-    print(f"[page] 无法到达 {page_name}")
-    return False
+        print(f"[page] 无法到达 {page_name}")
+        return False
 
 # 内部辅助函数
+def _detect_page_full(exclude: int = PAGE_UNKNOWN) -> int:
+    """
+    逐页做完整的多比例检测（推荐比例失效时 identify_current_page 无法识别）。
+    只检查导航图中有出边的页面；exclude 为已确认不在的页面。
+    """
+    graph = get_nav_graph()
+    for page, (folder, stems) in PAGE_TEMPLATES.items():
+        if page == exclude or not graph.has_exits(PAGE_NAMES[page]):
+            continue
+        if _check_images_with_scaling(folder, stems):
+            return page
+    return PAGE_UNKNOWN
+
+
+def _wait_for_page(page_id: int, timeout: float) -> bool:
+    """
+    在 timeout 秒内反复识别当前页面，到达 page_id 时返回 True。
+    单比例识别不出页面时（推荐比例可能已失效）再对目标页面做一次完整的多比例检测。
+    """
+    deadline = clock_now() + timeout
+    while True:
+        cur = identify_current_page()
+        if cur == page_id:
+            return True
+        if cur == PAGE_UNKNOWN and _check_images_with_scaling(*PAGE_TEMPLATES[page_id]):
+            return True
+        if clock_now() >= deadline:
+            return False
+        sleep(PAGE_POLL_SEC)
+
+
+def _follow_edge(edge: NavEdge) -> bool:
+    """
+    执行导航图中的一条边：点击模板后等待目标页面出现。
+    点击到确认到达的耗时计入该边的代价；未找到按钮或超时按失败计入。
+    """
+    graph = get_nav_graph()
+    dst = PAGE_IDS.get(edge.dst, PAGE_UNKNOWN)
+    with span("navigation", action=f"{edge.src}->{edge.dst}"):
+        if not _find_and_click_with_scaling(edge.folder, edge.stem):
+            print(f"[jump] 未找到 {edge.stem} 按钮")
+            graph.record(edge, None, False)
+            return False
+        t0 = clock_now()
+        ok = _wait_for_page(dst, edge.timeout)
+        elapsed = clock_now() - t0
+        cost = graph.record(edge, elapsed, ok)
+        get_latency_tracker().record(f"nav:{edge.src}->{edge.dst}", elapsed, OUTCOME_PRESENT if ok else OUTCOME_TIMEOUT)
+    if ok:
+        print(f"[jump] {edge.src} -> {edge.dst} 完成，当前估计耗时 {cost:.2f}s")
+    else:
+        print(f"[jump] {edge.src} -> {edge.dst} 超时 ({edge.timeout:.0f}s)")
+    return ok
+
+
 def _jump_to_page(cur_page_id: int, target_page_id: int) -> bool:
     """
     跳转到指定页面。
-    根据当前页面和目标页面，执行对应的点击操作。
-    返回 bool 表示是否执行了跳转操作（或无需跳转）且未报错。
+    沿导航图中估计耗时最小的路径逐边点击，每一步都确认到达后再继续。
+    返回是否到达目标页面（或无需跳转）。
     """
     if cur_page_id == target_page_id:
-        print(f"[jump] 起点与终点相同 ({cur_page_id})，无需跳转")
+        print(f"[jump] 起点与终点相同 ({PAGE_NAMES.get(cur_page_id, cur_page_id)})，无需跳转")
         return True
 
-    print(f"[jump] 尝试跳转: {cur_page_id} -> {target_page_id}")
+    src = PAGE_NAMES.get(cur_page_id)
+    dst = PAGE_NAMES.get(target_page_id)
+    graph = get_nav_graph()
+    path = graph.shortest_path(src, dst) if src and dst else None
+    if not path:
+        print(f"[jump] 导航图中没有从 {src or cur_page_id} 到 {dst or target_page_id} 的路径")
+        return False
 
-    # 逻辑：从 HOME (0) -> FRONTLINE (1)
-    if cur_page_id == PAGE_HOME and target_page_id == PAGE_FRONTLINE:
-        print("[jump] 执行 HOME -> FRONTLINE 跳转...")
-        if _find_and_click_with_scaling("a", "home_to_frontline"):
-            print("[jump] 点击 home_to_frontline 成功，等待页面加载...")
-            time.sleep(2)  # 等待跳转动画
-            return True
-        else:
-            print("[jump] 未找到 home_to_frontline 按钮")
+    route = " -> ".join([src] + [e.dst for e in path])
+    print(f"[jump] 尝试跳转: {route} (估计 {graph.path_cost(path):.1f}s)")
+    for edge in path:
+        if not _follow_edge(edge):
             return False
-    
-    # 后续可以添加更多跳转逻辑
-    # elif cur_page_id == PAGE_HOME and target_page_id == PAGE_DEFENSE_LINE:
-    #     ...
-    
-    else:
-        print(f"[jump] 尚未实现从 {cur_page_id} 到 {target_page_id} 的跳转路径")
-        return False
+    return True
 
-def _refresh_page():
-    """刷新页面：点击 page_refresh 并等待 10 秒"""
+def _refresh_region() -> Optional[Tuple[int, int, int, int]]:
+    """
+    刷新按钮的搜索区域。单窗口时为全屏（None）；
+    多窗口时只搜索当前窗口正上方的浏览器区域，避免点到其他窗口的刷新按钮。
+    """
+    inst = current_instance()
+    if inst is None:
+        return None
+    left, top, width, _ = inst.rect
+    if top <= 0:
+        return None
+    return left, 0, width, top
+
+
+def _refresh_page() -> int:
+    """刷新页面：点击 page_refresh 并等待回到主页（最多 REFRESH_TIMEOUT_SEC 秒），返回刷新后识别到的页面。"""
     print("[page] 正在刷新页面...")
-    # 查找并点击 page_refresh (位于 assets/a 目录)
-    if _find_and_click_with_scaling("a", "page_refresh"):
-        print("[page] 刷新按钮点击成功，等待 10 秒...")
-        time.sleep(10)
-    else:
-        print("[page] 未找到刷新按钮 (page_refresh)")
+    with span("navigation", action="refresh"):
+        # 查找并点击 page_refresh (位于 assets/a 目录，浏览器按钮在游戏窗口之外)
+        if not _find_and_click_with_scaling("a", "page_refresh", use_window_region=False, region=_refresh_region()):
+            print("[page] 未找到刷新按钮 (page_refresh)")
+            return identify_current_page()
+        print(f"[page] 刷新按钮点击成功，等待回到主页 (最多 {REFRESH_TIMEOUT_SEC:.0f} 秒)...")
+        t0 = clock_now()
+        ok = _wait_for_page(PAGE_HOME, REFRESH_TIMEOUT_SEC)
+        get_latency_tracker().record("nav:refresh", clock_now() - t0, OUTCOME_PRESENT if ok else OUTCOME_TIMEOUT)
+        if ok:
+            return PAGE_HOME
+        return identify_current_page()
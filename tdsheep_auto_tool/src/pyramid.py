@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+"""
+    pyramid.py
+    - 功能：由粗到精的金字塔模板匹配
+    - 思路：
+        1. 将画面与模板同时缩小 2x / 4x，在小图上做一次完整匹配
+        2. 取若干个得分最高的候选峰值（带邻域抑制）
+        3. 仅在候选附近的小块区域内做全分辨率匹配，取最高分
+    - 自检：python -m tdsheep_auto_tool.src.pyramid
+      在合成画面上对比金字塔与全量匹配的结果与耗时
+"""
+
+import time
+from typing import Optional, Tuple, List, Dict, Any
+
+import cv2
+import numpy as np
+
+# 可用的下采样倍数（从大到小尝试）
+PYRAMID_FACTORS: Tuple[int, ...] = (4, 2)
+# 下采样后模板的最短边下限，太小的模板在粗层上失去特征
+MIN_COARSE_SIDE: int = 12
+# 粗层保留的候选峰值数量
+MAX_CANDIDATES: int = 5
+# 支持“越大越好”的匹配方法；SQDIFF 系列直接走全量匹配
+_MAX_IS_BEST = (cv2.TM_CCOEFF_NORMED, cv2.TM_CCORR_NORMED, cv2.TM_CCOEFF, cv2.TM_CCORR)
+
+
+def choose_factor(screen_shape: Tuple[int, ...], tpl_shape: Tuple[int, ...]) -> int:
+    """根据模板尺寸选择下采样倍数，返回 1 表示不适合金字塔匹配。"""
+    th, tw = tpl_shape[:2]
+    sh, sw = screen_shape[:2]
+    for f in PYRAMID_FACTORS:
+        if min(th, tw) // f >= MIN_COARSE_SIDE and sh // f > th // f and sw // f > tw // f:
+            return f
+    return 1
+
+
+def _downsample(img: np.ndarray, factor: int) -> np.ndarray:
+    """按整数倍缩小图像（区域平均，抗混叠）。"""
+    h, w = img.shape[:2]
+    return cv2.resize(img, (max(1, w // factor), max(1, h // factor)), interpolation=cv2.INTER_AREA)
+
+
+def _coarse_candidates(res: np.ndarray, count: int, suppress: Tuple[int, int]) -> List[Tuple[int, int]]:
+    """在粗层结果图中取若干峰值，每取一个就抑制其邻域，避免候选扎堆。"""
+    res = res.copy()
+    sw, sh = suppress
+    out: List[Tuple[int, int]] = []
+    for _ in range(count):
+        _, max_val, _, max_loc = cv2.minMaxLoc(res)
+        if not np.isfinite(max_val) or max_val <= -1.0:
+            break
+        x, y = max_loc
+        out.append((x, y))
+        res[max(0, y - sh):y + sh + 1, max(0, x - sw):x + sw + 1] = -1.0
+    return out
+
+
+# 功能：金字塔匹配，返回 (最高分, 左上角坐标)，坐标相对于 screen。
+def pyramid_match(
+    screen: np.ndarray,
+    tpl: np.ndarray,
+    method: int = cv2.TM_CCOEFF_NORMED,
+    factor: Optional[int] = None,
+    candidates: int = MAX_CANDIDATES,
+) -> Tuple[float, Tuple[int, int]]:
+    """
+    由粗到精的模板匹配。
+    - factor: 下采样倍数；None 时按模板尺寸自动选择，不适合时退化为全量匹配
+    - candidates: 粗层保留的候选数量
+    返回值与 cv2.minMaxLoc 的 (max_val, max_loc) 含义一致。
+    """
+    f = choose_factor(screen.shape, tpl.shape) if factor is None else int(factor)
+    if f <= 1 or method not in _MAX_IS_BEST:
+        res = cv2.matchTemplate(screen, tpl, method)
+        _, max_val, _, max_loc = cv2.minMaxLoc(res)
+        return float(max_val), (int(max_loc[0]), int(max_loc[1]))
+
+    small_screen = _downsample(screen, f)
+    small_tpl = _downsample(tpl, f)
+    coarse = cv2.matchTemplate(small_screen, small_tpl, method)
+    # 邻域抑制半径取粗层模板尺寸的一半
+    suppress = (max(1, small_tpl.shape[1] // 2), max(1, small_tpl.shape[0] // 2))
+    peaks = _coarse_candidates(coarse, max(1, candidates), suppress)
+
+    th, tw = tpl.shape[:2]
+    sh, sw = screen.shape[:2]
+    pad = 2 * f  # 下采样取整与插值带来的位置误差
+    best_val = -np.inf
+    best_loc = (0, 0)
+    for cx, cy in peaks:
+        x0 = max(0, cx * f - pad)
+        y0 = max(0, cy * f - pad)
+        x1 = min(sw, cx * f + tw + pad + f)
+        y1 = min(sh, cy * f + th + pad + f)
+        if x1 - x0 < tw or y1 - y0 < th:
+            continue
+        res = cv2.matchTemplate(screen[y0:y1, x0:x1], tpl, method)
+        _, max_val, _, max_loc = cv2.minMaxLoc(res)
+        if max_val > best_val:
+            best_val = max_val
+            best_loc = (x0 + int(max_loc[0]), y0 + int(max_loc[1]))
+
+    if not np.isfinite(best_val):
+        # 候选全部越界（极少见），退化为全量匹配
+        res = cv2.matchTemplate(screen, tpl, method)
+        _, max_val, _, max_loc = cv2.minMaxLoc(res)
+        return float(max_val), (int(max_loc[0]), int(max_loc[1]))
+    return float(best_val), best_loc
+
+
+def synthetic_screen(rng: np.random.Generator, size: Tuple[int, int], grayscale: bool) -> np.ndarray:
+    """生成带低频纹理与色块的合成画面，近似游戏界面的背景。"""
+    w, h = size
+    ch = 1 if grayscale else 3
+    low = rng.integers(0, 256, (h // 32 + 1, w // 32 + 1, ch), dtype=np.uint8)
+    screen = cv2.resize(low, (w, h), interpolation=cv2.INTER_CUBIC)
+    if screen.ndim == 2 and not grayscale:
+        screen = cv2.cvtColor(screen, cv2.COLOR_GRAY2BGR)
+    for _ in range(40):
+        x, y = int(rng.integers(0, w)), int(rng.integers(0, h))
+        color = tuple(int(c) for c in rng.integers(0, 256, ch))
+        cv2.rectangle(screen, (x, y), (x + int(rng.integers(10, 200)), y + int(rng.integers(10, 120))), color, -1)
+    noise = rng.normal(0, 4, screen.shape)
+    return np.clip(screen.astype(np.float32) + noise, 0, 255).astype(np.uint8)
+
+
+# 功能：在合成画面上对比金字塔匹配与全量匹配，打印一致率与加速比。
+def verify_against_exhaustive(
+    rounds: int = 30,
+    size: Tuple[int, int] = (1920, 1080),
+    grayscale: bool = True,
+    seed: int = 0,
+    tolerance_px: int = 1,
+) -> Dict[str, Any]:
+    """
+    随机挑选 assets 中的模板贴入合成画面，比较两种路径的命中位置与分数。
+    位置误差不超过 tolerance_px 且分数差小于 1e-3 视为一致。
+    """
+    from .match import get_assets_dir  # 延迟导入，避免自检之外引入 pyautogui
+
+    rng = np.random.default_rng(seed)
+    flag = cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR
+    paths = sorted(get_assets_dir().glob("*/*.png"))
+    tpls = [t for t in (cv2.imread(str(p), flag) for p in paths) if t is not None]
+    if not tpls:
+        print("[pyramid] 未找到可用模板")
+        return {"rounds": 0}
+
+    agree = 0
+    pyramid_used = 0
+    t_full = t_pyr = 0.0
+    for _ in range(rounds):
+        screen = synthetic_screen(rng, size, grayscale)
+        if screen.ndim == 3 and grayscale:
+            screen = screen[:, :, 0].copy()
+        tpl = tpls[int(rng.integers(0, len(tpls)))]
+        th, tw = tpl.shape[:2]
+        x = int(rng.integers(0, size[0] - tw))
+        y = int(rng.integers(0, size[1] - th))
+        screen[y:y + th, x:x + tw] = tpl
+
+        t0 = time.perf_counter()
+        res = cv2.matchTemplate(screen, tpl, cv2.TM_CCOEFF_NORMED)
+        _, full_val, _, full_loc = cv2.minMaxLoc(res)
+        t1 = time.perf_counter()
+        pyr_val, pyr_loc = pyramid_match(screen, tpl)
+        t2 = time.perf_counter()
+        t_full += t1 - t0
+        t_pyr += t2 - t1
+        pyramid_used += choose_factor(screen.shape, tpl.shape) > 1
+
+        same_pos = abs(full_loc[0] - pyr_loc[0]) <= tolerance_px and abs(full_loc[1] - pyr_loc[1]) <= tolerance_px
+        if same_pos and abs(full_val - pyr_val) < 1e-3:
+            agree += 1
+        else:
+            print(f"[pyramid] 不一致: full={full_loc}/{full_val:.4f} pyramid={pyr_loc}/{pyr_val:.4f} tpl={tw}x{th}")
+
+    report = {
+        "rounds": rounds,
+        "agree": agree,
+        "pyramid_used": pyramid_used,
+        "full_ms": t_full / rounds * 1000,
+        "pyramid_ms": t_pyr / rounds * 1000,
+    }
+    print(
+        f"[pyramid] 一致 {agree}/{rounds}（金字塔生效 {pyramid_used} 次），"
+        f"全量 {report['full_ms']:.1f}ms / 金字塔 {report['pyramid_ms']:.1f}ms"
+    )
+    return report
+
+
+__all__ = [
+    "PYRAMID_FACTORS",
+    "choose_factor",
+    "pyramid_match",
+    "verify_against_exhaustive",
+    "synthetic_screen",
+]
+
+
+if __name__ == "__main__":
+    verify_against_exhaustive(grayscale=True)
+    verify_against_exhaustive(grayscale=False)
@@ -0,0 +1,361 @@
+from __future__ import annotations
+
+"""
+    replay.py
+    - 功能：自动化流程的录制与离线回放
+    - 录制：包装当前截屏后端与输入处理器，把每一帧截屏、每一次点击/移动/等待
+            按时间戳写入会话文件；相同画面只存一份（按内容哈希去重，PNG 压缩）
+    - 回放：把录制的帧按顺序喂给 grab_screen，拦截点击并与录制结果逐一比对，
+            等待不真正阻塞，因此整个竞技场流程可以离线、快于实时地跑完并计时
+    - 会话文件（zip）：
+        index.json          元信息与事件列表
+        frames/<sha1>.png   去重后的帧
+    - 用法：
+        python -m tdsheep_auto_tool.src.replay record arena.tdsession
+        python -m tdsheep_auto_tool.src.replay replay arena.tdsession
+"""
+
+import argparse
+import hashlib
+import json
+import threading
+import time
+import zipfile
+from pathlib import Path
+from typing import Optional, Tuple, List, Dict, Any, Callable, Union
+
+import cv2
+import numpy as np
+
+from .calc_locate import InputHandler, get_input_handler, set_input_handler
+from .capture import CaptureBackend, get_capture_backend, set_capture_backend
+
+SESSION_VERSION = 1
+# PNG 压缩级别：录制时优先速度
+PNG_COMPRESSION = 1
+
+
+class ReplayExhausted(Exception):
+    """回放帧已用完（流程比录制时多截了屏）。"""
+
+
+class _RecordingBackend(CaptureBackend):
+    """包装真实后端，截屏结果原样返回并交给录制器。"""
+
+    name = "recording"
+
+    def __init__(self, inner: CaptureBackend, recorder: "SessionRecorder") -> None:
+        self.inner = inner
+        self.recorder = recorder
+
+    def grab(self, region=None, grayscale: bool = True) -> np.ndarray:
+        img = self.inner.grab(region=region, grayscale=grayscale)
+        self.recorder.add_frame(img, region, grayscale)
+        return img
+
+
+class _RecordingInput(InputHandler):
+    """包装真实输入处理器，执行前记录事件。"""
+
+    def __init__(self, inner: InputHandler, recorder: "SessionRecorder") -> None:
+        self.inner = inner
+        self.recorder = recorder
+
+    def click(self, x, y, clicks, interval, button, move_duration) -> None:
+        self.recorder.add_event({"type": "click", "x": x, "y": y, "clicks": clicks, "button": button})
+        self.inner.click(x, y, clicks, interval, button, move_duration)
+
+    def move(self, x, y, duration) -> None:
+        self.recorder.add_event({"type": "move", "x": x, "y": y})
+        self.inner.move(x, y, duration)
+
+    def sleep(self, seconds) -> None:
+        self.recorder.add_event({"type": "sleep", "seconds": float(seconds)})
+        self.inner.sleep(seconds)
+
+    def now(self) -> float:
+        return self.inner.now()
+
+    @property
+    def virtual_clock(self) -> bool:
+        return bool(self.inner.virtual_clock)
+
+
+class SessionRecorder:
+    """
+    录制会话。作为上下文管理器使用：进入时接管截屏后端与输入处理器，退出时恢复并写出索引。
+        with SessionRecorder("arena.tdsession"):
+            run_auto_arena()
+    """
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        self.path = Path(path)
+        self.events: List[Dict[str, Any]] = []
+        self._hashes: Dict[str, Tuple[int, ...]] = {}
+        self._zip: Optional[zipfile.ZipFile] = None
+        self._lock = threading.Lock()
+        self._t0 = 0.0
+        self._old_backend: Optional[CaptureBackend] = None
+        self._old_input: Optional[InputHandler] = None
+
+    def __enter__(self) -> "SessionRecorder":
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # 帧已是 PNG，zip 内不再压缩
+        self._zip = zipfile.ZipFile(self.path, "w", compression=zipfile.ZIP_STORED)
+        self._t0 = time.perf_counter()
+        self._old_backend = get_capture_backend()
+        set_capture_backend(_RecordingBackend(self._old_backend, self))
+        self._old_input = set_input_handler(_RecordingInput(get_input_handler(), self))
+        print(f"[record] 开始录制: {self.path}")
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        set_capture_backend(self._old_backend)
+        set_input_handler(self._old_input)
+        self.close()
+
+    def _now(self) -> float:
+        return round(time.perf_counter() - self._t0, 4)
+
+    def add_event(self, event: Dict[str, Any]) -> None:
+        with self._lock:
+            event["t"] = self._now()
+            self.events.append(event)
+
+    def add_frame(self, img: np.ndarray, region, grayscale: bool) -> None:
+        """记录一帧：按内容哈希去重，新帧以 PNG 写入会话文件。"""
+        h = hashlib.sha1(img.tobytes())
+        h.update(str(img.shape).encode("ascii"))
+        digest = h.hexdigest()
+        with self._lock:
+            if digest not in self._hashes:
+                ok, buf = cv2.imencode(".png", img, [cv2.IMWRITE_PNG_COMPRESSION, PNG_COMPRESSION])
+                if not ok:
+                    raise ValueError("帧 PNG 编码失败")
+                self._zip.writestr(f"frames/{digest}.png", buf.tobytes())
+                self._hashes[digest] = img.shape
+            self.events.append({
+                "t": self._now(),
+                "type": "frame",
+                "frame": digest,
+                "region": list(region) if region else None,
+                "grayscale": bool(grayscale),
+            })
+
+    def close(self) -> None:
+        if self._zip is None:
+            return
+        frames = sum(1 for e in self.events if e["type"] == "frame")
+        index = {
+            "version": SESSION_VERSION,
+            "duration": self._now(),
+            "unique_frames": len(self._hashes),
+            "events": self.events,
+        }
+        self._zip.writestr("index.json", json.dumps(index, ensure_ascii=False), compress_type=zipfile.ZIP_DEFLATED)
+        self._zip.close()
+        self._zip = None
+        print(f"[record] 录制结束: {frames} 次截屏（去重后 {len(self._hashes)} 帧），{len(self.events)} 个事件")
+
+
+def load_session(path: Union[str, Path]) -> Tuple[Dict[str, Any], zipfile.ZipFile]:
+    """读取会话索引，返回 (index, 打开的 zip)。"""
+    zf = zipfile.ZipFile(path, "r")
+    index = json.loads(zf.read("index.json").decode("utf-8"))
+    if int(index.get("version", 0)) != SESSION_VERSION:
+        zf.close()
+        raise ValueError(f"不支持的会话版本: {index.get('version')}")
+    return index, zf
+
+
+class _SessionBackend(CaptureBackend):
+    """按录制顺序提供帧。"""
+
+    name = "session"
+
+    def __init__(self, replay: "SessionReplay") -> None:
+        self.replay = replay
+
+    def grab(self, region=None, grayscale: bool = True) -> np.ndarray:
+        return self.replay.next_frame(region, grayscale)
+
+
+class _ReplayInput(InputHandler):
+    """拦截点击并与录制结果比对；等待只推进虚拟时钟。"""
+
+    virtual_clock = True
+
+    def __init__(self, replay: "SessionReplay") -> None:
+        self.replay = replay
+
+    def click(self, x, y, clicks, interval, button, move_duration) -> None:
+        self.replay.check_click(x, y, clicks, button)
+
+    def move(self, x, y, duration) -> None:
+        pass
+
+    def sleep(self, seconds) -> None:
+        self.replay.virtual_time += max(0.0, float(seconds))
+
+    def now(self) -> float:
+        return self.replay.virtual_time
+
+
+class SessionReplay:
+    """
+    离线回放一个录制会话。
+    - click_tolerance: 点击坐标允许的偏差（像素）
+    run(fn) 期间 grab_screen 依次返回录制帧，点击被拦截比对，等待不阻塞；
+    虚拟时钟由等待推进，取帧时追到该帧的录制时刻，点击时追到对应录制点击的时刻（落后的帧被跳过）；
+    异步运行时（runtime.py）的截屏间隔、
+    sleep 与超时都按虚拟时钟计算，并逐帧步进（每个等待者都处理完当前帧后才截取下一帧），
+    回放结果不受机器快慢影响。
+    """
+
+    def __init__(self, path: Union[str, Path], click_tolerance: int = 4) -> None:
+        self.path = Path(path)
+        self.click_tolerance = int(click_tolerance)
+        self.index, self._zip = load_session(self.path)
+        events = self.index["events"]
+        self.frames = [e for e in events if e["type"] == "frame"]
+        self.clicks = [e for e in events if e["type"] == "click"]
+        self._decoded: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+        self.frame_pos = 0
+        self.click_pos = 0
+        self.mismatches: List[Dict[str, Any]] = []
+        self.warnings: List[str] = []
+        self.virtual_time = 0.0
+
+    def _decode(self, digest: str) -> np.ndarray:
+        img = self._decoded.get(digest)
+        if img is None:
+            data = np.frombuffer(self._zip.read(f"frames/{digest}.png"), dtype=np.uint8)
+            img = cv2.imdecode(data, cv2.IMREAD_UNCHANGED)
+            if img is None:
+                raise ValueError(f"无法解码帧 {digest}")
+            self._decoded[digest] = img
+        return img
+
+    def next_frame(self, region, grayscale: bool) -> np.ndarray:
+        with self._lock:
+            if self.frame_pos >= len(self.frames):
+                raise ReplayExhausted(f"录制帧已用完（共 {len(self.frames)} 帧）")
+            # 虚拟时钟已越过的录制帧直接跳过（等待或点击同步之后），取到的帧不早于虚拟时钟；
+            # 之后虚拟时钟追到该帧的录制时刻，按时钟计算的超时与稳定判断消耗的帧数与录制时一致
+            j = self.frame_pos
+            while j + 1 < len(self.frames) and float(self.frames[j + 1].get("t", 0.0)) <= self.virtual_time:
+                j += 1
+            ev = self.frames[j]
+            self.frame_pos = j + 1
+            self.virtual_time = max(self.virtual_time, float(ev.get("t", 0.0)))
+        want_region = list(region) if region else None
+        if ev["region"] != want_region:
+            self.warnings.append(f"第 {self.frame_pos} 帧截屏区域不一致: 录制 {ev['region']} / 回放 {want_region}")
+        img = self._decode(ev["frame"])
+        # 录制与回放的颜色模式不同时做转换
+        if grayscale and img.ndim == 3:
+            return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        if not grayscale and img.ndim == 2:
+            return cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+        return img.copy()
+
+    def check_click(self, x: int, y: int, clicks: int, button: str) -> None:
+        with self._lock:
+            pos = self.click_pos
+            self.click_pos += 1
+        if pos >= len(self.clicks):
+            self.mismatches.append({"index": pos, "expected": None, "actual": [x, y]})
+            return
+        exp = self.clicks[pos]
+        with self._lock:
+            # 以录制的点击时刻同步虚拟时钟：点击之后取到的是录制中点击之后的画面，
+            # 之后的超时也从录制的点击时刻起算（可能比按帧推进的时钟略早）
+            self.virtual_time = float(exp.get("t", self.virtual_time))
+        tol = self.click_tolerance
+        if abs(exp["x"] - x) > tol or abs(exp["y"] - y) > tol or exp.get("button") != button or exp.get("clicks") != clicks:
+            self.mismatches.append({"index": pos, "expected": [exp["x"], exp["y"]], "actual": [x, y]})
+
+    def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Dict[str, Any]:
+        """在回放环境中执行 fn，返回计时与比对报告。"""
+        old_backend = get_capture_backend()
+        set_capture_backend(_SessionBackend(self))
+        old_input = set_input_handler(_ReplayInput(self))
+        exhausted = False
+        t0 = time.perf_counter()
+        try:
+            fn(*args, **kwargs)
+        except ReplayExhausted as e:
+            exhausted = True
+            print(f"[replay] {e}")
+        finally:
+            wall = time.perf_counter() - t0
+            set_capture_backend(old_backend)
+            set_input_handler(old_input)
+        missing = max(0, len(self.clicks) - self.click_pos)
+        recorded = float(self.index.get("duration", 0.0))
+        report = {
+            "frames_recorded": len(self.frames),
+            "frames_served": self.frame_pos,
+            "clicks_recorded": len(self.clicks),
+            "clicks_replayed": self.click_pos,
+            "click_mismatches": self.mismatches,
+            "clicks_missing": missing,
+            "exhausted": exhausted,
+            "warnings": self.warnings,
+            "recorded_sec": recorded,
+            "wall_sec": wall,
+            "virtual_sleep_sec": self.virtual_time,
+            "speedup": (recorded / wall) if wall > 0 else 0.0,
+            "ok": not self.mismatches and missing == 0,
+        }
+        print(
+            f"[replay] 帧 {self.frame_pos}/{len(self.frames)}，点击 {self.click_pos}/{len(self.clicks)}，"
+            f"不一致 {len(self.mismatches)}；录制 {recorded:.1f}s，回放 {wall:.2f}s（{report['speedup']:.1f}x）"
+        )
+        return report
+
+    def close(self) -> None:
+        self._zip.close()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="自动竞技场录制与回放")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    rec = sub.add_parser("record", help="录制一次真实运行")
+    rec.add_argument("session", type=str)
+    rep = sub.add_parser("replay", help="离线回放并计时")
+    rep.add_argument("session", type=str)
+    rep.add_argument("--tolerance", type=int, default=4, help="点击坐标允许偏差（像素）")
+    rep.add_argument("--report", type=str, default=None, help="把回放报告写入 JSON 文件")
+    args = parser.parse_args(argv)
+
+    from .auto_arena import run_auto_arena
+
+    if args.cmd == "record":
+        with SessionRecorder(args.session):
+            try:
+                run_auto_arena()
+            except KeyboardInterrupt:
+                print("\n[record] 用户终止")
+        return
+
+    replay = SessionReplay(args.session, click_tolerance=args.tolerance)
+    try:
+        report = replay.run(run_auto_arena)
+    finally:
+        replay.close()
+    if args.report:
+        Path(args.report).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+__all__ = [
+    "ReplayExhausted",
+    "SessionRecorder",
+    "SessionReplay",
+    "load_session",
+]
+
+
+if __name__ == "__main__":
+    main()
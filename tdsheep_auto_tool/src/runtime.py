@@ -0,0 +1,443 @@
+from __future__ import annotations
+
+"""
+    runtime.py
+    - 功能：基于 asyncio 的自动化运行时
+    - 共享截屏循环：有等待者时按固定间隔截屏，画面发生变化才唤醒等待者，
+      所有等待者共用同一帧，截屏与匹配在线程中执行，不阻塞事件循环
+    - 原语：
+        await rt.wait_for(stem, timeout)        等待模板出现，返回 (match, scale)
+        await rt.wait_any([stems], timeout)     等待任一模板出现，返回 (stem, match, scale)
+        await rt.wait_targets(targets, timeout) 同上，但每个目标可指定目录与灰度，返回 (下标, match, scale)
+        await rt.click(stem, timeout)           等待模板出现并点击中心
+        await rt.wait_settled(stems, timeout)   等待模板出现或画面停止变化，返回 (结果, 耗时)
+        await rt.sleep(sec) / rt.click_at(x, y) / rt.move(x, y) / rt.run_blocking(fn, ...)
+      超时返回空结果而非抛异常；任务被取消时等待立即结束
+    - 时钟：截屏间隔、sleep、超时与画面稳定判断都经由输入处理器的时钟（calc_locate.clock_now / sleep）；
+      离线回放（虚拟时钟）时截屏循环逐帧步进：全部等待者处理完当前帧后才截取下一帧，
+      每帧推进一个截屏间隔的虚拟时间（回放时另追到该帧的录制时刻），因此回放既快于实时又与机器速度无关
+    - 截屏区域：未显式指定 region 时每次截屏重新读取会话级窗口区域，命中/未命中计入窗口区域的失效判断
+    - 画面缓冲区：未变化的截屏立即归还缓冲池；被替换的画面等到没有进行中的匹配时再归还
+    - 用法：
+        async with AutomationRuntime(folder="auto_arena") as rt:
+            if await rt.click("1_1"):
+                ...
+"""
+
+import asyncio
+import functools
+from pathlib import Path
+from typing import Optional, Tuple, List, Dict, Any, Callable, Sequence, Union
+
+import cv2
+import numpy as np
+
+from .buffers import take_buffer
+from .calc_locate import grab_screen, click_point, move_pointer, sleep, clock_now, is_virtual_clock
+from .capture import release_frame
+from .instance import bind_instance, current_instance
+from .match import get_window_region, locate_many
+from .metrics import span
+from .settle import (
+    STABLE_SEC,
+    OUTCOME_PRESENT,
+    OUTCOME_STABLE,
+    OUTCOME_TIMEOUT,
+    screen_thumbnail,
+    thumbnails_differ,
+    get_latency_tracker,
+)
+
+# 共享截屏循环的间隔（秒）
+CAPTURE_INTERVAL_SEC: float = 0.1
+
+MatchResult = Tuple[Optional[Dict[str, Any]], Optional[int]]
+# 等待目标：(模板目录, 文件名主干, 是否灰度匹配)
+WaitTarget = Tuple[Union[str, Path], str, bool]
+
+
+class AutomationRuntime:
+    """
+    asyncio 自动化运行时。
+    - folder: 默认模板目录（assets 子目录名或路径），各原语可单独覆盖
+    - region: 截屏区域；None 时每次截屏使用当前的会话级窗口区域（未检测窗口则为全屏）
+    - interval: 截屏间隔
+    需在 async with 中使用；多窗口运行时继承创建时线程绑定的窗口实例。
+    """
+
+    def __init__(
+        self,
+        folder: Union[str, Path] = "auto_arena",
+        region: Optional[Tuple[int, int, int, int]] = None,
+        interval: float = CAPTURE_INTERVAL_SEC,
+        confidence: float = 0.7,
+    ) -> None:
+        self.folder = folder
+        self.region = region
+        self._frame_region: Optional[Tuple[int, int, int, int]] = region  # 当前画面对应的区域
+        self.interval = float(interval)
+        self.confidence = float(confidence)
+        self._inst = current_instance()
+        self._frame: Optional[np.ndarray] = None
+        self._gray: Optional[np.ndarray] = None
+        self._thumb: Optional[np.ndarray] = None
+        self._version = 0    # 画面变化次数
+        self._changed_at = 0.0  # 最近一次画面变化的时间（运行时时钟）
+        self._captures = 0   # 截屏次数
+        self._error: Optional[BaseException] = None
+        self._waiters = 0
+        self._idle = 0       # 正在等待下一帧的等待者数量（虚拟时钟下的逐帧步进）
+        self._matching = 0   # 进行中的匹配数量；期间被替换的画面暂存于 _stale
+        self._stale: List[np.ndarray] = []
+        self._cond: Optional[asyncio.Condition] = None
+        self._demand: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> "AutomationRuntime":
+        self._cond = asyncio.Condition()
+        self._demand = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._capture_loop())
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+        self._retire(self._frame, self._gray)
+        self._frame = self._gray = None
+
+    def _retire(self, *frames: Optional[np.ndarray]) -> None:
+        """画面不再是当前帧：没有进行中的匹配时连同暂存的旧画面一起归还缓冲池，否则先暂存。"""
+        self._stale.extend(f for f in frames if f is not None)
+        if self._matching == 0:
+            for f in self._stale:
+                release_frame(f)
+            self._stale.clear()
+
+    # 功能：在线程中执行阻塞函数（截屏、匹配、鼠标），保持窗口实例绑定。
+    async def run_blocking(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        inst = self._inst
+
+        def call() -> Any:
+            with bind_instance(inst):
+                return fn(*args, **kwargs)
+
+        return await asyncio.get_running_loop().run_in_executor(None, call)
+
+    def now(self) -> float:
+        """运行时时钟（秒）；离线回放时为虚拟时钟。"""
+        return clock_now()
+
+    async def _pause(self, seconds: float) -> None:
+        """按运行时时钟等待：实时时钟用 asyncio.sleep；虚拟时钟只推进时间并让出事件循环。"""
+        if is_virtual_clock():
+            sleep(seconds)
+            await asyncio.sleep(0)
+        else:
+            await asyncio.sleep(max(0.0, seconds))
+
+    def _changed(self, frame: np.ndarray) -> Tuple[bool, np.ndarray]:
+        thumb = screen_thumbnail(frame)
+        return thumbnails_differ(self._thumb, thumb), thumb
+
+    def _grab(self) -> Tuple[np.ndarray, Optional[Tuple[int, int, int, int]]]:
+        """截取一帧，返回 (画面, 区域)；未显式指定区域时取当前的窗口区域。"""
+        region = self.region if self.region is not None else get_window_region()
+        return grab_screen(region, False), region
+
+    async def _capture_loop(self) -> None:
+        """有等待者时持续截屏；画面变化时递增版本号，每次截屏都通知等待者。"""
+        while True:
+            await self._demand.wait()
+            if is_virtual_clock():
+                # 逐帧步进：全部等待者都在等下一帧时才截屏
+                async with self._cond:
+                    await self._cond.wait_for(lambda: 0 < self._waiters <= self._idle)
+            try:
+                frame, region = await self.run_blocking(self._grab)
+                changed, thumb = self._changed(frame)
+            except Exception as e:
+                # 截屏失败（例如回放帧耗尽）传递给全部等待者
+                self._error = e
+                async with self._cond:
+                    self._cond.notify_all()
+                return
+            self._captures += 1
+            if changed or region != self._frame_region:
+                self._retire(self._frame, self._gray)
+                self._frame, self._gray, self._thumb = frame, None, thumb
+                self._frame_region = region
+                self._version += 1
+                self._changed_at = self.now()
+            else:
+                self._retire(frame)
+            async with self._cond:
+                self._cond.notify_all()
+            await self._pause(self.interval)
+
+    def _frame_for(self, grayscale: bool) -> np.ndarray:
+        if not grayscale:
+            return self._frame
+        if self._gray is None:
+            self._gray = cv2.cvtColor(self._frame, cv2.COLOR_BGR2GRAY, dst=take_buffer(self._frame.shape[:2]))
+        return self._gray
+
+    async def _wait_capture(self, ready: Callable[[], bool]) -> None:
+        """等到 ready() 成立（或截屏失败）；等待期间计为空闲，虚拟时钟下截屏循环据此步进。"""
+        async with self._cond:
+            self._idle += 1
+            self._cond.notify_all()
+            try:
+                await self._cond.wait_for(lambda: self._error is not None or ready())
+            finally:
+                self._idle -= 1
+        if self._error is not None:
+            raise self._error
+
+    async def _next_frame(self, min_captures: int, after_version: int) -> int:
+        """等到截屏次数超过 min_captures 且画面版本新于 after_version，返回当前版本。"""
+        await self._wait_capture(lambda: self._captures > min_captures and self._version > after_version)
+        return self._version
+
+    def _expired(self, deadline: Optional[float]) -> bool:
+        return deadline is not None and self.now() >= deadline
+
+    async def _bounded(self, poll: Callable[[], Any], timeout: Optional[float]) -> Any:
+        """
+        在 timeout 秒内运行 poll()，超时抛 asyncio.TimeoutError。
+        poll 每帧按运行时时钟检查截止时间（虚拟时钟下只有这一种超时）；
+        实时时钟另以 asyncio.wait_for 兜底，截屏停滞时也能按时返回。
+        """
+        if timeout is None or is_virtual_clock():
+            return await poll()
+        return await asyncio.wait_for(poll(), max(0.0, timeout))
+
+    def _enter_wait(self) -> None:
+        self._waiters += 1
+        self._demand.set()
+
+    async def _leave_wait(self) -> None:
+        self._waiters -= 1
+        if self._waiters == 0:
+            self._demand.clear()
+        async with self._cond:
+            # 虚拟时钟下剩余等待者可能都已空闲，唤醒截屏循环重新判断
+            self._cond.notify_all()
+
+    # 功能：等待任一目标出现；同一帧上的全部目标按灰度分组批量匹配。
+    async def wait_targets(
+        self,
+        targets: Sequence[WaitTarget],
+        timeout: Optional[float] = None,
+        confidence: Optional[float] = None,
+    ) -> Tuple[Optional[int], Optional[Dict[str, Any]], Optional[int]]:
+        """
+        等待 targets 中任一目标出现，返回 (下标, match, scale)；多个同时出现时下标小者优先。
+        - timeout: None 表示一直等待；0 表示只检查一次最新画面
+        首次检查使用调用之后截取的画面，之后只在画面变化时重新匹配。
+        超时返回 (None, None, None)。
+        """
+        conf = self.confidence if confidence is None else confidence
+        deadline = self.now() + timeout if timeout else None
+
+        async def _poll() -> Tuple[Optional[int], Optional[Dict[str, Any]], Optional[int]]:
+            version = await self._next_frame(self._captures, 0)
+            while True:
+                best = await self._match_targets(targets, conf)
+                if best is not None:
+                    return best
+                if timeout == 0 or self._expired(deadline):
+                    return None, None, None
+                # 每次截屏都醒来检查截止时间：画面不变时虚拟时钟也在推进
+                await self._wait_capture(lambda: self._version > version or self._expired(deadline))
+                if self._expired(deadline):
+                    # 截止之后截取的画面不再计入，与实时时钟下 wait_for 的取消时机一致
+                    return None, None, None
+                version = self._version
+
+        self._enter_wait()
+        try:
+            with span("runtime_wait", target=",".join(f"{Path(f).name}/{s}" for f, s, _ in targets)):
+                return await self._bounded(_poll, timeout or None)
+        except asyncio.TimeoutError:
+            return None, None, None
+        finally:
+            await self._leave_wait()
+
+    async def _match_targets(
+        self,
+        targets: Sequence[WaitTarget],
+        conf: float,
+    ) -> Optional[Tuple[int, Dict[str, Any], Optional[int]]]:
+        """在当前画面上按灰度分组批量匹配全部目标，返回下标最小的命中 (下标, match, scale)。"""
+        groups: Dict[bool, List[int]] = {}
+        for i, (_, _, gray) in enumerate(targets):
+            groups.setdefault(bool(gray), []).append(i)
+        best: Optional[Tuple[int, Dict[str, Any], Optional[int]]] = None
+        # 整个分组匹配期间计为进行中的匹配：各组画面都在开头取好，
+        # 前一组匹配结束时，后一组的画面即使已被截屏循环替换也不能归还
+        self._matching += 1
+        try:
+            # 先取好各组要用的画面，匹配期间截屏循环更新的新帧留给下一轮
+            frames = {gray: self._frame_for(gray) for gray in groups}
+            region = self._frame_region
+            for gray, idxs in groups.items():
+                specs = [(targets[i][0], targets[i][1], None) for i in idxs]
+                found = await self._locate(
+                    specs, frame=frames[gray], confidence=conf,
+                    grayscale=gray, region=region, stop_on_hit=True,
+                    windowed=self.region is None,
+                )
+                for i in idxs:
+                    folder, stem, _ = targets[i]
+                    m, s = found.get((Path(folder).name, stem), (None, None))
+                    if m is not None and (best is None or i < best[0]):
+                        best = (i, m, s)
+        finally:
+            self._matching -= 1
+            self._retire()
+        return best
+
+    async def _locate(self, *args: Any, **kwargs: Any) -> Any:
+        """
+        在线程中执行 locate_many。匹配线程结束前计为进行中的匹配：
+        等待被取消时线程仍在使用画面，被替换的画面要等它结束才归还。
+        """
+        self._matching += 1
+        fut = asyncio.ensure_future(self.run_blocking(locate_many, *args, **kwargs))
+        fut.add_done_callback(self._locate_done)
+        return await asyncio.shield(fut)
+
+    def _locate_done(self, fut: "asyncio.Future[Any]") -> None:
+        self._matching -= 1
+        if not fut.cancelled():
+            fut.exception()  # 等待方已取消时由这里取走异常，避免未处理异常的警告
+        self._retire()
+
+    # 功能：等待目标出现或画面稳定，替代固定时长的 sleep。
+    async def wait_settled(
+        self,
+        stems: Sequence[str] = (),
+        timeout: float = 3.0,
+        stable_sec: Optional[float] = STABLE_SEC,
+        folder: Optional[Union[str, Path]] = None,
+        confidence: Optional[float] = None,
+        grayscale: bool = True,
+        key: Optional[str] = None,
+    ) -> Tuple[str, float]:
+        """
+        等到 stems 中任一模板出现（"present"）、画面连续 stable_sec 秒无变化（"stable"），
+        或超过 timeout（"timeout"），返回 (结果, 耗时)。
+        模板只在画面变化（含调用后的首帧）时重新匹配；key 非空时耗时计入 LatencyTracker。
+        """
+        conf = self.confidence if confidence is None else confidence
+        folder = self.folder if folder is None else folder
+        targets = [(folder, stem, grayscale) for stem in stems]
+        t0 = self.now()
+        deadline = t0 + max(0.0, timeout)
+
+        async def _poll() -> str:
+            version = await self._next_frame(self._captures, 0)
+            checked = -1
+            while True:
+                if targets and version != checked:
+                    checked = version
+                    if await self._match_targets(targets, conf) is not None:
+                        return OUTCOME_PRESENT
+                if stable_sec is not None and self.now() - max(t0, self._changed_at) >= stable_sec:
+                    return OUTCOME_STABLE
+                if self._expired(deadline):
+                    raise asyncio.TimeoutError
+                captures = self._captures
+                await self._wait_capture(lambda: self._captures > captures)
+                version = self._version
+
+        self._enter_wait()
+        try:
+            with span("runtime_settle", key=key or ""):
+                outcome = await self._bounded(_poll, timeout)
+        except asyncio.TimeoutError:
+            outcome = OUTCOME_TIMEOUT
+        finally:
+            await self._leave_wait()
+        elapsed = self.now() - t0
+        if key:
+            get_latency_tracker().record(key, elapsed, outcome)
+        return outcome, elapsed
+
+    async def wait_any(
+        self,
+        stems: Sequence[str],
+        timeout: Optional[float] = None,
+        folder: Optional[Union[str, Path]] = None,
+        confidence: Optional[float] = None,
+        grayscale: bool = True,
+    ) -> Tuple[Optional[str], Optional[Dict[str, Any]], Optional[int]]:
+        """等待 stems 中任一模板出现，返回 (stem, match, scale)；多个同时出现时按 stems 顺序优先。"""
+        folder = self.folder if folder is None else folder
+        i, m, s = await self.wait_targets([(folder, stem, grayscale) for stem in stems], timeout, confidence)
+        return (stems[i] if i is not None else None), m, s
+
+    async def wait_for(
+        self,
+        stem: str,
+        timeout: Optional[float] = None,
+        folder: Optional[Union[str, Path]] = None,
+        confidence: Optional[float] = None,
+        grayscale: bool = True,
+    ) -> MatchResult:
+        """等待单个模板出现，返回 (match, scale)；超时返回 (None, None)。"""
+        _, m, s = await self.wait_any([stem], timeout, folder, confidence, grayscale)
+        return m, s
+
+    async def click(
+        self,
+        stem: str,
+        timeout: Optional[float] = 0,
+        folder: Optional[Union[str, Path]] = None,
+        confidence: Optional[float] = None,
+        grayscale: bool = True,
+        move_duration: float = 0.05,
+    ) -> bool:
+        """等待模板出现并点击命中中心；timeout 默认只检查一次。返回是否点击。"""
+        m, s = await self.wait_for(stem, timeout, folder, confidence, grayscale)
+        if m is None:
+            return False
+        cx, cy = m["center"]
+        print(f"[runtime] 点击 {stem} (scale={s})")
+        await self.click_at(cx, cy, move_duration=move_duration)
+        return True
+
+    async def click_at(self, x: int, y: int, move_duration: float = 0.0) -> None:
+        await self.run_blocking(functools.partial(click_point, x, y, move_duration=move_duration))
+
+    async def move(self, x: int, y: int) -> None:
+        await self.run_blocking(move_pointer, x, y)
+
+    async def sleep(self, seconds: float) -> None:
+        await self._pause(seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"captures": self._captures, "changes": self._version}
+
+
+def run_task(task: Callable[[AutomationRuntime], Any], **runtime_kwargs: Any) -> Any:
+    """在新的事件循环中运行 task(rt)；Ctrl+C 会取消任务并正常退出运行时。"""
+
+    async def _main() -> Any:
+        async with AutomationRuntime(**runtime_kwargs) as rt:
+            return await task(rt)
+
+    return asyncio.run(_main())
+
+
+__all__ = [
+    "CAPTURE_INTERVAL_SEC",
+    "WaitTarget",
+    "AutomationRuntime",
+    "run_task",
+]
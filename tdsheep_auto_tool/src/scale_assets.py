@@ -2,28 +2,56 @@ from __future__ import annotations
 
 """
 scale_assets.py
-- 功能：为 a_1 到 a_6 基础图片批量生成不同缩放比例的 PNG 文件
+- 功能：为各素材目录下的基础图片批量生成不同缩放比例的 PNG 文件
 - 质量：使用 OpenCV 的 Lanczos4（高质量）重采样
-- 路径：读取与写入目录为 tdsheep_auto_tool/assets/a
-- 命名：a_{i}_{scale}.png（示例：a_1_80.png 表示 80%）
+- 路径：读取与写入目录为 tdsheep_auto_tool/assets 下的 TARGET_DIRS
+- 命名：{stem}_{scale}.png（示例：a_1_80.png 表示 80%）
+- 增量：assets/scale_manifest.json 记录每张原图及其各比例输出的 SHA-256，
+        只重新生成新增/变化的原图，以及缺失或被改动的输出；
+        没有清单记录的已有输出会与重新缩放的结果逐像素比对，一致则直接记入清单
+- 并行：各原图的处理分发到进程池
 
 用法：
-1) 将 6 张基础图片命名为 a_1.png ... a_6.png，放置在 assets/a/
+1) 将基础图片（如 a_1.png）放置在 assets 对应目录下
 2) 在项目根目录运行：python -m tdsheep_auto_tool.src.scale_assets
-3) 输出文件将生成在 assets/a/ 下
+   --check    只检查素材是否最新，不写任何文件（不一致时退出码为 1）
+   --force    忽略清单，全部重新生成
+   --workers  进程数（默认按 CPU 核数）
+3) 有输出变化时重新生成模板包 assets/templates.pack
 """
 
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List
+from typing import Optional, List, Dict, Any
 import cv2
 import numpy as np
 
 # 复用 match.py 的 assets 目录获取逻辑（保持一致）
 from .match import get_assets_dir
+from .template_pack import PACK_FILENAME, build_pack
+from .template_scaler import resize_lanczos
 
 # 按需求生成的缩放档
 SCALES: List[int] = [50, 65, 67, 75, 80, 90, 100, 110, 125]
 
+# 需要处理的子文件夹列表
+TARGET_DIRS: List[str] = [
+    "a",
+    "page_home",
+    "page_frontline",
+    "page_defenseline",
+    "page_wolfpack",
+    "auto_arena",
+]
+
+MANIFEST_FILENAME = "scale_manifest.json"
+MANIFEST_VERSION = 1
+
 
 def _read_image_unicode(path: Path) -> np.ndarray:
     """以保留透明通道的方式读取图片，兼容中文路径。"""
@@ -46,11 +74,8 @@ def _write_png_unicode(path: Path, img: np.ndarray) -> None:
 
 
 def _resize_lanczos(img: np.ndarray, scale_percent: int) -> np.ndarray:
-    """使用 Lanczos4 高质量缩放（保持宽高比、保留通道）。"""
-    h, w = img.shape[:2]
-    new_w = max(1, int(round(w * scale_percent / 100.0)))
-    new_h = max(1, int(round(h * scale_percent / 100.0)))
-    return cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_LANCZOS4)
+    """使用 Lanczos4 高质量缩放（与运行时按需合成的比例模板共用同一实现）。"""
+    return resize_lanczos(img, scale_percent)
 
 
 def generate_scaled_variants(base_path: Path, scales: List[int]) -> None:
@@ -69,45 +94,216 @@ def generate_scaled_variants(base_path: Path, scales: List[int]) -> None:
         print(f"[gen] {out_path.name} ({scaled.shape[1]}x{scaled.shape[0]})")
 
 
-def process_directory(dir_path: Path, scales: List[int]) -> None:
-    """递归处理目录下的所有 PNG 图片（跳过已生成的缩放版本）。"""
-    if not dir_path.exists():
-        print(f"[skip] 目录不存在: {dir_path}")
-        return
+def _sha256(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
 
-    # 获取所有 png 文件
-    for file_path in dir_path.glob("*.png"):
-        # 跳过文件名中包含 _数字.png 的文件（认为是已生成的缩放图）
-        # 简单判断：检查最后一部分是否为 _数字
-        stem = file_path.stem
-        parts = stem.split('_')
-        if len(parts) > 1 and parts[-1].isdigit() and int(parts[-1]) in scales:
-            continue
-        
-        print(f"[proc] 处理原图: {file_path.name}")
-        generate_scaled_variants(file_path, scales)
-
-def main() -> None:
-    print("[scale] 开始批量生成多尺度图片...")
-    assets_dir = get_assets_dir()
-    
-    # 需要处理的子文件夹列表
-    target_dirs = [
-        "a", 
-        "page_home", 
-        "page_frontline", 
-        "page_defenseline", 
-        "page_wolfpack",
-        "auto_arena"
-    ]
-    
-    for d in target_dirs:
+
+def _is_variant(path: Path, scales: List[int]) -> bool:
+    """文件名以 _{比例} 结尾的视为已生成的缩放图。"""
+    parts = path.stem.split('_')
+    return len(parts) > 1 and parts[-1].isdigit() and int(parts[-1]) in scales
+
+
+def find_sources(assets_dir: Path, scales: List[int] = SCALES) -> List[Path]:
+    """列出 TARGET_DIRS 下全部基础图片（跳过已生成的缩放版本）。"""
+    sources: List[Path] = []
+    for d in TARGET_DIRS:
         p = assets_dir / d
-        print(f"\n--- Scanning {d} ---")
-        process_directory(p, SCALES)
-        
+        if not p.exists():
+            print(f"[skip] 目录不存在: {p}")
+            continue
+        sources.extend(f for f in sorted(p.glob("*.png")) if not _is_variant(f, scales))
+    return sources
+
+
+def get_manifest_path(assets_dir: Path) -> Path:
+    return assets_dir / MANIFEST_FILENAME
+
+
+def load_manifest(assets_dir: Path, scales: List[int] = SCALES) -> Dict[str, Any]:
+    """读取清单；不存在、无法解析或比例列表不同时返回空清单。"""
+    empty = {"version": MANIFEST_VERSION, "scales": list(scales), "sources": {}}
+    path = get_manifest_path(assets_dir)
+    if not path.exists():
+        return empty
+    try:
+        with path.open("r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception as e:
+        print(f"[manifest] 读取清单失败，视为全部待检查: {e}")
+        return empty
+    if data.get("version") != MANIFEST_VERSION or data.get("scales") != list(scales):
+        print("[manifest] 清单版本或比例列表已变化，视为全部待检查")
+        return empty
+    data.setdefault("sources", {})
+    return data
+
+
+def save_manifest(assets_dir: Path, manifest: Dict[str, Any]) -> None:
+    path = get_manifest_path(assets_dir)
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write("\n")
+    os.replace(tmp, path)
+
+
+# 功能：处理单张原图（在进程池中执行），返回其清单记录与变化情况。
+def process_source(
+    src: str,
+    rel: str,
+    scales: List[int],
+    record: Optional[Dict[str, Any]],
+    check_only: bool = False,
+) -> Dict[str, Any]:
+    """
+    - record: 清单中该原图的上次记录；None 表示没有记录
+    - check_only: 只判断不写文件
+    返回 {"rel", "record", "stale": [比例...], "written": [比例...], "adopted": 数量, "error"}。
+    """
+    result: Dict[str, Any] = {"rel": rel, "record": None, "stale": [], "written": [], "adopted": 0, "error": None}
+    src_path = Path(src)
+    try:
+        src_hash = _sha256(src_path)
+        same_source = record is not None and record.get("sha256") == src_hash
+        old_outputs = record.get("outputs", {}) if same_source else {}
+        outputs: Dict[str, str] = {}
+        img: Optional[np.ndarray] = None
+        for s in scales:
+            out_path = src_path.parent / f"{src_path.stem}_{s}.png"
+            out_hash = _sha256(out_path) if out_path.exists() else None
+            if out_hash is not None and old_outputs.get(str(s)) == out_hash:
+                outputs[str(s)] = out_hash
+                continue
+            if img is None:
+                img = _read_image_unicode(src_path)
+            scaled = _resize_lanczos(img, s)
+            if out_hash is not None and record is None:
+                # 没有清单记录：已有输出与重新缩放结果一致则直接采用
+                existing = _read_image_unicode(out_path)
+                if existing.shape == scaled.shape and np.array_equal(existing, scaled):
+                    outputs[str(s)] = out_hash
+                    result["adopted"] += 1
+                    continue
+            result["stale"].append(s)
+            if check_only:
+                continue
+            _write_png_unicode(out_path, scaled)
+            outputs[str(s)] = _sha256(out_path)
+            result["written"].append(s)
+        result["record"] = {"sha256": src_hash, "outputs": outputs}
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    return result
+
+
+# 功能：增量生成全部素材的多比例版本。
+def build_assets(
+    assets_dir: Optional[Path] = None,
+    scales: List[int] = SCALES,
+    check_only: bool = False,
+    force: bool = False,
+    workers: int = 0,
+) -> Dict[str, Any]:
+    """
+    返回 {"sources", "stale", "written", "adopted", "errors", "orphans", "elapsed_sec", "up_to_date"}。
+    check_only 时不写任何文件；force 时忽略清单记录全部重新生成。
+    """
+    t0 = time.perf_counter()
+    assets_dir = Path(assets_dir) if assets_dir else get_assets_dir()
+    manifest = load_manifest(assets_dir, scales)
+    old_records: Dict[str, Any] = manifest["sources"]
+    sources = find_sources(assets_dir, scales)
+    jobs = [(str(src), src.relative_to(assets_dir).as_posix()) for src in sources]
+
+    workers = workers if workers > 0 else (os.cpu_count() or 1)
+    if force:
+        # 强制重建：伪造不匹配的记录，使已有输出也不会被直接采用
+        old_records = {rel: {"sha256": "", "outputs": {}} for _, rel in jobs}
+    args = [(src, rel, list(scales), old_records.get(rel), check_only) for src, rel in jobs]
+    if workers <= 1 or len(args) <= 1:
+        results = [process_source(*a) for a in args]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(args))) as pool:
+            futures = [pool.submit(process_source, *a) for a in args]
+            results = [f.result() for f in futures]
+
+    report: Dict[str, Any] = {
+        "sources": len(sources),
+        "stale": {},
+        "written": 0,
+        "adopted": 0,
+        "errors": {},
+        "orphans": sorted(set(manifest["sources"]) - {rel for _, rel in jobs}),
+    }
+    new_records: Dict[str, Any] = {}
+    for r in results:
+        if r["error"]:
+            report["errors"][r["rel"]] = r["error"]
+            print(f"[skip] {r['rel']}: {r['error']}")
+            if r["rel"] in manifest["sources"]:
+                new_records[r["rel"]] = manifest["sources"][r["rel"]]
+            continue
+        new_records[r["rel"]] = r["record"]
+        report["adopted"] += r["adopted"]
+        report["written"] += len(r["written"])
+        if r["stale"]:
+            report["stale"][r["rel"]] = r["stale"]
+            verb = "需要更新" if check_only else "已生成"
+            print(f"[gen] {r['rel']} {verb}比例: {', '.join(f'{s}%' for s in r['stale'])}")
+
+    # 生成模式下输出已全部更新，只要没有出错即为最新
+    up_to_date = not report["errors"] and (not report["stale"] or not check_only)
+    for rel in report["orphans"]:
+        print(f"[manifest] 原图已不存在（保留其缩放输出，请手动清理）: {rel}")
+    manifest_changed = new_records != manifest["sources"]
+    if check_only:
+        if manifest_changed and up_to_date:
+            print("[manifest] 素材与原图一致，但清单尚未记录全部文件（运行一次生成即可写入）")
+    elif manifest_changed or force:
+        manifest["sources"] = new_records
+        save_manifest(assets_dir, manifest)
+
+    if not check_only and (report["written"] or not (assets_dir / PACK_FILENAME).exists()):
+        # 素材有变化，重新生成模板包
+        build_pack(assets_dir)
+
+    report["up_to_date"] = up_to_date
+    report["elapsed_sec"] = time.perf_counter() - t0
+    print(
+        f"[scale] 原图 {report['sources']} 张，"
+        f"{'待更新' if check_only else '重新生成'}输出 {sum(len(v) for v in report['stale'].values())} 个，"
+        f"按内容采用已有输出 {report['adopted']} 个，耗时 {report['elapsed_sec']:.2f}s（{workers} 进程）"
+    )
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="批量生成多尺度素材（增量）")
+    parser.add_argument("--check", action="store_true", help="只检查素材是否最新，不写文件")
+    parser.add_argument("--force", action="store_true", help="忽略清单，全部重新生成")
+    parser.add_argument("--workers", type=int, default=0, help="进程数，0 表示按 CPU 核数")
+    args = parser.parse_args(argv)
+
+    print("[scale] 开始" + ("检查" if args.check else "增量生成") + "多尺度图片...")
+    report = build_assets(check_only=args.check, force=args.force, workers=args.workers)
+    if args.check:
+        print("[done] 素材已是最新" if report["up_to_date"] else "[done] 素材需要更新")
+        return 0 if report["up_to_date"] else 1
     print("\n[done] 所有任务完成")
+    return 0 if not report["errors"] else 1
+
+
+__all__ = [
+    "SCALES",
+    "TARGET_DIRS",
+    "find_sources",
+    "load_manifest",
+    "process_source",
+    "build_assets",
+    "generate_scaled_variants",
+]
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    raise SystemExit(main())
@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+"""
+    scale_estimate.py
+    - 功能：把离散比例的检测结果细化为小数比例（例如 72.4%）
+    - 思路：锚点在离散比例 s0 命中后，真实比例位于 s0 相邻的两个离散比例之间；
+            在该区间内以黄金分割搜索最大化各锚点的匹配分数（只在命中框附近的小块区域内匹配），
+            模板由基础图片按试探比例用 Lanczos 合成
+    - 结果写入比例状态的 recommended_scale，之后的模板合成、窗口尺寸与点击偏移都按该比例计算
+"""
+
+import argparse
+import math
+import time
+from pathlib import Path
+from typing import Optional, Tuple, List, Dict, Any, Callable, Sequence
+
+import cv2
+import numpy as np
+
+from .calc_locate import load_template
+from .template_scaler import resize_lanczos, MIN_SCALE, MAX_SCALE
+
+# 收敛精度（百分比）
+SCALE_TOLERANCE: float = 0.1
+# 细化区间的默认半宽（相邻离散比例缺失时使用，百分比）
+DEFAULT_BRACKET: float = 8.0
+# 命中框外扩的搜索余量（按模板尺寸的比例，另加固定像素）
+ROI_MARGIN_RATIO: float = 0.25
+ROI_MARGIN_PX: int = 6
+
+_GOLDEN = (math.sqrt(5) - 1) / 2
+
+
+def bracket_scale(coarse: float, scales: Sequence[int]) -> Tuple[float, float]:
+    """离散比例 coarse 两侧相邻的离散比例作为搜索区间；没有相邻比例时取 ±DEFAULT_BRACKET。"""
+    lower = [s for s in scales if s < coarse]
+    upper = [s for s in scales if s > coarse]
+    lo = max(lower) if lower else coarse - DEFAULT_BRACKET
+    hi = min(upper) if upper else coarse + DEFAULT_BRACKET
+    return max(float(MIN_SCALE), float(lo)), min(float(MAX_SCALE), float(hi))
+
+
+# 功能：黄金分割搜索单峰函数在区间内的最大值。
+def golden_section_max(
+    f: Callable[[float], float],
+    lo: float,
+    hi: float,
+    tol: float = SCALE_TOLERANCE,
+) -> Tuple[float, float]:
+    """返回 (x, f(x))；每轮只新增一次函数求值。"""
+    a, b = lo, hi
+    c = b - _GOLDEN * (b - a)
+    d = a + _GOLDEN * (b - a)
+    fc, fd = f(c), f(d)
+    while b - a > tol:
+        if fc >= fd:
+            b, d, fd = d, c, fc
+            c = b - _GOLDEN * (b - a)
+            fc = f(c)
+        else:
+            a, c, fc = c, d, fd
+            d = a + _GOLDEN * (b - a)
+            fd = f(d)
+    return (c, fc) if fc >= fd else (d, fd)
+
+
+class AnchorScorer:
+    """
+    对一组已命中的锚点，计算任意比例下的平均匹配分数。
+    - frame: 命中时使用的画面
+    - anchors: [(基础模板路径, 命中结果)]，命中结果为 match 字典（left/top/width/height 为屏幕坐标）
+    - region: frame 对应的屏幕区域；None 表示全屏
+    """
+
+    def __init__(
+        self,
+        frame: np.ndarray,
+        anchors: List[Tuple[Path, Dict[str, Any]]],
+        grayscale: bool = True,
+        region: Optional[Tuple[int, int, int, int]] = None,
+        max_scale: float = MAX_SCALE,
+    ) -> None:
+        self.frame = frame
+        self.grayscale = grayscale
+        self.evaluations = 0
+        ox, oy = (region[0], region[1]) if region else (0, 0)
+        fh, fw = frame.shape[:2]
+        self._items: List[Tuple[np.ndarray, np.ndarray]] = []
+        for base_path, m in anchors:
+            base = load_template(str(base_path), False)
+            # 搜索区域需容纳区间内最大比例的模板
+            bh, bw = base.shape[:2]
+            grow = max_scale / 100.0
+            mx = int(bw * grow * ROI_MARGIN_RATIO) + ROI_MARGIN_PX + max(0, int(bw * grow) - int(m["width"]))
+            my = int(bh * grow * ROI_MARGIN_RATIO) + ROI_MARGIN_PX + max(0, int(bh * grow) - int(m["height"]))
+            x0 = max(0, int(m["left"]) - ox - mx)
+            y0 = max(0, int(m["top"]) - oy - my)
+            x1 = min(fw, int(m["left"]) - ox + int(m["width"]) + mx)
+            y1 = min(fh, int(m["top"]) - oy + int(m["height"]) + my)
+            self._items.append((base, frame[y0:y1, x0:x1]))
+
+    def __call__(self, scale: float) -> float:
+        self.evaluations += 1
+        scores: List[float] = []
+        for base, roi in self._items:
+            tpl = resize_lanczos(base, scale)
+            if self.grayscale:
+                tpl = cv2.cvtColor(tpl, cv2.COLOR_BGR2GRAY)
+            if tpl.shape[0] > roi.shape[0] or tpl.shape[1] > roi.shape[1]:
+                scores.append(0.0)
+                continue
+            res = cv2.matchTemplate(roi, tpl, cv2.TM_CCOEFF_NORMED)
+            scores.append(float(np.nan_to_num(res).max()))
+        return sum(scores) / len(scores) if scores else 0.0
+
+
+# 功能：由离散比例的锚点命中细化出小数比例。
+def refine_scale(
+    frame: np.ndarray,
+    anchors: List[Tuple[Path, Dict[str, Any]]],
+    coarse: float,
+    scales: Sequence[int],
+    grayscale: bool = True,
+    region: Optional[Tuple[int, int, int, int]] = None,
+    tol: float = SCALE_TOLERANCE,
+) -> Dict[str, Any]:
+    """
+    返回 {"scale", "score", "coarse", "coarse_score", "evaluations"}；
+    细化结果不优于离散比例时保留离散比例。scale 保留 1 位小数。
+    """
+    lo, hi = bracket_scale(coarse, scales)
+    score_at = AnchorScorer(frame, anchors, grayscale, region, max_scale=hi)
+    coarse_score = score_at(coarse)
+    best, best_score = golden_section_max(score_at, lo, hi, tol)
+    best = round(best, 1)
+    best_score = score_at(best)
+    if best_score <= coarse_score:
+        best, best_score = coarse, coarse_score
+    return {
+        "scale": best,
+        "score": best_score,
+        "coarse": coarse,
+        "coarse_score": coarse_score,
+        "evaluations": score_at.evaluations,
+    }
+
+
+def _self_check(folder: str, true_scale: float, grayscale: bool) -> int:
+    """把 folder 下的基础模板按 true_scale 合成到一张画面上，比较离散匹配与细化结果。"""
+    from .match import SCALES, get_assets_dir, _is_scaled_variant  # 延迟导入，避免 match 与本模块循环引用
+    from .calc_locate import match_template
+
+    assets = get_assets_dir() / folder
+    bases = sorted(p for p in assets.glob("*.png") if not _is_scaled_variant(p))
+    if not bases:
+        print(f"[scale] {assets} 下没有基础模板")
+        return 1
+    rng = np.random.default_rng(0)
+    canvas = rng.integers(0, 40, size=(900, 1100, 3), dtype=np.uint8)
+    x = y = 20
+    row_h = 0
+    for p in bases:
+        tpl = resize_lanczos(load_template(str(p), False), true_scale)
+        h, w = tpl.shape[:2]
+        if x + w > canvas.shape[1]:
+            x, y, row_h = 20, y + row_h + 20, 0
+        canvas[y:y + h, x:x + w] = tpl
+        x, row_h = x + w + 20, max(row_h, h)
+    frame = cv2.cvtColor(canvas, cv2.COLOR_BGR2GRAY) if grayscale else canvas
+
+    # 离散比例：各锚点在 SCALES 中得分最高的比例，取多数
+    anchors: List[Tuple[Path, Dict[str, Any]]] = []
+    votes: Dict[int, float] = {}
+    hits: Dict[Path, Dict[int, Dict[str, Any]]] = {}
+    for p in bases:
+        base = load_template(str(p), False)
+        for sc in SCALES:
+            tpl = resize_lanczos(base, sc)
+            if grayscale:
+                tpl = cv2.cvtColor(tpl, cv2.COLOR_BGR2GRAY)
+            m = match_template(frame, tpl, confidence=0.0, pyramid=False)
+            if m is not None:
+                hits.setdefault(p, {})[sc] = m
+                votes[sc] = votes.get(sc, 0.0) + m["score"]
+    coarse = max(votes, key=votes.get)
+    anchors = [(p, hs[coarse]) for p, hs in hits.items() if coarse in hs]
+
+    t0 = time.perf_counter()
+    est = refine_scale(frame, anchors, coarse, SCALES, grayscale=grayscale)
+    ms = (time.perf_counter() - t0) * 1000
+    print(f"[scale] 真实比例 {true_scale}%，{len(anchors)} 个锚点")
+    print(f"[scale]   离散 {coarse}%: score={est['coarse_score']:.4f}, 误差 {coarse - true_scale:+.1f}%")
+    print(
+        f"[scale]   细化 {est['scale']}%: score={est['score']:.4f}, 误差 {est['scale'] - true_scale:+.1f}%, "
+        f"{est['evaluations']} 次求值, {ms:.0f}ms"
+    )
+    # 以 100% 下 (48, 164) 的点击偏移为例，换算误差（像素）
+    for name, sc in (("离散", coarse), ("细化", est["scale"])):
+        dx = round(48 * sc / 100) - 48 * true_scale / 100
+        dy = round(164 * sc / 100) - 164 * true_scale / 100
+        print(f"[scale]   偏移 (48,164) 按{name}比例换算的误差: ({dx:+.1f}, {dy:+.1f}) px")
+    return 0 if abs(est["scale"] - true_scale) <= abs(coarse - true_scale) else 1
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="比例细化自检：合成指定比例的画面并估计比例")
+    parser.add_argument("--folder", default="a", help="assets 下的模板子目录")
+    parser.add_argument("--scale", type=float, default=72.4, help="合成画面使用的真实比例")
+    parser.add_argument("--color", action="store_true", help="使用彩色匹配")
+    args = parser.parse_args(argv)
+    return _self_check(args.folder, args.scale, not args.color)
+
+
+__all__ = [
+    "SCALE_TOLERANCE",
+    "bracket_scale",
+    "golden_section_max",
+    "AnchorScorer",
+    "refine_scale",
+]
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,263 @@
+from __future__ import annotations
+
+"""
+    scale_state.py
+    - 功能：进程内的比例状态存储（scale_state.json）
+    - 读取：首次访问时从磁盘加载，之后由内存提供；文件的修改时间/大小变化（其他实例写入）时重新读取
+    - 写入：防抖合并短时间内的多次保存，临时文件 + 重命名原子落盘，
+            并通过 .lock 文件加锁，避免多个工具实例同时写坏文件
+    - 合并：加锁后若发现文件在上次同步后被其他实例改过，先读回磁盘内容，
+            再叠加本实例自上次同步以来改动（或删除）的键后写出，不会覆盖其他实例的修改；
+            值为字典的键（per_template 等）按条目合并
+    - 离线回放（虚拟时钟）时 get_store 改用临时目录下的副本，回放不改写真实的状态文件
+"""
+
+import atexit
+import copy
+import json
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, Dict, Any, Callable, Iterator, Tuple
+
+# 写入防抖时长（秒）：窗口期内的多次保存只落盘最后一次
+SAVE_DEBOUNCE_SEC: float = 0.5
+
+
+@contextmanager
+def _file_lock(lock_path: Path) -> Iterator[None]:
+    """跨进程文件锁（Windows 使用 msvcrt，其他平台使用 fcntl）。"""
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, "a+b") as fh:
+        if os.name == "nt":
+            import msvcrt
+
+            fh.seek(0)
+            # LK_LOCK 最多重试约 10 秒，超时抛出 OSError
+            msvcrt.locking(fh.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                fh.seek(0)
+                msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+
+def _overlay(disk: Dict[str, Any], base: Dict[str, Any], state: Dict[str, Any], nested: bool) -> Dict[str, Any]:
+    """在 disk 上叠加 state 相对 base 的改动与删除；nested 时两侧都是字典的值再按条目叠加一层。"""
+    merged = copy.deepcopy(disk)
+    for key in set(base) | set(state):
+        if key not in state:
+            merged.pop(key, None)
+        elif key not in base or base[key] != state[key]:
+            old, new, cur = base.get(key), state[key], merged.get(key)
+            if nested and isinstance(old, dict) and isinstance(new, dict) and isinstance(cur, dict):
+                merged[key] = _overlay(cur, old, new, nested=False)
+            else:
+                merged[key] = copy.deepcopy(new)
+    return merged
+
+
+class ScaleStateStore:
+    """
+    单个状态文件的内存缓存。
+    - load(): 返回状态的深拷贝，调用方修改后需 save() 才会生效；文件被其他实例更新时先合并磁盘内容
+    - save(): 立即更新内存，并在防抖时长后原子写盘
+    - flush(): 立即写出尚未落盘的修改
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        default: Callable[[], Dict[str, Any]],
+        normalize: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
+        debounce_sec: float = SAVE_DEBOUNCE_SEC,
+    ) -> None:
+        self.path = Path(path)
+        self.lock_path = self.path.with_name(self.path.name + ".lock")
+        self._default = default
+        self._normalize = normalize
+        self.debounce_sec = float(debounce_sec)
+        self._state: Optional[Dict[str, Any]] = None
+        self._base: Dict[str, Any] = {}  # 上次与磁盘同步时的内容，用于找出本实例的改动
+        self._disk_sig: Optional[Tuple[int, int]] = None  # 上次同步时文件的 (修改时间, 大小)
+        self._dirty = False
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.RLock()
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _read_unlocked(self) -> Dict[str, Any]:
+        """从磁盘读取并纠偏（调用方持有文件锁），同时记下文件签名；文件缺失或损坏时返回默认值。"""
+        self._disk_sig = self._stat()
+        try:
+            if not self.path.exists():
+                return self._default()
+            with self.path.open("r", encoding="utf-8") as f:
+                data = json.load(f)
+            return self._normalize(data) if self._normalize else data
+        except Exception:
+            return self._default()
+
+    def _read_disk(self) -> Dict[str, Any]:
+        try:
+            with _file_lock(self.lock_path):
+                return self._read_unlocked()
+        except Exception:
+            return self._default()
+
+    def _merge(self, disk: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        以磁盘内容为底，叠加本实例自上次同步以来改动或删除的键（需持有 self._lock）。
+        值为字典的顶层键（per_template、edges 等）按条目合并，不同实例改动不同条目时互不覆盖。
+        """
+        state = self._state if self._state is not None else {}
+        return _overlay(disk, self._base, state, nested=True)
+
+    def _sync(self, disk: Dict[str, Any]) -> None:
+        """用读回的磁盘内容更新内存：有未落盘的改动时合并，否则直接采用（需持有 self._lock）。"""
+        self._state = self._merge(disk) if self._dirty else disk
+        self._base = copy.deepcopy(disk)
+
+    def load(self) -> Dict[str, Any]:
+        """返回当前状态（深拷贝）；文件自上次同步后被改过时先读回并合并。"""
+        with self._lock:
+            if self._state is None or self._stat() != self._disk_sig:
+                self._sync(self._read_disk())
+            return copy.deepcopy(self._state)
+
+    def save(self, state: Dict[str, Any]) -> None:
+        """更新内存中的状态并安排防抖写盘。"""
+        with self._lock:
+            self._state = copy.deepcopy(state)
+            self._dirty = True
+            if self._timer is not None:
+                self._timer.cancel()
+            if self.debounce_sec <= 0:
+                self._timer = None
+                self._write()
+                return
+            self._timer = threading.Timer(self.debounce_sec, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self) -> None:
+        """立即写出未落盘的修改。"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._dirty:
+                self._write()
+
+    def reload(self) -> Dict[str, Any]:
+        """丢弃内存状态并重新从磁盘读取（例如其他实例更新了文件）。"""
+        with self._lock:
+            self.flush()
+            self._state = None
+            return self.load()
+
+    def _write(self) -> None:
+        """临时文件 + 重命名的原子写入；加锁后文件已被其他实例改过时先合并（需持有 self._lock）。"""
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with _file_lock(self.lock_path):
+                if self._stat() != self._disk_sig:
+                    self._sync(self._read_unlocked())
+                state = self._state
+                fd, tmp = tempfile.mkstemp(prefix=self.path.name + ".", suffix=".tmp", dir=str(self.path.parent))
+                try:
+                    with os.fdopen(fd, "w", encoding="utf-8") as f:
+                        json.dump(state, f, ensure_ascii=False, indent=2)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    os.replace(tmp, self.path)
+                    # 落盘成功后才清除未保存标记；失败时保留改动，下次保存或 flush 时重试
+                    self._dirty = False
+                    self._base = copy.deepcopy(state)
+                    self._disk_sig = self._stat()
+                except BaseException:
+                    try:
+                        os.unlink(tmp)
+                    except OSError:
+                        pass
+                    raise
+        except Exception as e:
+            print(f"[scale] 状态保存失败: {e}")
+
+
+_STORES: Dict[Path, ScaleStateStore] = {}
+_STORES_LOCK = threading.Lock()
+# 离线回放使用的临时状态目录（首次回放时创建）
+_REPLAY_DIR: Optional[Path] = None
+
+
+def _replay_path(path: Path) -> Path:
+    """
+    离线回放（虚拟时钟）时把状态文件换到临时目录，回放学到的比例与导航代价不写入真实文件；
+    首次使用时复制真实文件作为初始内容（需持有 _STORES_LOCK）。
+    """
+    global _REPLAY_DIR
+    # 延迟导入，避免与 calc_locate 循环引用
+    from .calc_locate import is_virtual_clock
+
+    if not is_virtual_clock():
+        return path
+    if _REPLAY_DIR is None:
+        _REPLAY_DIR = Path(tempfile.mkdtemp(prefix="tdsheep_replay_"))
+    if path.parent == _REPLAY_DIR:
+        return path
+    target = _REPLAY_DIR / path.name
+    if not target.exists() and path.exists():
+        shutil.copyfile(path, target)
+    return target
+
+
+def get_store(
+    path: Path,
+    default: Callable[[], Dict[str, Any]],
+    normalize: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
+) -> ScaleStateStore:
+    """按路径获取（或创建）进程内共享的状态存储；离线回放时返回临时目录下副本的存储。"""
+    with _STORES_LOCK:
+        key = _replay_path(Path(path).resolve())
+        store = _STORES.get(key)
+        if store is None:
+            store = ScaleStateStore(key, default, normalize)
+            _STORES[key] = store
+        return store
+
+
+def flush_all() -> None:
+    """写出所有存储中未落盘的修改。"""
+    with _STORES_LOCK:
+        stores = list(_STORES.values())
+    for store in stores:
+        store.flush()
+
+
+# 进程退出前确保防抖中的修改落盘
+atexit.register(flush_all)
+
+
+__all__ = [
+    "SAVE_DEBOUNCE_SEC",
+    "ScaleStateStore",
+    "get_store",
+    "flush_all",
+]
@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+"""
+    settle.py
+    - 功能：自适应等待，替代固定时长的 sleep
+    - wait_until_settled：目标出现或画面停止变化即返回，timeout 为上限
+        出现：由调用方提供的判定函数在最新画面上返回 True
+        稳定：画面缩略图连续 stable_sec 秒没有明显变化（动画、淡出文字结束）
+    - 每次等待按 key（页面跳转、流程状态切换等）记录实际耗时与结果，
+      用于观察各环节的延迟分布，并据此调整上限
+    - 用法：
+        outcome, sec = wait_until_settled(timeout=3.0, key="settle_done")
+"""
+
+import threading
+from collections import deque
+from typing import Optional, Tuple, List, Dict, Any, Callable, Deque
+
+import cv2
+import numpy as np
+
+from .calc_locate import clock_now, grab_screen, sleep
+from .capture import release_frame
+from .metrics import get_registry, is_enabled
+
+# 画面保持不变多久视为稳定（秒）
+STABLE_SEC: float = 0.3
+# 轮询间隔（秒）
+POLL_SEC: float = 0.1
+# 变化判定：画面缩小到 1/8 后，最大像素差超过该值视为变化
+CHANGE_DOWNSAMPLE: int = 8
+CHANGE_THRESHOLD: int = 8
+# 每个 key 保留的最近样本数
+MAX_SAMPLES: int = 200
+
+OUTCOME_PRESENT = "present"
+OUTCOME_STABLE = "stable"
+OUTCOME_TIMEOUT = "timeout"
+
+
+def screen_thumbnail(frame: np.ndarray) -> np.ndarray:
+    """缩小后的灰度画面，用于廉价的变化判定。"""
+    gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    h, w = gray.shape[:2]
+    f = CHANGE_DOWNSAMPLE
+    return cv2.resize(gray, (max(1, w // f), max(1, h // f)), interpolation=cv2.INTER_AREA)
+
+
+def thumbnails_differ(a: Optional[np.ndarray], b: np.ndarray) -> bool:
+    if a is None or a.shape != b.shape:
+        return True
+    return int(cv2.absdiff(a, b).max()) > CHANGE_THRESHOLD
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    i = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return sorted_values[i]
+
+
+class LatencyTracker:
+    """
+    按 key 记录等待耗时的分布。
+    - 每个 key 保留最近 MAX_SAMPLES 个样本与各结果的次数
+    - 启用 metrics 时同时写入 transition_latency 直方图
+    """
+
+    def __init__(self, max_samples: int = MAX_SAMPLES) -> None:
+        self.max_samples = int(max_samples)
+        self._samples: Dict[str, Deque[float]] = {}
+        self._outcomes: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: str, sec: float, outcome: str) -> None:
+        with self._lock:
+            q = self._samples.get(key)
+            if q is None:
+                q = self._samples[key] = deque(maxlen=self.max_samples)
+            q.append(float(sec))
+            counts = self._outcomes.setdefault(key, {})
+            counts[outcome] = counts.get(outcome, 0) + 1
+        if is_enabled():
+            get_registry().observe(("transition_latency", (("outcome", outcome), ("transition", key))), float(sec))
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """{key: {"count", "mean", "p50", "p90", "max", "outcomes"}}，耗时单位为秒。"""
+        with self._lock:
+            items = [(k, sorted(q), dict(self._outcomes.get(k, {}))) for k, q in self._samples.items()]
+        out: Dict[str, Dict[str, Any]] = {}
+        for key, values, outcomes in items:
+            out[key] = {
+                "count": len(values),
+                "mean": sum(values) / len(values) if values else 0.0,
+                "p50": _percentile(values, 0.5),
+                "p90": _percentile(values, 0.9),
+                "max": values[-1] if values else 0.0,
+                "outcomes": outcomes,
+            }
+        return out
+
+    def reset(self) -> None:
+        with self._lock:
+            self._samples.clear()
+            self._outcomes.clear()
+
+    def report(self) -> None:
+        st = self.stats()
+        if not st:
+            return
+        print("[settle] 等待耗时分布:")
+        for key in sorted(st):
+            s = st[key]
+            outcomes = ", ".join(f"{k}={v}" for k, v in sorted(s["outcomes"].items()))
+            print(
+                f"[settle]   {key}: n={s['count']} p50={s['p50']:.2f}s p90={s['p90']:.2f}s "
+                f"max={s['max']:.2f}s ({outcomes})"
+            )
+
+
+_TRACKER = LatencyTracker()
+
+
+def get_latency_tracker() -> LatencyTracker:
+    return _TRACKER
+
+
+# 功能：等待目标出现或画面稳定，返回 (结果, 耗时)。
+def wait_until_settled(
+    present: Optional[Callable[[np.ndarray], bool]] = None,
+    timeout: float = 3.0,
+    stable_sec: Optional[float] = STABLE_SEC,
+    region: Optional[Tuple[int, int, int, int]] = None,
+    grayscale: bool = True,
+    interval: float = POLL_SEC,
+    key: Optional[str] = None,
+) -> Tuple[str, float]:
+    """
+    反复截屏，直到：
+    - present(frame) 为 True                   -> ("present", 耗时)
+    - 画面连续 stable_sec 秒无变化（非 None 时） -> ("stable", 耗时)
+    - 超过 timeout                             -> ("timeout", 耗时)
+    present 只在画面变化（含首帧）时调用。key 非空时耗时计入 LatencyTracker。
+    计时使用输入处理器的时钟（clock_now），离线回放时按虚拟时间推进。
+    """
+    t0 = clock_now()
+    deadline = t0 + max(0.0, timeout)
+    thumb: Optional[np.ndarray] = None
+    changed_at = t0
+    outcome = OUTCOME_TIMEOUT
+    while True:
+        frame = grab_screen(region=region, grayscale=grayscale)
+        now = clock_now()
+        new_thumb = screen_thumbnail(frame)
+        differ = thumbnails_differ(thumb, new_thumb)
+        try:
+            found = differ and present is not None and present(frame)
+        finally:
+            release_frame(frame)
+        if differ:
+            if thumb is not None:
+                changed_at = now
+            thumb = new_thumb
+            if found:
+                outcome = OUTCOME_PRESENT
+                break
+        elif stable_sec is not None and now - changed_at >= stable_sec:
+            outcome = OUTCOME_STABLE
+            break
+        if now >= deadline:
+            break
+        sleep(min(interval, max(0.0, deadline - now)))
+
+    elapsed = clock_now() - t0
+    if key:
+        _TRACKER.record(key, elapsed, outcome)
+    return outcome, elapsed
+
+
+__all__ = [
+    "STABLE_SEC",
+    "POLL_SEC",
+    "OUTCOME_PRESENT",
+    "OUTCOME_STABLE",
+    "OUTCOME_TIMEOUT",
+    "screen_thumbnail",
+    "thumbnails_differ",
+    "LatencyTracker",
+    "get_latency_tracker",
+    "wait_until_settled",
+]
@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+"""
+    supervisor.py
+    - 功能：多窗口并行挂机
+    - 流程：
+        1. detect_windows 在整屏中找出全部游戏窗口（同一锚点的多个命中）
+        2. 每个窗口创建一个 WindowInstance：独立的搜索区域、比例状态文件、提示缓存
+        3. 每个窗口一个工作线程，绑定实例后运行任务循环（默认自动竞技场）
+        4. 鼠标只有一个：所有点击/移动经由 MouseArbiter 串行执行，
+           截屏与匹配（cv2 释放 GIL）仍可并行
+    - 用法：main 中输入 multi，或
+        Supervisor(lambda inst: run_auto_arena()).run()
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Callable, Iterator
+
+from .auto_arena import run_auto_arena
+from .calc_locate import InputHandler, get_input_handler, set_input_handler
+from .instance import WindowInstance, bind_instance
+from .match import get_scale_state_path, load_scale_state, save_scale_state, set_window_region
+from .metrics import span
+from .window import detect_windows
+
+# 默认最多驱动的窗口数
+MAX_WINDOWS: int = 4
+
+
+class MouseArbiter(InputHandler):
+    """
+    串行化鼠标输入的处理器：包装原有处理器，点击与移动持锁执行。
+    等待不持锁，各窗口的 sleep 互不影响；时钟（now / virtual_clock）沿用被包装的处理器。
+    """
+
+    def __init__(self, inner: InputHandler) -> None:
+        self.inner = inner
+        self._lock = threading.RLock()
+        self._stats_lock = threading.Lock()
+        self.actions = 0
+        self.wait_sec = 0.0
+
+    @contextmanager
+    def exclusive(self) -> Iterator[None]:
+        """独占鼠标，用于必须连续执行的多步操作（例如点击后立即移开指针）。"""
+        t0 = time.perf_counter()
+        with span("mouse_wait"):
+            self._lock.acquire()
+        waited = time.perf_counter() - t0
+        with self._stats_lock:
+            self.actions += 1
+            self.wait_sec += waited
+        try:
+            yield
+        finally:
+            self._lock.release()
+
+    def click(self, x: int, y: int, clicks: int, interval: float, button: str, move_duration: float) -> None:
+        with self.exclusive():
+            self.inner.click(x, y, clicks, interval, button, move_duration)
+
+    def move(self, x: int, y: int, duration: float) -> None:
+        with self.exclusive():
+            self.inner.move(x, y, duration)
+
+    def sleep(self, seconds: float) -> None:
+        self.inner.sleep(seconds)
+
+    def now(self) -> float:
+        return self.inner.now()
+
+    @property
+    def virtual_clock(self) -> bool:
+        return bool(self.inner.virtual_clock)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "actions": self.actions,
+                "wait_sec": self.wait_sec,
+                "mean_wait_ms": (self.wait_sec / self.actions * 1000) if self.actions else 0.0,
+            }
+
+
+def instance_state_path(index: int) -> Path:
+    """第 index 个窗口的比例状态文件，与单窗口的状态文件放在同一目录。"""
+    base = get_scale_state_path()
+    return base.with_name(f"{base.stem}_w{index}{base.suffix}")
+
+
+def discover_instances(
+    max_windows: int = MAX_WINDOWS,
+    confidence: float = 0.8,
+    grayscale: bool = True,
+) -> List[WindowInstance]:
+    """检测全部游戏窗口，为每个窗口创建实例并写入其比例状态与搜索区域。"""
+    instances: List[WindowInstance] = []
+    for i, w in enumerate(detect_windows(max_windows=max_windows, confidence=confidence, grayscale=grayscale)):
+        r = w["rect"]
+        inst = WindowInstance(i, (r["left"], r["top"], r["width"], r["height"]), w["scale"], instance_state_path(i))
+        with bind_instance(inst):
+            state = load_scale_state()
+            state["recommended_scale"] = inst.scale
+            state["fail_count"] = 0
+            save_scale_state(state)
+            set_window_region(r, persist=True)
+        instances.append(inst)
+    return instances
+
+
+class Supervisor:
+    """
+    为每个窗口启动一个工作线程并等待全部结束。
+    - task: 每个窗口执行的任务，参数为该窗口的实例；线程内已绑定实例
+    - max_windows / confidence / grayscale: 窗口检测参数
+    """
+
+    def __init__(
+        self,
+        task: Callable[[WindowInstance], Any],
+        max_windows: int = MAX_WINDOWS,
+        confidence: float = 0.8,
+        grayscale: bool = True,
+    ) -> None:
+        self.task = task
+        self.max_windows = int(max_windows)
+        self.confidence = float(confidence)
+        self.grayscale = bool(grayscale)
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self._results_lock = threading.Lock()
+
+    def _worker(self, inst: WindowInstance) -> None:
+        t0 = time.perf_counter()
+        result: Dict[str, Any] = {"ok": True, "error": None}
+        try:
+            with bind_instance(inst):
+                result["value"] = self.task(inst)
+        except Exception as e:
+            result["ok"] = False
+            result["error"] = f"{type(e).__name__}: {e}"
+            print(f"[supervisor] {inst.name} 任务异常: {result['error']}")
+        result["elapsed_sec"] = time.perf_counter() - t0
+        with self._results_lock:
+            self.results[inst.name] = result
+
+    def run(self, instances: Optional[List[WindowInstance]] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        运行全部窗口的任务，返回 {实例名: {"ok", "error", "value", "elapsed_sec"}}。
+        - instances: 已创建的实例；None 时自动检测
+        """
+        if instances is None:
+            instances = discover_instances(self.max_windows, self.confidence, self.grayscale)
+        if not instances:
+            print("[supervisor] 未识别到游戏窗口，无法启动")
+            return {}
+
+        arbiter = MouseArbiter(get_input_handler())
+        old = set_input_handler(arbiter)
+        try:
+            threads = [
+                threading.Thread(target=self._worker, args=(inst,), name=inst.name, daemon=True)
+                for inst in instances
+            ]
+            print(f"[supervisor] 启动 {len(threads)} 个窗口任务")
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            set_input_handler(old)
+
+        st = arbiter.stats()
+        print(
+            f"[supervisor] 全部窗口任务结束：鼠标操作 {st['actions']} 次，"
+            f"平均排队 {st['mean_wait_ms']:.1f}ms"
+        )
+        for inst in instances:
+            r = self.results.get(inst.name, {})
+            hs = inst.hints.stats()
+            status = "完成" if r.get("ok") else f"失败 ({r.get('error')})"
+            print(
+                f"[supervisor]   {inst.name}: {status}，耗时 {r.get('elapsed_sec', 0.0):.1f}s，"
+                f"近位命中率 {hs['hit_rate'] * 100:.1f}%"
+            )
+        return dict(self.results)
+
+
+# 功能：在全部窗口上并行运行自动竞技场。
+def run_multi_arena(max_windows: int = MAX_WINDOWS) -> Dict[str, Dict[str, Any]]:
+    return Supervisor(lambda inst: run_auto_arena(), max_windows=max_windows).run()
+
+
+__all__ = [
+    "MAX_WINDOWS",
+    "MouseArbiter",
+    "instance_state_path",
+    "discover_instances",
+    "Supervisor",
+    "run_multi_arena",
+]
@@ -0,0 +1,268 @@
+from __future__ import annotations
+
+"""
+    template_pack.py
+    - 功能：把 assets 下全部模板预先解码（灰度 + BGR）打包成一个带索引的二进制文件，
+            运行时内存映射该文件，直接返回零拷贝的只读 ndarray 视图
+    - 文件布局（assets/templates.pack）：
+        [0:8)    魔数 b"TDPACK01"
+        [8:16)   索引偏移（uint64，小端）
+        [16:24)  索引长度（uint64，小端）
+        之后     各模板的像素数据，每块按 64 字节对齐
+        末尾     JSON 索引：{"entries": [{"path", "size", "mtime_ns", "gray": [偏移, h, w], "bgr": [偏移, h, w]}]}
+    - 打开时对照磁盘校验一次（逐个 stat 源 PNG、列出各子目录）：
+        内容有变化的模板回退到磁盘读取；目录内 PNG 集合完全一致时，
+        该目录下的模板查找直接查索引，不再逐次 Path.exists()
+    - 用法：
+        python -m tdsheep_auto_tool.src.template_pack            重新打包
+        python -m tdsheep_auto_tool.src.template_pack --check    检查打包文件是否与素材一致
+"""
+
+import argparse
+import json
+import os
+import struct
+import time
+from pathlib import Path
+from typing import Optional, Tuple, List, Dict, Any
+
+import cv2
+import numpy as np
+
+PACK_FILENAME = "templates.pack"
+PACK_MAGIC = b"TDPACK01"
+# 各数据块的对齐字节数
+PACK_ALIGN: int = 64
+
+_HEADER = struct.Struct("<8sQQ")
+
+
+def _align(n: int) -> int:
+    return (n + PACK_ALIGN - 1) // PACK_ALIGN * PACK_ALIGN
+
+
+def _source_files(root: Path) -> List[Path]:
+    return sorted(root.rglob("*.png"))
+
+
+# 功能：把 root 下全部 PNG 模板解码后写入打包文件。
+def build_pack(root: Path, out: Optional[Path] = None) -> Dict[str, Any]:
+    """
+    解码 root 下全部 PNG（与 TemplateCache 相同的 imread 标志），写入 out（默认 root/templates.pack）。
+    先写临时文件再替换，运行中的进程若已映射旧文件，需重启后才会使用新文件。
+    返回 {"path", "entries", "bytes", "elapsed_sec"}。
+    """
+    t0 = time.perf_counter()
+    root = Path(root)
+    out = Path(out) if out else root / PACK_FILENAME
+    tmp = out.with_name(out.name + ".tmp")
+    entries: List[Dict[str, Any]] = []
+    with tmp.open("wb") as f:
+        f.write(_HEADER.pack(PACK_MAGIC, 0, 0))
+        pos = _HEADER.size
+
+        def _write_block(img: np.ndarray) -> List[int]:
+            nonlocal pos
+            start = _align(pos)
+            f.write(b"\0" * (start - pos))
+            data = np.ascontiguousarray(img)
+            f.write(data.tobytes())
+            pos = start + data.nbytes
+            return [start, int(img.shape[0]), int(img.shape[1])]
+
+        for png in _source_files(root):
+            gray = cv2.imread(str(png), cv2.IMREAD_GRAYSCALE)
+            bgr = cv2.imread(str(png), cv2.IMREAD_COLOR)
+            if gray is None or bgr is None:
+                print(f"[pack] 跳过无法读取的模板: {png}")
+                continue
+            st = png.stat()
+            entries.append({
+                "path": png.relative_to(root).as_posix(),
+                "size": st.st_size,
+                "mtime_ns": st.st_mtime_ns,
+                "gray": _write_block(gray),
+                "bgr": _write_block(bgr),
+            })
+
+        index = json.dumps({"entries": entries}, ensure_ascii=False).encode("utf-8")
+        index_offset = _align(pos)
+        f.write(b"\0" * (index_offset - pos))
+        f.write(index)
+        f.seek(0)
+        f.write(_HEADER.pack(PACK_MAGIC, index_offset, len(index)))
+    os.replace(tmp, out)
+
+    report = {
+        "path": str(out),
+        "entries": len(entries),
+        "bytes": out.stat().st_size,
+        "elapsed_sec": time.perf_counter() - t0,
+    }
+    print(
+        f"[pack] 已打包 {report['entries']} 个模板 -> {out.name} "
+        f"({report['bytes'] / 1024 / 1024:.1f} MB，耗时 {report['elapsed_sec']:.2f}s)"
+    )
+    return report
+
+
+class TemplatePack:
+    """
+    内存映射的模板包。
+    - get(path, grayscale): 返回该模板的只读 ndarray 视图；不在包内或已过期时返回 None
+    - covers(dir): 该目录的 PNG 集合与打包时完全一致，可直接用 has() 判断文件是否存在
+    键为模板的绝对路径（os.path.abspath），与 TemplateCache 一致。
+    """
+
+    def __init__(self, path: Path, root: Path, verify: bool = True) -> None:
+        self.path = Path(path)
+        self.root = Path(root)
+        self._mm = np.memmap(self.path, dtype=np.uint8, mode="r")
+        magic, index_offset, index_len = _HEADER.unpack(self._mm[:_HEADER.size].tobytes())
+        if magic != PACK_MAGIC:
+            raise ValueError(f"不是模板打包文件: {self.path}")
+        index = json.loads(self._mm[index_offset:index_offset + index_len].tobytes().decode("utf-8"))
+
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._views: Dict[Tuple[str, bool], np.ndarray] = {}
+        self._dirs: Dict[str, set] = {}
+        for e in index["entries"]:
+            p = os.path.abspath(os.path.join(str(self.root), *e["path"].split("/")))
+            self._entries[p] = e
+            self._dirs.setdefault(os.path.dirname(p), set()).add(os.path.basename(p))
+        self.stale: List[str] = []
+        self._covered: set = set(self._dirs)
+        if verify:
+            self._verify()
+        self.hits = 0
+
+    def _verify(self) -> None:
+        """对照磁盘：内容有变化的条目移出索引，PNG 集合有差异的目录不再视为完整覆盖。"""
+        for p, e in list(self._entries.items()):
+            try:
+                st = os.stat(p)
+            except OSError:
+                st = None
+            if st is None or st.st_size != e["size"] or st.st_mtime_ns != e["mtime_ns"]:
+                self.stale.append(e["path"])
+                del self._entries[p]
+                self._covered.discard(os.path.dirname(p))
+        for d in list(self._covered):
+            try:
+                names = {n for n in os.listdir(d) if n.lower().endswith(".png")}
+            except OSError:
+                names = set()
+            if names != self._dirs[d]:
+                self._covered.discard(d)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def covers(self, directory: str) -> bool:
+        return directory in self._covered or os.path.abspath(directory) in self._covered
+
+    def has(self, template_path: str) -> bool:
+        return template_path in self._entries or os.path.abspath(template_path) in self._entries
+
+    def get(self, template_path: str, grayscale: bool = True) -> Optional[np.ndarray]:
+        key = (template_path, bool(grayscale))
+        view = self._views.get(key)
+        if view is None:
+            e = self._entries.get(template_path) or self._entries.get(os.path.abspath(template_path))
+            if e is None:
+                return None
+            offset, h, w = e["gray"] if grayscale else e["bgr"]
+            shape = (h, w) if grayscale else (h, w, 3)
+            count = h * w * (1 if grayscale else 3)
+            view = np.frombuffer(self._mm, dtype=np.uint8, count=count, offset=offset).reshape(shape)
+            self._views[key] = view
+        self.hits += 1
+        return view
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": str(self.path),
+            "entries": len(self._entries),
+            "stale": len(self.stale),
+            "covered_dirs": len(self._covered),
+            "bytes": int(self._mm.nbytes),
+            "hits": self.hits,
+        }
+
+
+def open_pack(root: Path, path: Optional[Path] = None, verify: bool = True) -> Optional[TemplatePack]:
+    """打开 root 下的模板包；文件不存在或无效时返回 None。"""
+    path = Path(path) if path else Path(root) / PACK_FILENAME
+    if not path.exists():
+        return None
+    try:
+        pack = TemplatePack(path, root, verify=verify)
+    except Exception as e:
+        print(f"[pack] 打开模板包失败，改为逐个读取 PNG: {e}")
+        return None
+    if pack.stale:
+        print(f"[pack] {len(pack.stale)} 个模板与打包时不一致，改为读取磁盘；请重新打包")
+    return pack
+
+
+_PACK: Optional[TemplatePack] = None
+
+
+def get_template_pack() -> Optional[TemplatePack]:
+    """返回当前启用的模板包；未启用时为 None。"""
+    return _PACK
+
+
+def set_template_pack(pack: Optional[TemplatePack]) -> Optional[TemplatePack]:
+    """启用（或以 None 停用）模板包，返回之前的模板包。"""
+    global _PACK
+    old, _PACK = _PACK, pack
+    return old
+
+
+def check_pack(root: Path, path: Optional[Path] = None) -> bool:
+    """检查打包文件是否覆盖 root 下全部模板且内容一致。"""
+    pack = open_pack(root, path)
+    if pack is None:
+        print("[pack] 模板包不存在或无法读取")
+        return False
+    stale = set(pack.stale)
+    missing = [
+        p for p in _source_files(Path(root))
+        if not pack.has(str(p)) and p.relative_to(root).as_posix() not in stale
+    ]
+    for rel in pack.stale:
+        print(f"[pack]   已变化: {rel}")
+    for p in missing:
+        print(f"[pack]   未打包: {p.relative_to(root).as_posix()}")
+    ok = not pack.stale and not missing
+    print(f"[pack] 模板包{'与素材一致' if ok else '需要重新打包'}（{len(pack)} 个模板）")
+    return ok
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from .match import get_assets_dir  # 延迟导入，避免 match 与本模块循环引用
+
+    parser = argparse.ArgumentParser(description="模板打包")
+    parser.add_argument("--check", action="store_true", help="只检查打包文件是否与素材一致")
+    args = parser.parse_args(argv)
+    root = get_assets_dir()
+    if args.check:
+        return 0 if check_pack(root) else 1
+    build_pack(root)
+    return 0
+
+
+__all__ = [
+    "PACK_FILENAME",
+    "TemplatePack",
+    "build_pack",
+    "open_pack",
+    "check_pack",
+    "get_template_pack",
+    "set_template_pack",
+]
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+"""
+    template_scaler.py
+    - 功能：由基础模板（{stem}.png）在内存中按需合成任意比例的模板，
+            替代预生成的 {stem}_{scale}.png，匹配不再局限于固定的 SCALES 列表
+    - 缩放：与 scale_assets 相同的 Lanczos4 重采样（resize_lanczos 为两者共用）；
+            彩色结果与磁盘上的缩放图逐像素一致，灰度由彩色结果转换，与 PNG 解码的灰度最多相差 1
+    - 合成路径：match.find_template_path 为每个 (基础模板, 比例) 登记一个虚拟路径
+              （形如 .../4_2_72.png、.../4_2_72.4.png，磁盘上不必存在），calc_locate 读取模板时优先按登记合成
+    - 比例可带 1 位小数（见 scale_estimate 的细化结果）
+    - 合成结果按字节预算做 LRU 淘汰
+    - 配置：config.json 中 matching.synthesize_scales（默认 true）
+"""
+
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple, Dict, Any, Callable
+
+import cv2
+import numpy as np
+
+from .config import load_config_section
+
+# 合成比例的允许范围（百分比）
+MIN_SCALE: int = 25
+MAX_SCALE: int = 200
+# 合成模板缓存的字节预算
+SCALED_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+
+
+def resize_lanczos(img: np.ndarray, scale_percent: float) -> np.ndarray:
+    """使用 Lanczos4 高质量缩放（保持宽高比、保留通道）。"""
+    h, w = img.shape[:2]
+    new_w = max(1, int(round(w * scale_percent / 100.0)))
+    new_h = max(1, int(round(h * scale_percent / 100.0)))
+    return cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_LANCZOS4)
+
+
+class ScaledTemplateCache:
+    """
+    合成模板的登记表与 LRU 缓存。
+    - virtual_path(base, scale): 登记并返回该比例的虚拟模板路径
+    - get(path, grayscale, load_base): 已登记的路径返回合成结果（只读），未登记返回 None；
+      load_base(path, grayscale) 用于读取基础模板（经模板包或模板缓存）
+    """
+
+    def __init__(self, max_bytes: int = SCALED_CACHE_MAX_BYTES) -> None:
+        self.max_bytes = int(max_bytes)
+        self._sources: Dict[str, Tuple[str, float]] = {}
+        self._items: "OrderedDict[Tuple[str, bool], np.ndarray]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def virtual_path(self, base: Path, scale: float) -> Path:
+        p = base.with_name(f"{base.stem}_{format_scale(scale)}{base.suffix}")
+        key = str(p)
+        if key not in self._sources:
+            with self._lock:
+                self._sources[key] = (str(base), float(scale))
+        return p
+
+    def is_virtual(self, path: str) -> bool:
+        return path in self._sources
+
+    def get(
+        self,
+        path: str,
+        grayscale: bool,
+        load_base: Callable[[str, bool], np.ndarray],
+    ) -> Optional[np.ndarray]:
+        src = self._sources.get(path)
+        if src is None:
+            return None
+        key = (path, bool(grayscale))
+        with self._lock:
+            tpl = self._items.get(key)
+            if tpl is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return tpl
+            self.misses += 1
+
+        base, scale = src
+        # 先缩放彩色图再转灰度，与“缩放后写 PNG 再读取”的流程一致
+        tpl = resize_lanczos(load_base(base, False), scale)
+        if grayscale:
+            tpl = cv2.cvtColor(tpl, cv2.COLOR_BGR2GRAY)
+        tpl.flags.writeable = False
+
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._items[key] = tpl
+            self._bytes += tpl.nbytes
+            while self._bytes > self.max_bytes and len(self._items) > 1:
+                _, old = self._items.popitem(last=False)
+                self._bytes -= old.nbytes
+                self.evictions += 1
+        return tpl
+
+    def clear(self) -> None:
+        """清空合成结果与登记表（例如替换素材后）。"""
+        with self._lock:
+            self._sources.clear()
+            self._items.clear()
+            self._bytes = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "registered": len(self._sources),
+                "entries": len(self._items),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / total) if total else 0.0,
+            }
+
+
+def load_scaler_config() -> Dict[str, Any]:
+    """读取 config.json 中 matching.synthesize_scales 配置（可选）。"""
+    default = {"synthesize_scales": True}
+    m = load_config_section("matching")
+    return {"synthesize_scales": bool(m.get("synthesize_scales", default["synthesize_scales"]))}
+
+
+_SCALED = ScaledTemplateCache()
+_ENABLED: Optional[bool] = None
+
+
+def get_scaled_cache() -> ScaledTemplateCache:
+    return _SCALED
+
+
+def is_scale_synthesis_enabled() -> bool:
+    global _ENABLED
+    if _ENABLED is None:
+        _ENABLED = load_scaler_config()["synthesize_scales"]
+    return _ENABLED
+
+
+def set_scale_synthesis(enabled: bool) -> None:
+    """切换比例合成；关闭后回到读取磁盘上的 {stem}_{scale}.png。"""
+    global _ENABLED
+    _ENABLED = bool(enabled)
+    if not _ENABLED:
+        # 虚拟路径与磁盘文件同名，关闭时需撤销登记，否则仍会走合成
+        _SCALED.clear()
+
+
+def clamp_synth_scale(scale: float) -> float:
+    """限制到合成范围并保留 1 位小数；整数比例仍返回 int（与磁盘文件名、配置一致）。"""
+    s = round(max(float(MIN_SCALE), min(float(MAX_SCALE), float(scale))), 1)
+    return int(s) if s.is_integer() else s
+
+
+def format_scale(scale: float) -> str:
+    """比例的文件名写法：72 -> "72"，72.4 -> "72.4"。"""
+    s = round(float(scale), 1)
+    return str(int(s)) if s.is_integer() else f"{s:.1f}"
+
+
+__all__ = [
+    "MIN_SCALE",
+    "MAX_SCALE",
+    "resize_lanczos",
+    "ScaledTemplateCache",
+    "get_scaled_cache",
+    "is_scale_synthesis_enabled",
+    "set_scale_synthesis",
+    "clamp_synth_scale",
+    "format_scale",
+    "load_scaler_config",
+]
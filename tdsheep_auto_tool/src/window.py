@@ -5,22 +5,29 @@ from __future__ import annotations
     - 功能：负责游戏窗口的初始化、检测、定位与尺寸计算
 """
 
-import json
 import time
 from pathlib import Path
 from typing import Optional, Tuple, Dict, Any, List
 
 import pyautogui
 
+from .calc_locate import grab_screen, click_point, locate_all_in_frame
+from .capture import release_frame
+from .config import load_config_section
+from .executor import get_match_executor
 from .match import (
+    SCALES,
     get_assets_dir,
     load_scale_state,
     save_scale_state,
-    match_with_scales,
+    locate_many,
     clamp_scale,
+    ordered_scales,
     find_template_path,
-    click_template,
+    set_window_region,
 )
+from .scale_estimate import refine_scale
+from .template_scaler import is_scale_synthesis_enabled
 
 # 基础窗口尺寸（100% 缩放时）
 BASE_WINDOW_SIZE: Tuple[int, int] = (1066, 912)
@@ -36,14 +43,8 @@ def _load_window_config() -> Dict[str, Any]:
         "base_size": [BASE_WINDOW_SIZE[0], BASE_WINDOW_SIZE[1]],
         "frame_duration_sec": 5.0,
     }
+    w = load_config_section("window")
     try:
-        project_root = Path(__file__).resolve().parent.parent.parent
-        cfg_path = project_root / "config.json"
-        if not cfg_path.exists():
-            return default
-        with cfg_path.open("r", encoding="utf-8") as f:
-            data = json.load(f)
-        w = data.get("window", {})
         anchor = str(w.get("anchor", default["anchor"])).strip() or default["anchor"]
         offs = w.get("anchor_offset", default["anchor_offset"]) or default["anchor_offset"]
         base = w.get("base_size", default["base_size"]) or default["base_size"]
@@ -59,19 +60,19 @@ def _load_window_config() -> Dict[str, Any]:
             "base_size": [int(base[0]), int(base[1])],
             "frame_duration_sec": dur,
         }
-    except Exception as e:
-        print(f"[config] 读取 window 配置失败，使用默认: {e}")
+    except (TypeError, ValueError) as e:
+        print(f"[config] window 配置无效，使用默认: {e}")
         return default
 
 
-def compute_window_geometry(matches: Dict[str, Any], recommended_scale: Optional[int]) -> Optional[Dict[str, int]]:
-    """根据锚点与比例计算游戏窗口的屏幕坐标与尺寸。"""
+def compute_window_geometry(matches: Dict[str, Any], recommended_scale: Optional[float]) -> Optional[Dict[str, int]]:
+    """根据锚点与比例（可带小数）计算游戏窗口的屏幕坐标与尺寸。"""
     cfg = _load_window_config()
     anchor_stem = cfg["anchor"]
     off_x, off_y = cfg["anchor_offset"]
     base_w, base_h = cfg["base_size"]
 
-    rec = clamp_scale(int(recommended_scale or 100))
+    rec = clamp_scale(recommended_scale or 100)
     scale = rec / 100.0
 
     anchor = matches.get(anchor_stem)
@@ -158,110 +159,190 @@ def detect_window_assets_a(
 
     # 加载比例状态
     state = load_scale_state()
-    recommended = int(state.get("recommended_scale", 100))
-    recommended = clamp_scale(recommended)
+    recommended = clamp_scale(state.get("recommended_scale", 100))
 
     results: Dict[str, Any] = {}
     success = True
+    # 锚点命中：主干 -> (match, 命中比例)，用于细化比例
+    anchor_hits: Dict[str, Tuple[Dict[str, Any], Any]] = {}
 
-    # 可替代的左下角切换好友（a_5 灰 或 a_6 亮）
-    friend_match = None
-    friend_scale_used = None
-    for stem in ["a_5", "a_6"]:
-        m, used_scale = match_with_scales(
-            assets_a, stem, recommended, confidence, grayscale, region
-        )
-        if m:
+    # 所有锚点共用同一张截屏
+    frame = grab_screen(region=region, grayscale=grayscale)
+    try:
+        def _first_hit(stems: List[str], stop_on_hit: bool) -> Dict[str, Any]:
+            """在共享画面上按顺序匹配一组锚点，命中后更新推荐比例并按需点击。"""
+            nonlocal recommended
+            found = locate_many(
+                [(assets_a, stem, None) for stem in stems],
+                frame=frame,
+                recommended_scale=recommended,
+                confidence=confidence,
+                grayscale=grayscale,
+                region=region,
+                stop_on_hit=stop_on_hit,
+            )
+            hits: Dict[str, Any] = {}
+            for stem in stems:
+                m, used_scale = found.get((assets_a.name, stem), (None, None))
+                if not m:
+                    continue
+                hits[stem] = m
+                anchor_hits[stem] = (m, used_scale)
+                # 动态更新推荐比例（立即生效，后续优先）
+                if used_scale is not None:
+                    recommended = used_scale
+                    state["recommended_scale"] = used_scale
+                    state.setdefault("per_template", {})[stem] = used_scale
+                if click:
+                    cx, cy = m["center"]
+                    click_point(cx, cy, move_duration=click_move_duration)
+            return hits
+
+        # 可替代的左下角切换好友（a_5 灰 或 a_6 亮）
+        friend_match = None
+        for stem, m in _first_hit(["a_5", "a_6"], stop_on_hit=True).items():
             friend_match = {"name": stem, "data": m}
-            friend_scale_used = used_scale
-            # 动态更新推荐比例（立即生效，后续优先）
-            if used_scale is not None:
-                recommended = used_scale
-                state["recommended_scale"] = used_scale
-                state.setdefault("per_template", {})[stem] = used_scale
-            if click:
-                tpl = find_template_path(assets_a, stem, used_scale or recommended)
-                if tpl:
-                    click_template(
-                        template_path=str(tpl),
-                        region=region,
-                        confidence=confidence,
-                        grayscale=grayscale,
-                        move_duration=click_move_duration,
-                    )
             break
-    if not friend_match:
-        print("[match] 未识别到左下角切换好友，请调整窗口后重试")
-        success = False
-    results["friend_switch"] = friend_match
-
-    # 右下角 UI（a_3 或 a_4）
-    ui_match = None
-    for stem in ["a_3", "a_4"]:
-        m, used_scale = match_with_scales(
-            assets_a, stem, recommended, confidence, grayscale, region
-        )
-        if m:
+        if not friend_match:
+            print("[match] 未识别到左下角切换好友，请调整窗口后重试")
+            success = False
+        results["friend_switch"] = friend_match
+
+        # 右下角 UI（a_3 或 a_4）
+        ui_match = None
+        for stem, m in _first_hit(["a_3", "a_4"], stop_on_hit=True).items():
             ui_match = {"name": stem, "data": m}
-            if used_scale is not None:
-                recommended = used_scale
-                state["recommended_scale"] = used_scale
-                state.setdefault("per_template", {})[stem] = used_scale
-            if click:
-                tpl = find_template_path(assets_a, stem, used_scale or recommended)
-                if tpl:
-                    click_template(
-                        template_path=str(tpl),
-                        region=region,
-                        confidence=confidence,
-                        grayscale=grayscale,
-                        move_duration=click_move_duration,
-                    )
             break
-    if not ui_match:
-        print("[match] 未识别到右下角UI，请调整窗口后重试")
-        success = False
-    results["ui"] = ui_match
-
-    # 必需模板（顶部与底部菜单）
-    for stem in ["a_1", "a_2"]:
-        m, used_scale = match_with_scales(
-            assets_a, stem, recommended, confidence, grayscale, region
-        )
-        key = stem
-        if m:
-            results[key] = m
-            if used_scale is not None:
-                recommended = used_scale
-                state["recommended_scale"] = used_scale
-                state.setdefault("per_template", {})[stem] = used_scale
-            if click:
-                tpl = find_template_path(assets_a, stem, used_scale or recommended)
-                if tpl:
-                    click_template(
-                        template_path=str(tpl),
-                        region=region,
-                        confidence=confidence,
-                        grayscale=grayscale,
-                        move_duration=click_move_duration,
-                    )
-        else:
-            print(f"[match] 未识别到 {key}，请调整窗口后重试")
-            results[key] = None
+        if not ui_match:
+            print("[match] 未识别到右下角UI，请调整窗口后重试")
             success = False
-
-    # 边界与状态持久化：成功则清零失败次数，失败则指数退避计数 +1
-    if success:
-        state["fail_count"] = 0
-        state["recommended_scale"] = recommended
-        save_scale_state(state)
-    else:
-        state["fail_count"] = int(state.get("fail_count", 0)) + 1
-        save_scale_state(state)
-        # 指数退避提示（不硬性等待，交互式流程下仅提示）
-        base_wait = 0.5
-        wait_sec = min(5.0, base_wait * (2 ** (state["fail_count"] - 1)))
-        print(f"[backoff] 连续失败 {state['fail_count']} 次，建议等待 {wait_sec:.1f}s 后重试")
+        results["ui"] = ui_match
+
+        # 必需模板（顶部与底部菜单）
+        required = _first_hit(["a_1", "a_2"], stop_on_hit=False)
+        for key in ["a_1", "a_2"]:
+            if key in required:
+                results[key] = required[key]
+            else:
+                print(f"[match] 未识别到 {key}，请调整窗口后重试")
+                results[key] = None
+                success = False
+
+        # 边界与状态持久化：成功则清零失败次数，失败则指数退避计数 +1
+        # 成功时窗口矩形作为后续匹配的默认搜索区域，失败则作废旧区域
+        if success:
+            state["fail_count"] = 0
+            # 启用比例合成时把离散比例细化为小数比例，之后的模板合成与偏移计算都按它进行
+            if is_scale_synthesis_enabled():
+                recommended = _refine_window_scale(frame, assets_a, anchor_hits, recommended, grayscale, region)
+            state["recommended_scale"] = recommended
+            rect = compute_window_geometry(results, recommended)
+            if rect is not None:
+                state["window_rect"] = [rect["left"], rect["top"], rect["width"], rect["height"]]
+            else:
+                state.pop("window_rect", None)
+            save_scale_state(state)
+            set_window_region(rect, persist=False)
+        else:
+            state["fail_count"] = int(state.get("fail_count", 0)) + 1
+            state.pop("window_rect", None)
+            save_scale_state(state)
+            set_window_region(None, persist=False)
+            # 指数退避提示（不硬性等待，交互式流程下仅提示）
+            base_wait = 0.5
+            wait_sec = min(5.0, base_wait * (2 ** (state["fail_count"] - 1)))
+            print(f"[backoff] 连续失败 {state['fail_count']} 次，建议等待 {wait_sec:.1f}s 后重试")
+    finally:
+        release_frame(frame)
 
     return {"success": success, "matches": results, "recommended_scale": recommended}
 
+
+def _refine_window_scale(
+    frame,
+    assets_a: Path,
+    anchor_hits: Dict[str, Tuple[Dict[str, Any], Any]],
+    coarse: float,
+    grayscale: bool,
+    region: Optional[Tuple[int, int, int, int]],
+) -> float:
+    """以在 coarse 比例命中、且有基础模板的锚点细化比例；无可用锚点时返回 coarse。"""
+    anchors = [
+        (assets_a / f"{stem}.png", m)
+        for stem, (m, s) in anchor_hits.items()
+        if s == coarse and (assets_a / f"{stem}.png").exists()
+    ]
+    if not anchors:
+        return coarse
+    t0 = time.perf_counter()
+    est = refine_scale(frame, anchors, coarse, SCALES, grayscale=grayscale, region=region)
+    scale = clamp_scale(est["scale"])
+    print(
+        f"[scale] 比例细化 {coarse} -> {scale} (score {est['coarse_score']:.3f} -> {est['score']:.3f}, "
+        f"{len(anchors)} 个锚点, {est['evaluations']} 次求值, {(time.perf_counter() - t0) * 1000:.0f}ms)"
+    )
+    return scale
+
+
+def _overlaps(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+    return (
+        a["left"] < b["left"] + b["width"] and b["left"] < a["left"] + a["width"]
+        and a["top"] < b["top"] + b["height"] and b["top"] < a["top"] + a["height"]
+    )
+
+
+# 功能：在整屏画面中查找全部游戏窗口（同一锚点的多个命中）。
+def detect_windows(
+    max_windows: int = 4,
+    confidence: float = 0.8,
+    grayscale: bool = True,
+) -> List[Dict[str, Any]]:
+    """
+    以配置的锚点（默认 a_2）在各比例下搜索全部命中，每个命中对应一个窗口。
+    返回按屏幕位置（从上到下、从左到右）排序的列表：
+    [{"rect": {...}, "scale": float, "anchor": match}, ...]
+    启用比例合成时 scale 为按该窗口锚点细化后的小数比例，否则为命中的离散比例。
+    """
+    cfg = _load_window_config()
+    anchor_stem = cfg["anchor"]
+    assets_a = get_assets_dir() / "a"
+    recommended = clamp_scale(load_scale_state().get("recommended_scale", 100))
+
+    cands = []
+    for s in ordered_scales(recommended):
+        tpl = find_template_path(assets_a, anchor_stem, s)
+        if tpl is not None:
+            cands.append((s, tpl))
+    frame = grab_screen(region=None, grayscale=grayscale)
+    try:
+        # 各比例在同一画面上并行搜索
+        found = get_match_executor().map(
+            lambda c: locate_all_in_frame(frame, str(c[1]), confidence=confidence, grayscale=grayscale, max_results=max_windows),
+            cands,
+        )
+        hits: List[Tuple[int, Dict[str, Any]]] = [(s, m) for (s, _), ms in zip(cands, found) for m in ms]
+
+        # 不同比例可能在同一位置重复命中，按得分保留互不重叠的锚点
+        kept: List[Tuple[int, Dict[str, Any]]] = []
+        for s, m in sorted(hits, key=lambda h: -h[1]["score"]):
+            if all(not _overlaps(m, k) for _, k in kept):
+                kept.append((s, m))
+
+        windows: List[Dict[str, Any]] = []
+        refine = is_scale_synthesis_enabled()
+        for s, m in kept[:max_windows]:
+            scale = s
+            # 与单窗口流程一致：启用比例合成时以该窗口的锚点命中把离散比例细化为小数比例
+            if refine:
+                scale = _refine_window_scale(frame, assets_a, {anchor_stem: (m, s)}, s, grayscale, None)
+            rect = compute_window_geometry({anchor_stem: m}, scale)
+            if rect is not None:
+                windows.append({"rect": rect, "scale": scale, "anchor": m})
+    finally:
+        release_frame(frame)
+    windows.sort(key=lambda w: (w["rect"]["top"], w["rect"]["left"]))
+    print(f"[detect] 共识别到 {len(windows)} 个游戏窗口")
+    for i, w in enumerate(windows):
+        r = w["rect"]
+        print(f"[detect]   w{i}: left={r['left']}, top={r['top']}, size={r['width']}x{r['height']}, scale={w['scale']}")
+    return windows